@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import abc
+import collections
+import csv
+import itertools
+import json
+import sys
+from collections import namedtuple
+
+import validator
+from validator import DayKind, TimeShift, ValidationError
+
+
+Table = namedtuple('Table', 'columns, rows')
+StopCoverage = namedtuple(
+    'StopCoverage', 'key, name, routes, workdays, weekend'
+)
+
+
+class Application(validator.Application):
+    # report name -> function of `DepartureAnalytics` and arguments
+    REPORTS = {
+        'stop-hours': lambda x, args: x.stop_hours_table(args.day),
+        'route-hours': lambda x, args: x.route_hours_table(args.day),
+        'network-hours': lambda x, args: x.network_hours_table(args.day),
+        'coverage': lambda x, args: x.coverage_table()
+    }
+
+    def run(self):
+        args = self._parse_args()
+        content_dir = self._get_content_dir(args)
+
+        try:
+            content = self._create_and_validate(
+                *self._get_content_tree(args, content_dir)
+            )
+        except ValidationError as e:
+            print(e, file=sys.stderr)
+            sys.exit(self.VALIDATION_FAILED_STATUS)
+
+        table = self.REPORTS[args.report](DepartureAnalytics(content), args)
+
+        formatter = TableFormatter.create(args.format)
+        if args.output:
+            with open(args.output, 'w', encoding='utf8', newline='') as file:
+                formatter.write(table, file)
+        else:
+            formatter.write(table, sys.stdout)
+
+    def _make_arg_parser(self):
+        parser = super()._make_arg_parser()
+
+        parser.add_argument(
+            'report', choices=tuple(self.REPORTS),
+            help='departures per hour at every stop, of every route '
+                 'direction or of the whole network, or departures per day '
+                 'kind at every stop'
+        )
+        parser.add_argument(
+            '--day', choices=tuple(DayKind.DAY_TYPES),
+            default='workdays', help='day kind of hourly reports'
+        )
+        parser.add_argument(
+            '--format', choices=tuple(TableFormatter.FORMATTERS),
+            default='csv', help='output format'
+        )
+        parser.add_argument(
+            '-o', '--output', help='output file path; defaults to standard '
+                                   'output'
+        )
+
+        return parser
+
+
+class DepartureAnalytics:
+    """Departure histograms of `Content`.
+
+    Departures of a route from its stop are trip start minutes shifted by
+    the stop shift; a route leaves all of its stops but the last one, where
+    its trips end. Trip starts of every route are counted once per minute
+    into a prefix sum, then the departures of each stop and hour are a
+    difference of two prefix sums, so the work grows with the number of
+    route stops and hours, not with the number of trips times stops.
+    Everyday trips count for both workdays and weekend, hours past
+    midnight count for the early hours of the same day.
+    """
+
+    HOURS_PER_DAY = 24
+    MINUTES_PER_HOUR = TimeShift.MINUTES_PER_HOUR
+
+    def __init__(self, content):
+        self._content = content
+
+    def stop_hours(self, day_kind):
+        """Stop key -> departures per hour, in content stop order"""
+        stop_hours = {
+            x.value.key.value: [0] * self.HOURS_PER_DAY
+            for x in self._content.stops
+        }
+
+        for key_items, shifts, prefix in self._enumerate_routes(day_kind):
+            for key_item, shift in zip(key_items[:-1], shifts):
+                hours = stop_hours.setdefault(
+                    key_item.value, [0] * self.HOURS_PER_DAY
+                )
+                for hour, count in enumerate(self._bucket(prefix, shift)):
+                    hours[hour % self.HOURS_PER_DAY] += count
+
+        return stop_hours
+
+    def route_hours(self, day_kind):
+        """Route direction id -> trip starts per hour, in route catalogue
+        order
+        """
+        route_ids = {
+            id(y.route): y.id
+            for x in self._content.index.route_catalogue.numbers
+            for y in self._content.index.route_catalogue.directions(x)
+        }
+        route_hours = dict.fromkeys(route_ids.values())
+
+        for route, (_, _, prefix) in zip(
+                self._content.routes, self._enumerate_routes(day_kind)):
+            hours = [0] * self.HOURS_PER_DAY
+            for hour, count in enumerate(self._bucket(prefix, 0)):
+                hours[hour % self.HOURS_PER_DAY] += count
+            route_hours[route_ids[id(route)]] = hours
+
+        return route_hours
+
+    def network_hours(self, day_kind):
+        """Trip starts per hour of all routes"""
+        return [
+            sum(x) for x in zip(*self.route_hours(day_kind).values())
+        ] or [0] * self.HOURS_PER_DAY
+
+    def coverage(self):
+        """`StopCoverage` of every stop in content order, with the number of
+        routes and of departures per day kind
+        """
+        totals = {x: self.stop_hours(x) for x in DayKind.DAY_TYPES}
+        routes_by_stop_key = self._content.index.routes_by_stop_key
+
+        return [
+            StopCoverage(
+                key=key,
+                name=stop.value.name.value,
+                routes=len(routes_by_stop_key.get(key, ())),
+                workdays=sum(totals['workdays'][key]),
+                weekend=sum(totals['weekend'][key])
+            )
+            for key, stop in (
+                (x.value.key.value, x) for x in self._content.stops
+            )
+        ]
+
+    def _enumerate_routes(self, day_kind):
+        """Yield stop key `Item`s, stop shifts and trip start prefix sums of
+        every route in content order
+        """
+        index = self._content.index
+        day_type_indexes = DayKind.day_type_indexes(day_kind)
+
+        for key_items, shifts, trips in zip(
+                index.route_stop_keys, index.route_stop_shifts,
+                index.route_trip_minutes):
+            starts = [trips[x] for x in day_type_indexes
+                      if trips[x] is not None]
+            yield key_items, shifts, self._make_prefix(
+                itertools.chain.from_iterable(starts),
+                max(shifts, default=0)
+            )
+
+    def _make_prefix(self, starts, max_shift):
+        """Return numbers of trip starts before every minute, long enough to
+        cover whole hours of the latest departure
+        """
+        counts = collections.Counter(starts)
+        last = max(counts, default=0) + max_shift
+        length = (last // self.MINUTES_PER_HOUR + 1) * self.MINUTES_PER_HOUR
+
+        per_minute = [0] * length
+        for minute, count in counts.items():
+            per_minute[minute] = count
+
+        return [0] + list(itertools.accumulate(per_minute))
+
+    def _bucket(self, prefix, shift):
+        """Departures per hour from the day start of trips shifted by
+        `shift` minutes
+        """
+        last = len(prefix) - 1
+        bounds = [
+            min(max(x - shift, 0), last)
+            for x in range(0, last + 1, self.MINUTES_PER_HOUR)
+        ]
+        return [y - x for x, y in zip(
+            (prefix[x] for x in bounds), (prefix[x] for x in bounds[1:])
+        )]
+
+    def stop_hours_table(self, day_kind):
+        names = {
+            x.value.key.value: x.value.name.value for x in self._content.stops
+        }
+        return Table(
+            columns=['stop_key', 'stop_name'] + self._hour_columns(),
+            rows=[
+                [key, names.get(key, '')] + hours
+                for key, hours in self.stop_hours(day_kind).items()
+            ]
+        )
+
+    def route_hours_table(self, day_kind):
+        return Table(
+            columns=['route_direction'] + self._hour_columns(),
+            rows=[
+                [key] + hours
+                for key, hours in self.route_hours(day_kind).items()
+            ]
+        )
+
+    def network_hours_table(self, day_kind):
+        return Table(
+            columns=['hour', 'departures'],
+            rows=[
+                [x, y] for x, y in zip(
+                    self._hour_columns(), self.network_hours(day_kind)
+                )
+            ]
+        )
+
+    def coverage_table(self):
+        return Table(
+            columns=list(StopCoverage._fields),
+            rows=[list(x) for x in self.coverage()]
+        )
+
+    def _hour_columns(self):
+        return ['{:02}'.format(x) for x in range(self.HOURS_PER_DAY)]
+
+
+class TableFormatter(metaclass=abc.ABCMeta):
+    # format name -> formatter class name
+    FORMATTERS = dict(
+        csv='CsvTableFormatter',
+        json='JsonTableFormatter'
+    )
+
+    @classmethod
+    def create(cls, name):
+        return globals()[cls.FORMATTERS[name]]()
+
+    @abc.abstractmethod
+    def write(self, table, file):
+        """Write `Table` to text `file`"""
+        pass
+
+
+class CsvTableFormatter(TableFormatter):
+    def write(self, table, file):
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(table.columns)
+        writer.writerows(table.rows)
+
+
+class JsonTableFormatter(TableFormatter):
+    def write(self, table, file):
+        json.dump(
+            [dict(zip(table.columns, x)) for x in table.rows],
+            file, ensure_ascii=False, indent=2
+        )
+        file.write('\n')
+
+
+if __name__ == '__main__':
+    Application().run()
@@ -0,0 +1,101 @@
+# coding: utf-8
+
+import io
+
+from analytics import *
+from validator_test import make_content
+
+
+ROUTES = '''
+routes:
+  - number: 1
+    description: description1
+    stops:
+      - key: key1
+        shift: 00:00
+      - key: key2
+        shift: 00:30
+      - key: key3
+        shift: 00:35
+    trips:
+      workdays:
+        - 05:40
+        - 06:10
+        - 23:50
+      weekend:
+        - 07:00
+  - number: 2
+    description: description2
+    stops:
+      - key: key2
+        shift: 00:00
+      - key: key3
+        shift: 00:05
+    trips:
+      everyday:
+        - 06:55
+'''
+
+
+def make_analytics():
+    return DepartureAnalytics(make_content(ROUTES))
+
+
+def hours(**counts):
+    result = [0] * 24
+    for hour, count in counts.items():
+        result[int(hour[1:])] = count
+    return result
+
+
+class TestDepartureAnalytics:
+    def test_stop_hours(self):
+        stop_hours = make_analytics().stop_hours('workdays')
+
+        assert stop_hours == dict(
+            key1=hours(h5=1, h6=1, h23=1),
+            # 06:10, 06:40 and, past midnight, 00:20 of route 1, 06:55 of
+            # route 2
+            key2=hours(h0=1, h6=3),
+            # the last stop of both routes
+            key3=hours()
+        )
+
+    def test_route_hours(self):
+        route_hours = make_analytics().route_hours('weekend')
+
+        assert route_hours == {
+            '1:key3': hours(h7=1),
+            '2:key3': hours(h6=1)
+        }
+
+    def test_network_hours(self):
+        assert make_analytics().network_hours('workdays') == \
+            hours(h5=1, h6=2, h23=1)
+
+    def test_coverage(self):
+        assert make_analytics().coverage() == [
+            StopCoverage('key1', 'name1', 1, 3, 1),
+            StopCoverage('key2', 'name2', 2, 4, 2),
+            StopCoverage('key3', 'name3', 2, 0, 0)
+        ]
+
+
+class TestTableFormatter:
+    TABLE = Table(columns=['key', 'count'], rows=[['key1', 1], ['key2', 2]])
+
+    def test_csv(self):
+        file = io.StringIO()
+
+        TableFormatter.create('csv').write(self.TABLE, file)
+
+        assert file.getvalue() == 'key,count\nkey1,1\nkey2,2\n'
+
+    def test_json(self):
+        file = io.StringIO()
+
+        TableFormatter.create('json').write(self.TABLE, file)
+
+        assert json.loads(file.getvalue()) == [
+            dict(key='key1', count=1), dict(key='key2', count=2)
+        ]
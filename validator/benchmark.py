@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import argparse
+import copy
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import validator
+from validator import (
+    Content, RouteFileSystemNodeSource, StopFileSystemNodeSource,
+    ValidatorScheduler
+)
+
+
+BenchmarkResult = namedtuple('BenchmarkResult', 'name, runs, min, median, max')
+
+
+class Application:
+    def run(self):
+        args = self._parse_args()
+        print(BenchmarkFormatter().format(args.func(args)))
+
+    def _parse_args(self):
+        parser = argparse.ArgumentParser()
+        subparsers = parser.add_subparsers(dest='command')
+        subparsers.required = True
+
+        startup_parser = subparsers.add_parser(
+            'startup',
+            help='time to first result for a single changed file, '
+                 'interpreter start up included'
+        )
+        startup_parser.add_argument(
+            '-f', '--file', required=True,
+            help='stops or routes file to validate'
+        )
+        startup_parser.add_argument(
+            '-r', '--repeat', type=int, default=20, help='number of runs'
+        )
+        startup_parser.set_defaults(
+            func=lambda x: StartupBenchmark(x.file).run(x.repeat)
+        )
+
+        validators_parser = subparsers.add_parser(
+            'validators',
+            help='combined run time of all content validators, one after '
+                 'another and on a thread pool'
+        )
+        validators_parser.add_argument(
+            '-d', '--content-dir', required=True, help='content directory'
+        )
+        validators_parser.add_argument(
+            '-r', '--repeat', type=int, default=20, help='number of runs'
+        )
+        validators_parser.set_defaults(
+            func=lambda x: ValidatorsBenchmark(x.content_dir).run(x.repeat)
+        )
+
+        return parser.parse_args()
+
+
+class StartupBenchmark:
+    """Measure wall time of a fresh interpreter importing the validator and
+    producing a single stops or routes file
+    """
+
+    SCRIPT = '''
+import sys
+from validator import Producers, Yaml
+
+with open(sys.argv[1], encoding='utf8') as file:
+    root = Yaml.create_root_node(file)
+getattr(Producers, sys.argv[2])().produce(root)
+'''
+
+    def __init__(self, file_path):
+        self._file_path = os.path.abspath(file_path)
+
+    def run(self, repeat):
+        producer = os.path.basename(os.path.dirname(self._file_path))
+        if producer not in ('stops', 'routes'):
+            raise ValueError('File in stops or routes directory expected')
+
+        command = [
+            sys.executable, '-c', self.SCRIPT, self._file_path, producer
+        ]
+        timings = [self._time(command) for _ in range(repeat)]
+
+        return make_result('startup', timings)
+
+    def _time(self, command):
+        start = time.perf_counter()
+        subprocess.run(
+            command, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        return time.perf_counter() - start
+
+
+class ValidatorsBenchmark:
+    """Measure `ValidatorScheduler` run time over already read content,
+    shared indexes building included: every run gets a copy of the content
+    without its memoized `ContentIndex`
+    """
+
+    def __init__(self, content_dir):
+        self._content = Content(
+            StopFileSystemNodeSource(content_dir),
+            RouteFileSystemNodeSource(content_dir)
+        )
+
+    def run(self, repeat):
+        validators = validator.Application()._make_validators()
+
+        sequential = [
+            self._time(ValidatorScheduler(validators)) for _ in range(repeat)
+        ]
+        with ThreadPoolExecutor() as executor:
+            pooled = [
+                self._time(ValidatorScheduler(validators, executor))
+                for _ in range(repeat)
+            ]
+
+        return [
+            make_result('validators sequential', sequential),
+            make_result('validators pooled', pooled)
+        ]
+
+    def _time(self, scheduler):
+        content = copy.copy(self._content)
+        start = time.perf_counter()
+        scheduler.run(content)
+        return time.perf_counter() - start
+
+
+class BenchmarkFormatter:
+    def format(self, results):
+        if isinstance(results, BenchmarkResult):
+            results = [results]
+
+        return '\n'.join(
+            '{}: {} runs, min {:.1f} ms, median {:.1f} ms, max {:.1f} ms'
+            .format(
+                x.name, x.runs, x.min * 1000, x.median * 1000, x.max * 1000
+            )
+            for x in results
+        )
+
+
+def make_result(name, timings):
+    return BenchmarkResult(
+        name=name,
+        runs=len(timings),
+        min=min(timings),
+        median=statistics.median(timings),
+        max=max(timings)
+    )
+
+
+if __name__ == '__main__':
+    Application().run()
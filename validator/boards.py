@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import hashlib
+import itertools
+import json
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import validator
+from validator import DayKind, RouteNumber, TimeShift, ValidationError
+
+
+BoardDeparture = namedtuple('BoardDeparture', 'minute, number, description')
+
+
+class Application(validator.Application):
+    def run(self):
+        args = self._parse_args()
+        content_dir = self._get_content_dir(args)
+
+        try:
+            content = self._create_and_validate(
+                *self._get_content_tree(args, content_dir)
+            )
+        except ValidationError as e:
+            print(e, file=sys.stderr)
+            sys.exit(self.VALIDATION_FAILED_STATUS)
+
+        boards = BoardBuilder(content).boards()
+        if args.jobs > 1:
+            with ProcessPoolExecutor(args.jobs) as executor:
+                written = BoardWriter(args.output).write(boards, executor)
+        else:
+            written = BoardWriter(args.output).write(boards)
+
+        print('Departure boards written to {}, {} of {} changed.'.format(
+            args.output, written, len(boards)
+        ))
+
+    def _make_arg_parser(self):
+        parser = super()._make_arg_parser()
+
+        parser.add_argument(
+            '-o', '--output',
+            action='store', required=True,
+            help='departure board directory path'
+        )
+        parser.add_argument(
+            '-j', '--jobs', type=int, default=1,
+            help='number of processes writing boards'
+        )
+
+        return parser
+
+
+class BoardBuilder:
+    """Departures of every stop on every day kind, sorted by minute, route
+    number and description.
+
+    A route leaves all of its stops but the last one, where its trips end.
+    """
+
+    def __init__(self, content):
+        self._content = content
+
+    def boards(self):
+        """Return a dict of (day kind, stop key) -> `BoardDeparture`s, with
+        an empty board for stops nothing leaves on a day kind
+        """
+        content = self._content
+        stop_keys = [x.value.key.value for x in content.stops]
+        boards = {}
+
+        for day_kind in DayKind.DAY_TYPES:
+            departures = {x: [] for x in stop_keys}
+            day_type_indexes = DayKind.day_type_indexes(day_kind)
+
+            for i, route in enumerate(content.routes):
+                trips = content.index.route_trip_minutes[i]
+                starts = sorted(itertools.chain.from_iterable(
+                    trips[x] for x in day_type_indexes if trips[x] is not None
+                ))
+                number = route.value.number.value
+                description = route.value.description.value
+
+                for key_item, shift in zip(
+                        content.index.route_stop_keys[i][:-1],
+                        content.index.route_stop_shifts[i]):
+                    departures[key_item.value].extend(
+                        BoardDeparture(x + shift, number, description)
+                        for x in starts
+                    )
+
+            for key in stop_keys:
+                departures[key].sort(key=lambda x: (
+                    x.minute, RouteNumber.sort_key(x.number), x.description
+                ))
+                boards[day_kind, key] = departures[key]
+
+        return boards
+
+
+class BoardWriter:
+    """Writes every board to `{day kind}/{stop key}.json` of a directory.
+
+    SHA-256 hashes of the written files are kept in the manifest of the
+    directory, so a rebuild only writes boards which have changed and
+    removes boards of stops no longer in content.
+    """
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def write(self, boards, executor=None):
+        """Write `BoardBuilder` boards, serializing them in `executor` if
+        given; return the number of files written
+        """
+        manifest = self._load_manifest()
+        paths = [
+            '{}/{}.json'.format(day_kind, key) for day_kind, key in boards
+        ]
+        args = (
+            [self._directory] * len(paths), paths,
+            [[day_kind, key] for day_kind, key in boards],
+            list(boards.values()),
+            [manifest.get(x) for x in paths]
+        )
+
+        if executor is None:
+            results = list(map(_write_board, *args))
+        else:
+            results = list(executor.map(
+                _write_board, *args, chunksize=max(1, len(paths) // 64)
+            ))
+
+        hashes = dict(zip(paths, (x[0] for x in results)))
+        for path in manifest.keys() - hashes.keys():
+            try:
+                os.remove(os.path.join(self._directory, path))
+            except FileNotFoundError:
+                pass
+
+        if hashes != manifest:
+            self._save_manifest(hashes)
+
+        return sum(x[1] for x in results)
+
+    def _load_manifest(self):
+        try:
+            with open(
+                    os.path.join(self._directory, self.MANIFEST),
+                    encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def _save_manifest(self, hashes):
+        os.makedirs(self._directory, exist_ok=True)
+        with open(
+                os.path.join(self._directory, self.MANIFEST), 'w',
+                encoding='utf-8') as file:
+            json.dump(hashes, file, indent=2, sort_keys=True)
+            file.write('\n')
+
+
+def _write_board(directory, path, board_key, departures, old_hash):
+    """Serialize a board and write it to `path` in `directory` unless its
+    hash is `old_hash`; return the hash and whether the file was written
+    """
+    data = json.dumps(
+        dict(
+            day=board_key[0],
+            stop=board_key[1],
+            departures=[
+                [TimeShift.from_minutes(x.minute), x.number, x.description]
+                for x in departures
+            ]
+        ),
+        ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()
+    file_path = os.path.join(directory, path)
+
+    if digest == old_hash and os.path.exists(file_path):
+        return digest, False
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'wb') as file:
+        file.write(data)
+
+    return digest, True
+
+
+if __name__ == '__main__':
+    Application().run()
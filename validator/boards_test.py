@@ -0,0 +1,147 @@
+# coding: utf-8
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from boards import *
+from realtime_test import ROUTES
+from validator_test import make_content
+
+
+def make_boards(routes=ROUTES):
+    return BoardBuilder(make_content(routes)).boards()
+
+
+class TestBoardBuilder:
+    def test_boards(self):
+        boards = make_boards()
+
+        assert boards['workdays', 'key1'] == [
+            BoardDeparture(TimeShift.to_minutes('06:00'), '1', 'description1'),
+            BoardDeparture(TimeShift.to_minutes('06:30'), '1', 'description1')
+        ]
+        assert boards['workdays', 'key2'] == [
+            BoardDeparture(TimeShift.to_minutes('06:10'), '1', 'description1'),
+            BoardDeparture(TimeShift.to_minutes('06:40'), '1', 'description1')
+        ]
+        assert boards['weekend', 'key3'] == [
+            BoardDeparture(TimeShift.to_minutes('06:12'), '2', 'description2')
+        ]
+
+    def test_same_minute_sorted_by_number_and_description(self):
+        routes = '''
+routes:
+  - number: 10
+    description: description2
+    stops:
+      - key: key1
+        shift: 00:00
+      - key: key2
+        shift: 00:10
+    trips:
+      everyday:
+        - 06:00
+  - number: 2
+    description: description3
+    stops:
+      - key: key1
+        shift: 00:00
+      - key: key3
+        shift: 00:10
+    trips:
+      everyday:
+        - 06:00
+  - number: 2
+    description: description1
+    stops:
+      - key: key1
+        shift: 00:00
+      - key: key2
+        shift: 00:05
+    trips:
+      everyday:
+        - 06:00
+'''
+
+        board = make_boards(routes)['workdays', 'key1']
+
+        assert [(x.number, x.description) for x in board] == [
+            ('2', 'description1'), ('2', 'description3'),
+            ('10', 'description2')
+        ]
+
+    def test_last_stop_is_empty(self):
+        boards = make_boards()
+
+        assert boards['weekend', 'key2'] == []
+        assert len(boards) == 6
+
+
+class TestBoardWriter:
+    def test_write(self, tmpdir):
+        written = BoardWriter(str(tmpdir)).write(make_boards())
+
+        assert written == 6
+        assert json.loads(tmpdir.join('workdays', 'key1.json').read()) == dict(
+            day='workdays', stop='key1', departures=[
+                ['06:00', '1', 'description1'],
+                ['06:30', '1', 'description1']
+            ]
+        )
+        assert sorted(json.loads(tmpdir.join('manifest.json').read())) == [
+            'weekend/key1.json', 'weekend/key2.json', 'weekend/key3.json',
+            'workdays/key1.json', 'workdays/key2.json', 'workdays/key3.json'
+        ]
+
+    def test_rewrite_unchanged(self, tmpdir):
+        BoardWriter(str(tmpdir)).write(make_boards())
+        mtime = tmpdir.join('workdays', 'key1.json').mtime()
+
+        assert BoardWriter(str(tmpdir)).write(make_boards()) == 0
+        assert tmpdir.join('workdays', 'key1.json').mtime() == mtime
+
+    def test_rewrite_changed(self, tmpdir):
+        BoardWriter(str(tmpdir)).write(make_boards())
+
+        written = BoardWriter(str(tmpdir)).write(
+            make_boards(ROUTES.replace('06:12', '06:13'))
+        )
+
+        assert written == 2
+        assert json.loads(tmpdir.join('weekend', 'key2.json').read()) == dict(
+            day='weekend', stop='key2', departures=[]
+        )
+        assert json.loads(tmpdir.join('weekend', 'key3.json').read()) == dict(
+            day='weekend', stop='key3', departures=[
+                ['06:13', '2', 'description2']
+            ]
+        )
+
+    def test_rewrite_missing(self, tmpdir):
+        BoardWriter(str(tmpdir)).write(make_boards())
+        tmpdir.join('workdays', 'key1.json').remove()
+
+        assert BoardWriter(str(tmpdir)).write(make_boards()) == 1
+        assert tmpdir.join('workdays', 'key1.json').check()
+
+    def test_remove_stale(self, tmpdir):
+        boards = make_boards()
+        BoardWriter(str(tmpdir)).write(boards)
+        del boards['workdays', 'key1']
+
+        BoardWriter(str(tmpdir)).write(boards)
+
+        assert not tmpdir.join('workdays', 'key1.json').check()
+        assert 'workdays/key1.json' not in json.loads(
+            tmpdir.join('manifest.json').read()
+        )
+
+    def test_write_in_executor(self, tmpdir):
+        with ThreadPoolExecutor(2) as executor:
+            written = BoardWriter(str(tmpdir.join('pool'))) \
+                .write(make_boards(), executor)
+        BoardWriter(str(tmpdir.join('serial'))).write(make_boards())
+
+        assert written == 6
+        assert tmpdir.join('pool', 'manifest.json').read() == \
+            tmpdir.join('serial', 'manifest.json').read()
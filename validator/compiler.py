@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import array
+import struct
+import sys
+from collections import namedtuple
+
+import validator
+from validator import RouteTrip, TimeShift, ValidationError
+
+
+CompiledStop = namedtuple(
+    'CompiledStop', 'key, name, direction, latitude, longitude'
+)
+CompiledRoute = namedtuple(
+    'CompiledRoute', 'number, description, hidden, stops, trips'
+)
+
+
+class Application(validator.Application):
+    def run(self):
+        args = self._parse_args()
+        content_dir = self._get_content_dir(args)
+
+        print('Compiling content in {}...'.format(content_dir))
+
+        try:
+            content = self._create_and_validate(
+                *self._get_content_tree(args, content_dir)
+            )
+        except ValidationError as e:
+            print(e, file=sys.stderr)
+            sys.exit(self.VALIDATION_FAILED_STATUS)
+
+        data = ContentCompiler().compile(content)
+        with open(args.output, 'wb') as file:
+            file.write(data)
+
+        print('Compiled {} bytes to {}.'.format(len(data), args.output))
+
+    def _make_arg_parser(self):
+        parser = super()._make_arg_parser()
+
+        parser.add_argument(
+            '-o', '--output',
+            action='store', required=True,
+            help='compiled content file path'
+        )
+
+        return parser
+
+
+class CompiledContentFormat:
+    """Binary layout of the compiled content.
+
+    A header with the magic, the format version and a table of
+    (offset, length) pairs, one per section, followed by the sections
+    themselves. Every section is a little-endian array aligned to
+    `ALIGNMENT` bytes. Strings are stored once in a sorted string table
+    and referred to by index. Stops are sorted by key, routes by number
+    and description, so the same content always compiles to the same
+    bytes. Trip start minute lists are stored as they are or compressed
+    by `ScheduleCodec`, whichever is smaller.
+    """
+
+    MAGIC = b'BTCC'
+    VERSION = 2
+    ALIGNMENT = 8
+    HEADER = struct.Struct('<4sHH')
+    SECTION = struct.Struct('<II')
+
+    NO_STRING = 0xFFFFFFFF
+
+    HIDDEN_SET_FLAG = 0x01
+    HIDDEN_FLAG = 0x02
+    TRIPS_SET_FLAGS = (0x04, 0x08, 0x10)
+    TRIPS_COMPRESSED_FLAGS = (0x20, 0x40, 0x80)
+
+    # name, array type code
+    SECTIONS = (
+        ('string_offsets', 'I'),
+        ('string_data', 'B'),
+        ('stop_keys', 'I'),
+        ('stop_names', 'I'),
+        ('stop_directions', 'I'),
+        ('stop_latitudes', 'd'),
+        ('stop_longitudes', 'd'),
+        ('route_numbers', 'I'),
+        ('route_descriptions', 'I'),
+        ('route_flags', 'B'),
+        ('route_stop_offsets', 'I'),
+        ('route_stop_indexes', 'I'),
+        ('route_stop_shifts', 'H'),
+        ('trip_offsets', 'I'),
+        ('trip_data', 'H')
+    )
+
+    @classmethod
+    def header_size(cls):
+        return cls.HEADER.size + cls.SECTION.size * len(cls.SECTIONS)
+
+    @classmethod
+    def route_sort_key(cls, route):
+        return route.number, route.description
+
+    @classmethod
+    def read_section_table(cls, data):
+        """Validate the header of compiled content `data` and return
+        (offset, length) pairs of its sections keyed by section name
+        """
+        if len(data) < cls.header_size():
+            raise CompiledContentError('File is too short')
+
+        magic, version, section_count = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise CompiledContentError('Not a compiled content file')
+        if version != cls.VERSION or section_count != len(cls.SECTIONS):
+            raise CompiledContentError(
+                'Unsupported format version {}'.format(version)
+            )
+
+        table = {}
+        for i, (name, _) in enumerate(cls.SECTIONS):
+            offset, length = cls.SECTION.unpack_from(
+                data, cls.HEADER.size + cls.SECTION.size * i
+            )
+            if offset + length > len(data):
+                raise CompiledContentError(
+                    'Section {} is out of file bounds'.format(name)
+                )
+            table[name] = offset, length
+
+        return table
+
+
+class ContentCompiler:
+    def compile(self, content):
+        return CompiledContentEncoder().encode(
+            [self._make_stop(x.value) for x in content.stops],
+            [self._make_route(x.value) for x in content.routes]
+        )
+
+    def _make_stop(self, stop):
+        return CompiledStop(
+            key=stop.key.value,
+            name=stop.name.value,
+            direction=_value_or_none(stop.direction),
+            latitude=stop.latitude.value,
+            longitude=stop.longitude.value
+        )
+
+    def _make_route(self, route):
+        return CompiledRoute(
+            number=route.number.value,
+            description=route.description.value,
+            hidden=_value_or_none(route.hidden),
+            stops=tuple(
+                (x.value.key.value, TimeShift.to_minutes(x.value.shift.value))
+                for x in route.stops.value
+            ),
+            trips=RouteTrip._make(
+                self._make_minutes(x) for x in route.trips.value
+            )
+        )
+
+    def _make_minutes(self, times_item):
+        if times_item is None:
+            return None
+        return tuple(TimeShift.to_minutes(x.value) for x in times_item.value)
+
+
+class CompiledContentEncoder:
+    def encode(self, stops, routes):
+        stops = sorted(stops, key=lambda x: x.key)
+        routes = sorted(routes, key=CompiledContentFormat.route_sort_key)
+
+        strings = self._collect_strings(stops, routes)
+        string_ids = {x: i for i, x in enumerate(strings)}
+        stop_indexes = {x.key: i for i, x in enumerate(stops)}
+
+        sections = self._make_sections()
+        self._encode_strings(sections, strings)
+        self._encode_stops(sections, stops, string_ids)
+        self._encode_routes(sections, routes, string_ids, stop_indexes)
+
+        return self._pack(sections)
+
+    def _collect_strings(self, stops, routes):
+        strings = set()
+
+        for stop in stops:
+            strings.update((stop.key, stop.name))
+            if stop.direction is not None:
+                strings.add(stop.direction)
+
+        for route in routes:
+            strings.update((route.number, route.description))
+
+        return sorted(strings)
+
+    def _make_sections(self):
+        return {
+            name: array.array(type_code)
+            for name, type_code in CompiledContentFormat.SECTIONS
+        }
+
+    def _encode_strings(self, sections, strings):
+        offsets = sections['string_offsets']
+        data = sections['string_data']
+
+        offsets.append(0)
+        for string in strings:
+            data.frombytes(string.encode('utf8'))
+            offsets.append(len(data))
+
+    def _encode_stops(self, sections, stops, string_ids):
+        for stop in stops:
+            sections['stop_keys'].append(string_ids[stop.key])
+            sections['stop_names'].append(string_ids[stop.name])
+            sections['stop_directions'].append(
+                string_ids[stop.direction] if stop.direction is not None
+                else CompiledContentFormat.NO_STRING
+            )
+            sections['stop_latitudes'].append(stop.latitude)
+            sections['stop_longitudes'].append(stop.longitude)
+
+    def _encode_routes(self, sections, routes, string_ids, stop_indexes):
+        sections['route_stop_offsets'].append(0)
+        sections['trip_offsets'].append(0)
+
+        for route in routes:
+            sections['route_numbers'].append(string_ids[route.number])
+            sections['route_descriptions'].append(
+                string_ids[route.description]
+            )
+            trip_data = [ScheduleCodec.encode(x or ()) for x in route.trips]
+            sections['route_flags'].append(
+                self._make_flags(route, [x[0] for x in trip_data])
+            )
+
+            for key, shift in route.stops:
+                sections['route_stop_indexes'].append(stop_indexes[key])
+                sections['route_stop_shifts'].append(shift)
+            sections['route_stop_offsets'].append(
+                len(sections['route_stop_indexes'])
+            )
+
+            for _, data in trip_data:
+                sections['trip_data'].extend(data)
+                sections['trip_offsets'].append(len(sections['trip_data']))
+
+    def _make_flags(self, route, trips_compressed):
+        flags = 0
+
+        if route.hidden is not None:
+            flags |= CompiledContentFormat.HIDDEN_SET_FLAG
+            if route.hidden:
+                flags |= CompiledContentFormat.HIDDEN_FLAG
+
+        for flag, minutes in zip(
+                CompiledContentFormat.TRIPS_SET_FLAGS, route.trips):
+            if minutes is not None:
+                flags |= flag
+
+        for flag, compressed in zip(
+                CompiledContentFormat.TRIPS_COMPRESSED_FLAGS,
+                trips_compressed):
+            if compressed:
+                flags |= flag
+
+        return flags
+
+    def _pack(self, sections):
+        offset = CompiledContentFormat.header_size()
+        table = []
+        bodies = []
+
+        for name, _ in CompiledContentFormat.SECTIONS:
+            padding = -offset % CompiledContentFormat.ALIGNMENT
+            body = _to_little_endian_bytes(sections[name])
+            offset += padding
+            table.append(CompiledContentFormat.SECTION.pack(offset, len(body)))
+            bodies.append(b'\0' * padding + body)
+            offset += len(body)
+
+        header = CompiledContentFormat.HEADER.pack(
+            CompiledContentFormat.MAGIC,
+            CompiledContentFormat.VERSION,
+            len(CompiledContentFormat.SECTIONS)
+        )
+
+        return b''.join([header] + table + bodies)
+
+
+class CompiledContentDecoder:
+    def decode(self, data):
+        sections = self._unpack(data)
+
+        strings = self._decode_strings(sections)
+        stops = self._decode_stops(sections, strings)
+        routes = self._decode_routes(sections, strings, stops)
+
+        return stops, routes
+
+    def _unpack(self, data):
+        table = CompiledContentFormat.read_section_table(data)
+
+        return {
+            name: _from_little_endian_bytes(
+                type_code, data[table[name][0]:sum(table[name])]
+            )
+            for name, type_code in CompiledContentFormat.SECTIONS
+        }
+
+    def _decode_strings(self, sections):
+        offsets = sections['string_offsets']
+        data = sections['string_data'].tobytes()
+
+        return [
+            data[offsets[i]:offsets[i + 1]].decode('utf8')
+            for i in range(len(offsets) - 1)
+        ]
+
+    def _decode_stops(self, sections, strings):
+        return [
+            CompiledStop(
+                key=strings[key],
+                name=strings[name],
+                direction=(
+                    strings[direction]
+                    if direction != CompiledContentFormat.NO_STRING else None
+                ),
+                latitude=latitude,
+                longitude=longitude
+            )
+            for key, name, direction, latitude, longitude in zip(
+                sections['stop_keys'],
+                sections['stop_names'],
+                sections['stop_directions'],
+                sections['stop_latitudes'],
+                sections['stop_longitudes']
+            )
+        ]
+
+    def _decode_routes(self, sections, strings, stops):
+        stop_offsets = sections['route_stop_offsets']
+        stop_indexes = sections['route_stop_indexes']
+        stop_shifts = sections['route_stop_shifts']
+        trip_offsets = sections['trip_offsets']
+        trip_data = sections['trip_data']
+        day_type_count = len(RouteTrip._fields)
+
+        routes = []
+        for i, flags in enumerate(sections['route_flags']):
+            stop_range = range(stop_offsets[i], stop_offsets[i + 1])
+            trips = []
+            for j, (flag, compressed_flag) in enumerate(zip(
+                    CompiledContentFormat.TRIPS_SET_FLAGS,
+                    CompiledContentFormat.TRIPS_COMPRESSED_FLAGS)):
+                k = i * day_type_count + j
+                trips.append(
+                    tuple(ScheduleCodec.decode(
+                        trip_data[trip_offsets[k]:trip_offsets[k + 1]],
+                        flags & compressed_flag
+                    ))
+                    if flags & flag else None
+                )
+
+            routes.append(CompiledRoute(
+                number=strings[sections['route_numbers'][i]],
+                description=strings[sections['route_descriptions'][i]],
+                hidden=(
+                    bool(flags & CompiledContentFormat.HIDDEN_FLAG)
+                    if flags & CompiledContentFormat.HIDDEN_SET_FLAG
+                    else None
+                ),
+                stops=tuple(
+                    (stops[stop_indexes[x]].key, stop_shifts[x])
+                    for x in stop_range
+                ),
+                trips=RouteTrip._make(trips)
+            ))
+
+        return routes
+
+
+class ScheduleCodec:
+    """Compress trip start minute lists made of regular headway series.
+
+    A compressed list is its run count, its runs and the rest of its
+    minutes, exceptions, in their order. A run is an (index, start, step,
+    count) quadruple of minutes with a constant positive step, `index`
+    being the number of exceptions preceding the run, so decoding restores
+    the exact list, irregular or repeated minutes included. Lists are only
+    compressed when that makes them smaller.
+    """
+
+    RUN_SIZE = 4
+    # a run takes as much space as this many minutes
+    MIN_RUN_COUNT = RUN_SIZE + 1
+
+    @classmethod
+    def encode(cls, minutes):
+        """Return whether `minutes` are compressed and their data"""
+        runs = []
+        exceptions = []
+
+        i = 0
+        while i < len(minutes):
+            count = cls._get_run_count(minutes, i)
+            if count >= cls.MIN_RUN_COUNT:
+                runs += [
+                    len(exceptions), minutes[i], minutes[i + 1] - minutes[i],
+                    count
+                ]
+                i += count
+            else:
+                exceptions.append(minutes[i])
+                i += 1
+
+        data = [len(runs) // cls.RUN_SIZE] + runs + exceptions
+        if len(data) < len(minutes):
+            return True, data
+        return False, list(minutes)
+
+    @classmethod
+    def _get_run_count(cls, minutes, start):
+        if start + 1 >= len(minutes):
+            return 1
+
+        step = minutes[start + 1] - minutes[start]
+        if step <= 0:
+            return 1
+
+        end = start + 2
+        while end < len(minutes) and minutes[end] - minutes[end - 1] == step:
+            end += 1
+        return end - start
+
+    @classmethod
+    def decode(cls, data, compressed):
+        """Return minutes of `data` as `array`; runs are expanded by
+        `range`s and exceptions copied by slices, not minute by minute
+        """
+        if not compressed:
+            return array.array('H', data)
+
+        run_end = 1 + data[0] * cls.RUN_SIZE
+        exceptions = data[run_end:]
+        minutes = array.array('H')
+        position = 0
+
+        for i in range(1, run_end, cls.RUN_SIZE):
+            index, start, step, count = data[i:i + cls.RUN_SIZE]
+            minutes.extend(exceptions[position:index])
+            minutes.extend(range(start, start + step * count, step))
+            position = index
+        minutes.extend(exceptions[position:])
+
+        return minutes
+
+
+class CompiledContentError(Exception):
+    pass
+
+
+def _value_or_none(item):
+    return item.value if item is not None else None
+
+
+def _to_little_endian_bytes(values):
+    if sys.byteorder != 'little':
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian_bytes(type_code, data):
+    values = array.array(type_code)
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+if __name__ == '__main__':
+    Application().run()
@@ -0,0 +1,133 @@
+# coding: utf-8
+
+import pytest
+
+from compiler import *
+from validator import Content
+from validator_test import StringYamlNodeSource
+
+
+STOPS = '''
+stops:
+  - key: key2
+    name: name2
+    direction: direction2
+    latitude: 55.5418
+    longitude: 28.666802
+  - key: key1
+    name: name1
+    latitude: 55.542185
+    longitude: 28.666802
+'''
+
+ROUTES = '''
+routes:
+  - number: 1
+    description: description1
+    hidden: true
+    stops:
+      - key: key1
+        shift: 00:00
+      - key: key2
+        shift: 00:02
+    trips:
+      workdays:
+        - 05:59
+        - 06:30
+      weekend:
+        - 07:00
+'''
+
+
+def compile_content(stops=STOPS, routes=ROUTES):
+    return ContentCompiler().compile(
+        Content(StringYamlNodeSource([stops]), StringYamlNodeSource([routes]))
+    )
+
+
+class TestContentCompiler:
+    def test_round_trip(self):
+        stops, routes = CompiledContentDecoder().decode(compile_content())
+
+        assert stops == [
+            CompiledStop('key1', 'name1', None, 55.542185, 28.666802),
+            CompiledStop('key2', 'name2', 'direction2', 55.5418, 28.666802)
+        ]
+        assert routes == [
+            CompiledRoute(
+                number='1',
+                description='description1',
+                hidden=True,
+                stops=(('key1', 0), ('key2', 2)),
+                trips=RouteTrip(
+                    workdays=(359, 390), weekend=(420,), everyday=None
+                )
+            )
+        ]
+
+    def test_sections_aligned(self):
+        data = compile_content()
+
+        for i in range(len(CompiledContentFormat.SECTIONS)):
+            offset, _ = CompiledContentFormat.SECTION.unpack_from(
+                data,
+                CompiledContentFormat.HEADER.size +
+                CompiledContentFormat.SECTION.size * i
+            )
+            assert offset % CompiledContentFormat.ALIGNMENT == 0
+
+    def test_deterministic(self):
+        first, second = STOPS.split('  - key: key1')
+        reordered = 'stops:\n  - key: key1' + second + first.split('stops:')[1]
+
+        assert compile_content() == compile_content(stops=reordered)
+
+    def test_not_compiled_content_fails(self):
+        with pytest.raises(CompiledContentError) as ex_info:
+            CompiledContentDecoder().decode(b'some bytes' * 100)
+        assert 'Not a compiled content file' in str(ex_info.value)
+
+
+class TestScheduleCodec:
+    def test_regular_series_compressed(self):
+        minutes = [300, 315, 330, 345, 360, 375, 390, 400, 420, 440, 460, 480,
+                   500, 1380]
+
+        compressed, data = ScheduleCodec.encode(minutes)
+
+        assert compressed
+        assert data == [2, 0, 300, 15, 7, 0, 400, 20, 6, 1380]
+        assert list(ScheduleCodec.decode(data, compressed)) == minutes
+
+    def test_exceptions_keep_order(self):
+        minutes = [290, 300, 310, 320, 330, 340, 335, 350, 360, 370, 380, 390,
+                   390, 100]
+
+        compressed, data = ScheduleCodec.encode(minutes)
+
+        assert compressed
+        assert list(ScheduleCodec.decode(data, compressed)) == minutes
+
+    def test_irregular_list_not_compressed(self):
+        minutes = [359, 390, 420, 445, 500, 512, 513]
+
+        assert ScheduleCodec.encode(minutes) == (False, minutes)
+        assert list(ScheduleCodec.decode(minutes, False)) == minutes
+
+    def test_compiled_round_trip(self):
+        routes = ROUTES.replace(
+            '        - 05:59\n        - 06:30\n',
+            ''.join(
+                '        - {}\n'.format(TimeShift.from_minutes(x))
+                for x in range(300, 1200, 12)
+            )
+        )
+
+        _, decoded = CompiledContentDecoder().decode(
+            compile_content(routes=routes)
+        )
+
+        assert decoded[0].trips == RouteTrip(
+            workdays=tuple(range(300, 1200, 12)), weekend=(420,),
+            everyday=None
+        )
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import array
+import heapq
+import itertools
+import operator
+import os
+import struct
+import sys
+import tempfile
+
+import validator
+from compiler import _from_little_endian_bytes, _to_little_endian_bytes
+from validator import DayKind, ValidationError
+
+
+class Application(validator.Application):
+    def run(self):
+        args = self._parse_args()
+        content_dir = self._get_content_dir(args)
+
+        print('Building connections of content in {}...'.format(content_dir))
+
+        try:
+            content = self._create_and_validate(
+                *self._get_content_tree(args, content_dir)
+            )
+        except ValidationError as e:
+            print(e, file=sys.stderr)
+            sys.exit(self.VALIDATION_FAILED_STATUS)
+
+        count = ConnectionBuilder(args.chunk_size).write(content, args.output)
+
+        print('Saved {} connections to {}.'.format(count, args.output))
+
+    def _make_arg_parser(self):
+        parser = super()._make_arg_parser()
+
+        parser.add_argument(
+            '-o', '--output',
+            action='store', required=True,
+            help='connection table file path'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=ConnectionBuilder.CHUNK_SIZE,
+            help='number of connections sorted in memory at once'
+        )
+
+        return parser
+
+
+class ConnectionFormat:
+    """Binary layout of the connection table.
+
+    A header with the magic, the format version, the number of
+    connections and the length of stop keys, followed by stop keys as
+    newline separated UTF-8 and by one little-endian array per column,
+    every one aligned to `ALIGNMENT` bytes. Stops are indexes into stop
+    keys.
+    """
+
+    MAGIC = b'BTCT'
+    VERSION = 1
+    ALIGNMENT = 8
+    HEADER = struct.Struct('<4sHII')
+
+    # name, array type code
+    COLUMNS = (
+        ('departures', 'I'),
+        ('arrivals', 'I'),
+        ('from_stops', 'I'),
+        ('to_stops', 'I'),
+        ('trips', 'I'),
+        ('day_types', 'B')
+    )
+
+    @classmethod
+    def layout(cls, count, stop_keys_length):
+        """Return offsets of stop keys and of every column"""
+        offsets = [cls.HEADER.size]
+        offset = cls.HEADER.size + stop_keys_length
+
+        for _, type_code in cls.COLUMNS:
+            offset += -offset % cls.ALIGNMENT
+            offsets.append(offset)
+            offset += array.array(type_code).itemsize * count
+
+        return offsets
+
+
+class ConnectionTable:
+    """Elementary hops of every trip, from a stop to the next one of its
+    route, as parallel arrays sorted by departure; hops departing at the
+    same minute keep route order, so a trip never reaches a stop after
+    leaving it.
+
+    Stops are indexes into `stop_keys`, in content order; trips are
+    numbered in route order and day types are `RouteTrip` field indexes.
+    """
+
+    def __init__(self, stop_keys, departures, arrivals, from_stops, to_stops,
+                 trips, day_types):
+        self.stop_keys = stop_keys
+        self.departures = departures
+        self.arrivals = arrivals
+        self.from_stops = from_stops
+        self.to_stops = to_stops
+        self.trips = trips
+        self.day_types = day_types
+
+    @classmethod
+    def build(cls, content):
+        return ConnectionBuilder().build(content)
+
+    def __len__(self):
+        return len(self.departures)
+
+    @property
+    def trip_count(self):
+        return max(self.trips) + 1 if self.trips else 0
+
+    def columns(self):
+        return [getattr(self, x) for x, _ in ConnectionFormat.COLUMNS]
+
+    def for_day_kind(self, day_kind):
+        """Return the table of connections running on `day_kind`"""
+        # day type -> 1 if its trips run on `day_kind`, as a byte table
+        running = bytes(
+            x in DayKind.day_type_indexes(day_kind) for x in range(256)
+        )
+        selectors = self.day_types.tobytes().translate(running)
+
+        return ConnectionTable(self.stop_keys, *(
+            array.array(x.typecode, itertools.compress(x, selectors))
+            for x in self.columns()
+        ))
+
+    def save(self, path):
+        stop_keys = self._encode_stop_keys(self.stop_keys)
+        offsets = ConnectionFormat.layout(len(self), len(stop_keys))
+
+        with open(path, 'wb') as file:
+            file.write(ConnectionFormat.HEADER.pack(
+                ConnectionFormat.MAGIC, ConnectionFormat.VERSION, len(self),
+                len(stop_keys)
+            ))
+            file.write(stop_keys)
+            for offset, column in zip(offsets[1:], self.columns()):
+                file.seek(offset)
+                file.write(_to_little_endian_bytes(column))
+
+    @classmethod
+    def _encode_stop_keys(cls, stop_keys):
+        return '\n'.join(stop_keys).encode('utf8')
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        if len(data) < ConnectionFormat.HEADER.size:
+            raise ConnectionTableError('File is too short')
+        magic, version, count, stop_keys_length = \
+            ConnectionFormat.HEADER.unpack_from(data)
+        if magic != ConnectionFormat.MAGIC:
+            raise ConnectionTableError('Not a connection table file')
+        if version != ConnectionFormat.VERSION:
+            raise ConnectionTableError(
+                'Unsupported format version {}'.format(version)
+            )
+
+        offsets = ConnectionFormat.layout(count, stop_keys_length)
+        stop_keys = data[offsets[0]:offsets[0] + stop_keys_length]
+        columns = []
+        for offset, (name, type_code) in zip(
+                offsets[1:], ConnectionFormat.COLUMNS):
+            column = _from_little_endian_bytes(type_code, data[
+                offset:offset + array.array(type_code).itemsize * count
+            ])
+            if len(column) != count:
+                raise ConnectionTableError(
+                    'Column {} is out of file bounds'.format(name)
+                )
+            columns.append(column)
+
+        return cls(
+            stop_keys.decode('utf8').split('\n') if stop_keys else [],
+            *columns
+        )
+
+
+class ConnectionBuilder:
+    """Build the connection table route by route in bounded memory.
+
+    About `chunk_size` connections are held in memory at once: each
+    chunk is sorted and spilled to a temporary file, then sorted chunks
+    are merged into the table columns. Hops of a route are made a column
+    at a time, one list per hop shifted over all trip start minutes.
+    """
+
+    CHUNK_SIZE = 1 << 20
+    # rows read from a chunk file or written to a column at once
+    BLOCK_SIZE = 1 << 14
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self._chunk_size = chunk_size
+
+    def build(self, content):
+        """Return `ConnectionTable` of `content`"""
+        stop_keys = [x.value.key.value for x in content.stops]
+        columns = [array.array(x) for _, x in ConnectionFormat.COLUMNS]
+
+        with tempfile.TemporaryDirectory() as directory:
+            for block in self._merge_blocks(content, stop_keys, directory):
+                for column, values in zip(columns, block):
+                    column.extend(values)
+
+        return ConnectionTable(stop_keys, *columns)
+
+    def write(self, content, path):
+        """Save the connection table of `content` to `path` without
+        holding it in memory and return the number of connections
+        """
+        stop_keys = [x.value.key.value for x in content.stops]
+        encoded_stop_keys = ConnectionTable._encode_stop_keys(stop_keys)
+
+        with tempfile.TemporaryDirectory() as directory:
+            runs, count = self._spill_runs(content, stop_keys, directory)
+            offsets = ConnectionFormat.layout(count, len(encoded_stop_keys))
+
+            with open(path, 'wb') as file:
+                file.write(ConnectionFormat.HEADER.pack(
+                    ConnectionFormat.MAGIC, ConnectionFormat.VERSION, count,
+                    len(encoded_stop_keys)
+                ))
+                file.write(encoded_stop_keys)
+
+                positions = offsets[1:]
+                for block in self._blocks(self._merge(runs)):
+                    for i, ((_, type_code), values) in enumerate(
+                            zip(ConnectionFormat.COLUMNS, block)):
+                        data = _to_little_endian_bytes(
+                            array.array(type_code, values)
+                        )
+                        file.seek(positions[i])
+                        file.write(data)
+                        positions[i] += len(data)
+
+                # the last column ends the file even if it is empty
+                file.truncate(positions[-1])
+
+        return count
+
+    def _merge_blocks(self, content, stop_keys, directory):
+        runs, _ = self._spill_runs(content, stop_keys, directory)
+        return self._blocks(self._merge(runs))
+
+    def _spill_runs(self, content, stop_keys, directory):
+        """Return sorted chunk paths and the number of connections"""
+        stop_indexes = {x: i for i, x in enumerate(stop_keys)}
+        runs = []
+        count = 0
+
+        for chunk in self._chunks(content, stop_indexes):
+            count += len(chunk[0])
+            path = os.path.join(directory, '{}.run'.format(len(runs)))
+            self._write_run(path, chunk)
+            runs.append(path)
+
+        return runs, count
+
+    def _chunks(self, content, stop_indexes):
+        index = content.index
+        chunk = self._make_chunk()
+        trip_count = 0
+
+        for key_items, shifts, route_trips in zip(
+                index.route_stop_keys, index.route_stop_shifts,
+                index.route_trip_minutes):
+            stops = [stop_indexes[x.value] for x in key_items]
+            hops = list(zip(stops, stops[1:], shifts, shifts[1:]))
+
+            for day_type, starts in enumerate(route_trips):
+                if not starts or not hops:
+                    continue
+                trips = range(trip_count, trip_count + len(starts))
+                trip_count += len(starts)
+
+                departures, arrivals, from_stops, to_stops, trip_column, \
+                    day_types = chunk
+                for from_stop, to_stop, departure, arrival in hops:
+                    departures.extend([x + departure for x in starts])
+                    arrivals.extend([x + arrival for x in starts])
+                    from_stops.extend(itertools.repeat(from_stop, len(starts)))
+                    to_stops.extend(itertools.repeat(to_stop, len(starts)))
+                    trip_column.extend(trips)
+                    day_types.extend(itertools.repeat(day_type, len(starts)))
+
+                if len(departures) >= self._chunk_size:
+                    yield chunk
+                    chunk = self._make_chunk()
+
+        if chunk[0]:
+            yield chunk
+
+    def _make_chunk(self):
+        return [array.array('I') for _ in ConnectionFormat.COLUMNS]
+
+    def _write_run(self, path, chunk):
+        """Sort `chunk` columns by departure and save them row by row"""
+        departures = chunk[0]
+        order = sorted(range(len(departures)), key=departures.__getitem__)
+        rows = array.array('I', [0]) * (len(order) * len(chunk))
+        for i, column in enumerate(chunk):
+            rows[i::len(chunk)] = array.array(
+                'I', map(column.__getitem__, order)
+            )
+
+        with open(path, 'wb') as file:
+            rows.tofile(file)
+
+    def _merge(self, runs):
+        return heapq.merge(
+            *(self._read_run(x) for x in runs), key=operator.itemgetter(0)
+        )
+
+    def _read_run(self, path):
+        width = len(ConnectionFormat.COLUMNS)
+
+        with open(path, 'rb') as file:
+            while True:
+                rows = array.array('I')
+                try:
+                    rows.fromfile(file, self.BLOCK_SIZE * width)
+                except EOFError:
+                    pass
+                if not rows:
+                    return
+                yield from zip(*(rows[i::width] for i in range(width)))
+
+    def _blocks(self, rows):
+        """Group `rows` in column tuples of `BLOCK_SIZE` rows"""
+        while True:
+            block = list(itertools.islice(rows, self.BLOCK_SIZE))
+            if not block:
+                return
+            yield list(zip(*block))
+
+
+class ConnectionTableError(Exception):
+    pass
+
+
+if __name__ == '__main__':
+    Application().run()
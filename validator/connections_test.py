@@ -0,0 +1,113 @@
+# coding: utf-8
+
+import pytest
+
+from connections import *
+from validator_test import make_content
+
+
+ROUTES = '''
+routes:
+  - number: 1
+    description: description1
+    stops:
+      - key: key1
+        shift: 00:00
+      - key: key2
+        shift: 00:10
+      - key: key3
+        shift: 00:10
+    trips:
+      workdays:
+        - 06:00
+        - 06:30
+      weekend:
+        - 08:00
+  - number: 2
+    description: description2
+    stops:
+      - key: key3
+        shift: 00:00
+      - key: key1
+        shift: 00:05
+    trips:
+      everyday:
+        - 06:10
+'''
+
+
+def rows(table):
+    return list(zip(*table.columns()))
+
+
+class TestConnectionTable:
+    # departure, arrival, from stop, to stop, trip, day type
+    ROWS = [
+        (360, 370, 0, 1, 0, 0),
+        (370, 370, 1, 2, 0, 0),
+        (370, 375, 2, 0, 3, 2),
+        (390, 400, 0, 1, 1, 0),
+        (400, 400, 1, 2, 1, 0),
+        (480, 490, 0, 1, 2, 1),
+        (490, 490, 1, 2, 2, 1)
+    ]
+
+    def test_build(self):
+        table = ConnectionTable.build(make_content(ROUTES))
+
+        assert table.stop_keys == ['key1', 'key2', 'key3']
+        assert rows(table) == self.ROWS
+        assert table.trip_count == 4
+
+    def test_build_in_chunks(self):
+        table = ConnectionBuilder(chunk_size=2).build(make_content(ROUTES))
+
+        assert rows(table) == self.ROWS
+
+    def test_for_day_kind(self):
+        table = ConnectionTable.build(make_content(ROUTES)) \
+            .for_day_kind('weekend')
+
+        assert rows(table) == [self.ROWS[2], self.ROWS[5], self.ROWS[6]]
+
+    def test_save_and_load(self, tmpdir):
+        path = str(tmpdir.join('connections.bin'))
+        ConnectionTable.build(make_content(ROUTES)).save(path)
+
+        table = ConnectionTable.load(path)
+
+        assert table.stop_keys == ['key1', 'key2', 'key3']
+        assert rows(table) == self.ROWS
+
+    def test_write(self, tmpdir):
+        path = str(tmpdir.join('connections.bin'))
+        saved_path = str(tmpdir.join('saved.bin'))
+
+        count = ConnectionBuilder(chunk_size=2).write(
+            make_content(ROUTES), path
+        )
+        ConnectionTable.build(make_content(ROUTES)).save(saved_path)
+
+        assert count == len(self.ROWS)
+        with open(path, 'rb') as file, open(saved_path, 'rb') as saved_file:
+            assert file.read() == saved_file.read()
+
+    def test_load_not_table_fails(self, tmpdir):
+        path = tmpdir.join('connections.bin')
+        path.write_binary(b'BTCC' + b'\0' * 16)
+
+        with pytest.raises(ConnectionTableError) as ex_info:
+            ConnectionTable.load(str(path))
+
+        assert str(ex_info.value) == 'Not a connection table file'
+
+    def test_load_truncated_fails(self, tmpdir):
+        path = str(tmpdir.join('connections.bin'))
+        ConnectionTable.build(make_content(ROUTES)).save(path)
+        with open(path, 'rb+') as file:
+            file.truncate(40)
+
+        with pytest.raises(ConnectionTableError) as ex_info:
+            ConnectionTable.load(path)
+
+        assert str(ex_info.value) == 'Column departures is out of file bounds'
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import argparse
+import hashlib
+import struct
+import sys
+import zlib
+from collections import namedtuple
+
+from compiler import (
+    CompiledContentDecoder, CompiledContentEncoder, CompiledContentError,
+    CompiledRoute, CompiledStop
+)
+from validator import RouteTrip
+
+
+ContentDelta = namedtuple(
+    'ContentDelta',
+    'base_digest, target_digest, upserted_stops, removed_stop_keys, '
+    'upserted_routes, removed_route_keys'
+)
+
+
+class Application:
+    def run(self):
+        args = self._parse_args()
+
+        try:
+            args.func(args)
+        except (CompiledContentError, DeltaError) as e:
+            print(e, file=sys.stderr)
+            sys.exit(-1)
+
+    def _parse_args(self):
+        parser = argparse.ArgumentParser()
+        subparsers = parser.add_subparsers(dest='command')
+        subparsers.required = True
+
+        make_parser = subparsers.add_parser(
+            'make', help='make a delta between two compiled content files'
+        )
+        make_parser.add_argument('base', help='older compiled content file')
+        make_parser.add_argument('target', help='newer compiled content file')
+        make_parser.add_argument(
+            '-o', '--output', required=True, help='delta file path'
+        )
+        make_parser.set_defaults(func=self._make)
+
+        apply_parser = subparsers.add_parser(
+            'apply', help='patch compiled content file with a delta'
+        )
+        apply_parser.add_argument('base', help='older compiled content file')
+        apply_parser.add_argument('delta', help='delta file')
+        apply_parser.add_argument(
+            '-o', '--output', required=True,
+            help='patched compiled content file path'
+        )
+        apply_parser.set_defaults(func=self._apply)
+
+        return parser.parse_args()
+
+    def _make(self, args):
+        delta = ContentDeltaBuilder().build(
+            self._read(args.base), self._read(args.target)
+        )
+        self._write(args.output, ContentDeltaEncoder().encode(delta))
+
+    def _read(self, path):
+        with open(path, 'rb') as file:
+            return file.read()
+
+    def _write(self, path, data):
+        with open(path, 'wb') as file:
+            file.write(data)
+
+    def _apply(self, args):
+        delta = ContentDeltaDecoder().decode(self._read(args.delta))
+        self._write(
+            args.output, ContentDeltaApplier().apply(
+                self._read(args.base), delta
+            )
+        )
+
+
+class ContentDeltaBuilder:
+    """Build a `ContentDelta` turning `base` compiled content into `target`
+    compiled content. Stops are keyed by their keys, routes by number and
+    description; a changed record is shipped whole.
+    """
+
+    def build(self, base, target):
+        base_stops, base_routes = CompiledContentDecoder().decode(base)
+        target_stops, target_routes = CompiledContentDecoder().decode(target)
+
+        base_stops = {x.key: x for x in base_stops}
+        target_stops = {x.key: x for x in target_stops}
+        base_routes = {_route_key(x): x for x in base_routes}
+        target_routes = {_route_key(x): x for x in target_routes}
+
+        return ContentDelta(
+            base_digest=_digest(base),
+            target_digest=_digest(target),
+            upserted_stops=self._upserted(base_stops, target_stops),
+            removed_stop_keys=self._removed(base_stops, target_stops),
+            upserted_routes=self._upserted(base_routes, target_routes),
+            removed_route_keys=self._removed(base_routes, target_routes)
+        )
+
+    def _upserted(self, base, target):
+        return [y for x, y in target.items() if base.get(x) != y]
+
+    def _removed(self, base, target):
+        return [x for x in base if x not in target]
+
+
+class ContentDeltaApplier:
+    def apply(self, base, delta):
+        if _digest(base) != delta.base_digest:
+            raise DeltaError('Delta does not match the base content')
+
+        stops, routes = CompiledContentDecoder().decode(base)
+        stops = {x.key: x for x in stops}
+        routes = {_route_key(x): x for x in routes}
+
+        for key in delta.removed_stop_keys:
+            del stops[key]
+        for key in delta.removed_route_keys:
+            del routes[key]
+        stops.update((x.key, x) for x in delta.upserted_stops)
+        routes.update((_route_key(x), x) for x in delta.upserted_routes)
+
+        target = CompiledContentEncoder().encode(
+            list(stops.values()), list(routes.values())
+        )
+        if _digest(target) != delta.target_digest:
+            raise DeltaError('Patched content does not match the target')
+
+        return target
+
+
+class ContentDeltaFormat:
+    """A header with the magic, the format version and SHA-256 digests of
+    the base and target compiled content, followed by zlib compressed
+    records encoded with variable-length integers.
+    """
+
+    MAGIC = b'BTCD'
+    VERSION = 1
+    HEADER = struct.Struct('<4sH32s32s')
+    FLOAT = struct.Struct('<d')
+
+    NONE_TAG = 0
+
+
+class ContentDeltaEncoder:
+    def encode(self, delta):
+        self._buffer = bytearray()
+
+        self._write_list(delta.upserted_stops, self._write_stop)
+        self._write_list(delta.removed_stop_keys, self._write_string)
+        self._write_list(delta.upserted_routes, self._write_route)
+        self._write_list(delta.removed_route_keys, self._write_route_key)
+
+        header = ContentDeltaFormat.HEADER.pack(
+            ContentDeltaFormat.MAGIC, ContentDeltaFormat.VERSION,
+            delta.base_digest, delta.target_digest
+        )
+
+        return header + zlib.compress(bytes(self._buffer), 9)
+
+    def _write_list(self, values, write_func):
+        self._write_uint(len(values))
+        for value in values:
+            write_func(value)
+
+    def _write_uint(self, value):
+        while value >= 0x80:
+            self._buffer.append(value & 0x7F | 0x80)
+            value >>= 7
+        self._buffer.append(value)
+
+    def _write_string(self, value):
+        data = value.encode('utf8')
+        self._write_uint(len(data))
+        self._buffer += data
+
+    def _write_optional_string(self, value):
+        # strings are shifted by one to reserve zero length for `None`
+        if value is None:
+            self._write_uint(ContentDeltaFormat.NONE_TAG)
+        else:
+            data = value.encode('utf8')
+            self._write_uint(len(data) + 1)
+            self._buffer += data
+
+    def _write_stop(self, stop):
+        self._write_string(stop.key)
+        self._write_string(stop.name)
+        self._write_optional_string(stop.direction)
+        self._buffer += ContentDeltaFormat.FLOAT.pack(stop.latitude)
+        self._buffer += ContentDeltaFormat.FLOAT.pack(stop.longitude)
+
+    def _write_route_key(self, key):
+        self._write_string(key[0])
+        self._write_string(key[1])
+
+    def _write_route(self, route):
+        self._write_route_key(_route_key(route))
+        self._write_uint(
+            ContentDeltaFormat.NONE_TAG if route.hidden is None
+            else 1 + route.hidden
+        )
+
+        self._write_uint(len(route.stops))
+        for key, shift in route.stops:
+            self._write_string(key)
+            self._write_uint(shift)
+
+        for minutes in route.trips:
+            self._write_minutes(minutes)
+
+    def _write_minutes(self, minutes):
+        # trips are sorted in most cases, so store differences shifted by
+        # one to reserve zero length for `None`, zigzag encoded
+        if minutes is None:
+            self._write_uint(ContentDeltaFormat.NONE_TAG)
+            return
+
+        self._write_uint(len(minutes) + 1)
+        previous = 0
+        for minute in minutes:
+            difference = minute - previous
+            self._write_uint(
+                difference << 1 if difference >= 0 else -difference << 1 | 1
+            )
+            previous = minute
+
+
+class ContentDeltaDecoder:
+    def decode(self, data):
+        if len(data) < ContentDeltaFormat.HEADER.size:
+            raise DeltaError('Delta file is too short')
+
+        magic, version, base_digest, target_digest = \
+            ContentDeltaFormat.HEADER.unpack_from(data)
+        if magic != ContentDeltaFormat.MAGIC:
+            raise DeltaError('Not a delta file')
+        if version != ContentDeltaFormat.VERSION:
+            raise DeltaError('Unsupported delta version {}'.format(version))
+
+        try:
+            self._buffer = zlib.decompress(
+                data[ContentDeltaFormat.HEADER.size:]
+            )
+        except zlib.error as e:
+            raise DeltaError('Corrupted delta: {}'.format(e))
+        self._position = 0
+
+        try:
+            return ContentDelta(
+                base_digest=base_digest,
+                target_digest=target_digest,
+                upserted_stops=self._read_list(self._read_stop),
+                removed_stop_keys=self._read_list(self._read_string),
+                upserted_routes=self._read_list(self._read_route),
+                removed_route_keys=self._read_list(self._read_route_key)
+            )
+        except (IndexError, UnicodeDecodeError, struct.error):
+            raise DeltaError('Corrupted delta')
+
+    def _read_list(self, read_func):
+        return [read_func() for _ in range(self._read_uint())]
+
+    def _read_uint(self):
+        value = 0
+        shift = 0
+        while True:
+            byte = self._buffer[self._position]
+            self._position += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def _read_bytes(self, length):
+        data = self._buffer[self._position:self._position + length]
+        if len(data) != length:
+            raise IndexError()
+        self._position += length
+        return data
+
+    def _read_string(self):
+        return self._read_bytes(self._read_uint()).decode('utf8')
+
+    def _read_optional_string(self):
+        length = self._read_uint()
+        if length == ContentDeltaFormat.NONE_TAG:
+            return None
+        return self._read_bytes(length - 1).decode('utf8')
+
+    def _read_float(self):
+        return ContentDeltaFormat.FLOAT.unpack(
+            self._read_bytes(ContentDeltaFormat.FLOAT.size)
+        )[0]
+
+    def _read_stop(self):
+        return CompiledStop(
+            key=self._read_string(),
+            name=self._read_string(),
+            direction=self._read_optional_string(),
+            latitude=self._read_float(),
+            longitude=self._read_float()
+        )
+
+    def _read_route_key(self):
+        return self._read_string(), self._read_string()
+
+    def _read_route(self):
+        number, description = self._read_route_key()
+        hidden = self._read_uint()
+
+        return CompiledRoute(
+            number=number,
+            description=description,
+            hidden=(
+                None if hidden == ContentDeltaFormat.NONE_TAG
+                else bool(hidden - 1)
+            ),
+            stops=tuple(
+                (self._read_string(), self._read_uint())
+                for _ in range(self._read_uint())
+            ),
+            trips=RouteTrip._make(
+                self._read_minutes() for _ in RouteTrip._fields
+            )
+        )
+
+    def _read_minutes(self):
+        length = self._read_uint()
+        if length == ContentDeltaFormat.NONE_TAG:
+            return None
+
+        minutes = []
+        previous = 0
+        for _ in range(length - 1):
+            value = self._read_uint()
+            previous += -(value >> 1) if value & 1 else value >> 1
+            minutes.append(previous)
+
+        return tuple(minutes)
+
+
+class DeltaError(Exception):
+    pass
+
+
+def _route_key(route):
+    return route.number, route.description
+
+
+def _digest(data):
+    return hashlib.sha256(data).digest()
+
+
+if __name__ == '__main__':
+    Application().run()
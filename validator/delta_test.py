@@ -0,0 +1,62 @@
+# coding: utf-8
+
+import pytest
+
+from delta import *
+from compiler_test import ROUTES, STOPS, compile_content
+
+
+class TestContentDelta:
+    def test_apply_produces_target(self):
+        base = compile_content()
+        target = compile_content(
+            stops=STOPS.replace('key: key2', 'key: key3')
+                       .replace('name: name1', 'name: name3'),
+            routes=ROUTES.replace('key: key2', 'key: key3')
+                         .replace('- 07:00', '- 07:05')
+        )
+
+        delta = self._make_delta(base, target)
+
+        assert ContentDeltaApplier().apply(base, delta) == target
+        assert [x.key for x in delta.upserted_stops] == ['key1', 'key3']
+        assert delta.removed_stop_keys == ['key2']
+        assert len(delta.upserted_routes) == 1
+        assert delta.removed_route_keys == []
+
+    def _make_delta(self, base, target):
+        data = ContentDeltaEncoder().encode(
+            ContentDeltaBuilder().build(base, target)
+        )
+        return ContentDeltaDecoder().decode(data)
+
+    def test_same_content_is_empty(self):
+        base = compile_content()
+
+        delta = self._make_delta(base, base)
+
+        assert not delta.upserted_stops
+        assert not delta.upserted_routes
+        assert ContentDeltaApplier().apply(base, delta) == base
+
+    def test_route_removed(self):
+        base = compile_content()
+        target = compile_content(
+            routes=ROUTES.replace('number: 1', 'number: 2')
+        )
+
+        delta = self._make_delta(base, target)
+
+        assert delta.removed_route_keys == [('1', 'description1')]
+        assert ContentDeltaApplier().apply(base, delta) == target
+
+    def test_wrong_base_fails(self):
+        base = compile_content()
+        target = compile_content(
+            routes=ROUTES.replace('number: 1', 'number: 2')
+        )
+        delta = self._make_delta(base, target)
+
+        with pytest.raises(DeltaError) as ex_info:
+            ContentDeltaApplier().apply(target, delta)
+        assert 'does not match the base' in str(ex_info.value)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import argparse
+import os
+import sys
+from collections import namedtuple
+
+import validator
+from validator import Content, RouteTrip, TimeShift, ValidationError
+
+
+StopRecord = namedtuple(
+    'StopRecord', 'key, name, direction, latitude, longitude'
+)
+RouteRecord = namedtuple(
+    'RouteRecord', 'number, description, hidden, stops, trips'
+)
+StopChange = namedtuple('StopChange', 'key, old, new, fields')
+RouteChange = namedtuple(
+    'RouteChange',
+    'number, description, old, new, fields, added_trips, removed_trips'
+)
+ContentDiff = namedtuple(
+    'ContentDiff',
+    'added_stops, removed_stops, changed_stops, '
+    'added_routes, removed_routes, changed_routes'
+)
+
+
+class Application(validator.Application):
+    def run(self):
+        args = self._parse_args()
+
+        try:
+            diff = ContentDiffer().diff(
+                self._read_content(args.old_content_dir),
+                self._read_content(args.new_content_dir)
+            )
+        except ValidationError as e:
+            print(e, file=sys.stderr)
+            sys.exit(self.VALIDATION_FAILED_STATUS)
+
+        print(ContentDiffFormatter().format(diff))
+
+    def _parse_args(self):
+        parser = argparse.ArgumentParser()
+
+        parser.add_argument(
+            '--old-content-dir',
+            action='store', required=True,
+            help='content directory or archive of the previous release'
+        )
+        parser.add_argument(
+            '--new-content-dir',
+            action='store', required=True,
+            help='content directory or archive of the new release'
+        )
+
+        return parser.parse_args()
+
+    def _read_content(self, content_dir):
+        return Content(*self._make_sources(os.path.abspath(content_dir)))
+
+
+class ContentSnapshot:
+    """Content unwrapped from `Item`s and keyed for comparison: stops by
+    key, routes by (number, description), route trips by minute sets
+    """
+
+    def __init__(self, content):
+        self.stops = {}
+        self.routes = {}
+
+        for stop in (x.value for x in content.stops):
+            record = self._make_stop_record(stop)
+            self.stops.setdefault(record.key, record)
+
+        for route in (x.value for x in content.routes):
+            record = self._make_route_record(route)
+            self.routes.setdefault(
+                (record.number, record.description), record
+            )
+
+    @classmethod
+    def _make_stop_record(cls, stop):
+        return StopRecord(
+            key=stop.key.value,
+            name=stop.name.value,
+            direction=_value_or_none(stop.direction),
+            latitude=stop.latitude.value,
+            longitude=stop.longitude.value
+        )
+
+    @classmethod
+    def _make_route_record(cls, route):
+        trips = route.trips.value
+
+        return RouteRecord(
+            number=route.number.value,
+            description=route.description.value,
+            hidden=_value_or_none(route.hidden),
+            stops=tuple(
+                (x.value.key.value, TimeShift.to_minutes(x.value.shift.value))
+                for x in route.stops.value
+            ),
+            trips=RouteTrip._make(
+                cls._make_minute_set(x) for x in trips
+            )
+        )
+
+    @classmethod
+    def _make_minute_set(cls, times_item):
+        if times_item is None:
+            return None
+        return frozenset(
+            TimeShift.to_minutes(x.value) for x in times_item.value
+        )
+
+
+class ContentDiffer:
+    def diff(self, old_content, new_content):
+        return self.diff_snapshots(
+            ContentSnapshot(old_content), ContentSnapshot(new_content)
+        )
+
+    def diff_snapshots(self, old, new):
+        added_stops, removed_stops, common_stops = self._split_keys(
+            old.stops, new.stops
+        )
+        added_routes, removed_routes, common_routes = self._split_keys(
+            old.routes, new.routes
+        )
+
+        changed_stops = []
+        for key in common_stops:
+            fields = self._changed_fields(old.stops[key], new.stops[key])
+            if fields:
+                changed_stops.append(
+                    StopChange(key, old.stops[key], new.stops[key], fields)
+                )
+
+        changed_routes = []
+        for key in common_routes:
+            change = self._diff_route(old.routes[key], new.routes[key])
+            if change:
+                changed_routes.append(change)
+
+        return ContentDiff(
+            added_stops=[new.stops[x] for x in added_stops],
+            removed_stops=[old.stops[x] for x in removed_stops],
+            changed_stops=changed_stops,
+            added_routes=[new.routes[x] for x in added_routes],
+            removed_routes=[old.routes[x] for x in removed_routes],
+            changed_routes=changed_routes
+        )
+
+    def _split_keys(self, old_index, new_index):
+        added = [x for x in new_index if x not in old_index]
+        removed = [x for x in old_index if x not in new_index]
+        common = [x for x in new_index if x in old_index]
+
+        return added, removed, common
+
+    def _changed_fields(self, old_record, new_record):
+        return tuple(
+            field for field, old_value, new_value
+            in zip(old_record._fields, old_record, new_record)
+            if old_value != new_value
+        )
+
+    def _diff_route(self, old_route, new_route):
+        fields = self._changed_fields(old_route, new_route)
+        if not fields:
+            return None
+
+        added_trips = {}
+        removed_trips = {}
+        for day_type, old_set, new_set in zip(
+                RouteTrip._fields, old_route.trips, new_route.trips):
+            old_set = old_set or frozenset()
+            new_set = new_set or frozenset()
+            if new_set - old_set:
+                added_trips[day_type] = sorted(new_set - old_set)
+            if old_set - new_set:
+                removed_trips[day_type] = sorted(old_set - new_set)
+
+        return RouteChange(
+            number=new_route.number,
+            description=new_route.description,
+            old=old_route,
+            new=new_route,
+            fields=fields,
+            added_trips=added_trips,
+            removed_trips=removed_trips
+        )
+
+
+class ContentDiffFormatter:
+    def format(self, diff):
+        lines = []
+
+        for stop in diff.added_stops:
+            lines.append('+ stop {} ({})'.format(stop.key, stop.name))
+        for stop in diff.removed_stops:
+            lines.append('- stop {} ({})'.format(stop.key, stop.name))
+        for change in diff.changed_stops:
+            lines.append('~ stop {}: {}'.format(
+                change.key, ', '.join(change.fields)
+            ))
+
+        for route in diff.added_routes:
+            lines.append('+ route {} {}'.format(
+                route.number, route.description
+            ))
+        for route in diff.removed_routes:
+            lines.append('- route {} {}'.format(
+                route.number, route.description
+            ))
+        for change in diff.changed_routes:
+            lines.append('~ route {} {}: {}'.format(
+                change.number, change.description, ', '.join(change.fields)
+            ))
+            lines += self._format_trips('+', change.added_trips)
+            lines += self._format_trips('-', change.removed_trips)
+
+        return '\n'.join(lines) or 'No changes.'
+
+    def _format_trips(self, sign, trips):
+        return [
+            '    {} {}: {}'.format(
+                sign, day_type,
+                ' '.join(TimeShift.from_minutes(x) for x in minutes)
+            )
+            for day_type, minutes in trips.items()
+        ]
+
+
+def _value_or_none(item):
+    return item.value if item is not None else None
+
+
+if __name__ == '__main__':
+    Application().run()
@@ -0,0 +1,93 @@
+# coding: utf-8
+
+from differ import *
+from validator_test import StringYamlNodeSource
+
+
+STOPS = '''
+stops:
+  - key: key1
+    name: name1
+    latitude: 55.542185
+    longitude: 28.666802
+  - key: key2
+    name: name2
+    latitude: 55.5418
+    longitude: 28.666802
+'''
+
+ROUTES = '''
+routes:
+  - number: 1
+    description: description1
+    stops:
+      - key: key1
+        shift: 00:00
+      - key: key2
+        shift: 00:02
+    trips:
+      workdays:
+        - 05:59
+        - 06:30
+'''
+
+
+class TestContentDiffer:
+    def test_same_content_has_no_changes(self):
+        diff = self._diff(STOPS, ROUTES, STOPS, ROUTES)
+
+        assert diff == ContentDiff([], [], [], [], [], [])
+        assert ContentDiffFormatter().format(diff) == 'No changes.'
+
+    def _diff(self, old_stops, old_routes, new_stops, new_routes):
+        return ContentDiffer().diff(
+            Content(
+                StringYamlNodeSource([old_stops]),
+                StringYamlNodeSource([old_routes])
+            ),
+            Content(
+                StringYamlNodeSource([new_stops]),
+                StringYamlNodeSource([new_routes])
+            )
+        )
+
+    def test_stop_added_removed_and_moved(self):
+        new_stops = STOPS \
+            .replace('key: key1', 'key: key3') \
+            .replace('latitude: 55.5418', 'latitude: 55.5419')
+
+        diff = self._diff(STOPS, ROUTES, new_stops, ROUTES)
+
+        assert [x.key for x in diff.added_stops] == ['key3']
+        assert [x.key for x in diff.removed_stops] == ['key1']
+        assert len(diff.changed_stops) == 1
+        assert diff.changed_stops[0].key == 'key2'
+        assert diff.changed_stops[0].fields == ('latitude',)
+
+    def test_route_stops_and_trips_changed(self):
+        new_routes = ROUTES \
+            .replace('shift: 00:02', 'shift: 00:03') \
+            .replace('- 05:59', '- 07:00')
+
+        diff = self._diff(STOPS, ROUTES, STOPS, new_routes)
+
+        assert not diff.added_routes
+        assert not diff.removed_routes
+        assert len(diff.changed_routes) == 1
+
+        change = diff.changed_routes[0]
+        assert change.fields == ('stops', 'trips')
+        assert change.added_trips == {'workdays': [420]}
+        assert change.removed_trips == {'workdays': [359]}
+        assert '+ workdays: 07:00' in ContentDiffFormatter().format(diff)
+
+    def test_route_renamed_is_added_and_removed(self):
+        new_routes = ROUTES.replace('description1', 'description2')
+
+        diff = self._diff(STOPS, ROUTES, STOPS, new_routes)
+
+        assert [x.description for x in diff.added_routes] == ['description2']
+        assert [x.description for x in diff.removed_routes] == [
+            'description1'
+        ]
+        assert not diff.changed_routes
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import argparse
+import random
+import sys
+import time
+import traceback
+from collections import namedtuple
+
+from validator import (
+    RouteProducer, RouteTripProducer, StopProducer, TimeShift, ValidationError,
+    Yaml
+)
+
+
+FuzzResult = namedtuple(
+    'FuzzResult',
+    'producer, documents, accepted, rejected, false_rejections, crashes, '
+    'seconds'
+)
+FuzzFailure = namedtuple('FuzzFailure', 'document, error')
+
+
+class Application:
+    def run(self):
+        args = self._parse_args()
+
+        results = [
+            FuzzHarness(x, random.Random(args.seed)).run(args.count)
+            for x in args.producers or FuzzHarness.TARGETS
+        ]
+        print(FuzzResultFormatter().format(results))
+
+        if any(x.crashes or x.false_rejections for x in results):
+            sys.exit(-1)
+
+    def _parse_args(self):
+        parser = argparse.ArgumentParser()
+
+        parser.add_argument(
+            '-p', '--producer', dest='producers', action='append',
+            choices=tuple(FuzzHarness.TARGETS),
+            help='producer to fuzz, may be repeated; defaults to all'
+        )
+        parser.add_argument(
+            '-n', '--count', type=int, default=1000,
+            help='documents per producer'
+        )
+        parser.add_argument(
+            '-s', '--seed', type=int, default=0, help='random seed'
+        )
+
+        return parser.parse_args()
+
+
+class DocumentGenerator:
+    """Generate YAML documents for producers as lists of lines.
+
+    Valid documents follow the content schema; `mutate` breaks a valid
+    document the ways content gets broken: malformed `hh:mm`, wrong node
+    kinds, duplicate, missing and unexpected keys, out of range
+    coordinates and YAML syntax errors.
+    """
+
+    KEY_CHARS = 'abcdefghijklmnopqrstuvwxyz0123456789-'
+    BAD_TIMES = (
+        '7:20', '07:60', '07-20', '0720', '07:2', 'aa:bb', '-1:00', '07:20:00',
+        '', '~', '07 20', '٠٧:٢x'
+    )
+    BAD_FLOATS = ('1e400', 'nan', '-inf', 'north', '55,5', '', '0x1F', '90.1')
+    WRONG_KINDS = ('[1, 2]', '{a: b}', '[]', '{}', '&a [*a]')
+    SYNTAX_ERRORS = (']', '{', '- : -', '"', 'key: [', '\t', '*undefined')
+
+    def __init__(self, random):
+        self._random = random
+
+    def stop(self):
+        lines = [
+            'key: {}'.format(self._key()),
+            'name: {}'.format(self._name()),
+            'latitude: {}'.format(self._random.uniform(55.4, 55.6)),
+            'longitude: {}'.format(self._random.uniform(28.4, 28.9))
+        ]
+        if self._random.random() < 0.5:
+            lines.append('direction: {}'.format(self._name()))
+
+        self._random.shuffle(lines)
+        return lines
+
+    def _key(self):
+        # a leading dash would read as a block sequence entry
+        return self._random.choice(self.KEY_CHARS[:-1]) + ''.join(
+            self._random.choice(self.KEY_CHARS)
+            for _ in range(self._random.randint(0, 29))
+        )
+
+    def _name(self):
+        return self._random.choice(
+            (
+                'Коптево',
+                'Больничный городок',
+                'ОАО «Нафтан»',
+                'Stop',
+                '123'
+            )
+        )
+
+    def route(self):
+        lines = [
+            'number: {}'.format(self._random.randint(1, 100)),
+            'description: {}'.format(self._name()),
+            'stops:'
+        ]
+
+        shift = 0
+        for _ in range(self._random.randint(1, 20)):
+            lines += [
+                '  - key: {}'.format(self._key()),
+                '    shift: {}'.format(TimeShift.from_minutes(shift))
+            ]
+            shift += self._random.randint(0, 5)
+
+        if self._random.random() < 0.3:
+            lines.append('hidden: {}'.format(
+                self._random.choice(('true', 'false'))
+            ))
+
+        lines.append('trips:')
+        lines += ['  ' + x for x in self.route_trip()]
+
+        return lines
+
+    def route_trip(self):
+        if self._random.random() < 0.5:
+            day_types = ['everyday']
+        else:
+            day_types = self._random.choice(
+                (['workdays'], ['weekend'], ['workdays', 'weekend'])
+            )
+
+        lines = []
+        for day_type in day_types:
+            lines.append('{}:'.format(day_type))
+            lines += [
+                '  - {}'.format(TimeShift.from_minutes(x))
+                for x in sorted(self._random.sample(
+                    range(5 * 60, 25 * 60), self._random.randint(1, 50)
+                ))
+            ]
+
+        return lines
+
+    def mutate(self, lines):
+        mutation = self._random.choice((
+            self._break_time, self._break_float, self._break_kind,
+            self._duplicate_line, self._drop_line, self._add_unexpected_key,
+            self._break_syntax
+        ))
+        return mutation(list(lines))
+
+    def _break_time(self, lines):
+        return self._replace_value(
+            lines, lambda x: ':' in x[-3:], self.BAD_TIMES
+        )
+
+    def _replace_value(self, lines, predicate, values):
+        indexes = [
+            i for i, x in enumerate(lines)
+            if predicate(self._value(x))
+        ]
+        if not indexes:
+            return self._break_syntax(lines)
+
+        i = self._random.choice(indexes)
+        head = lines[i][:len(lines[i]) - len(self._value(lines[i]))]
+        lines[i] = head + self._random.choice(values)
+        return lines
+
+    def _value(self, line):
+        if line.lstrip().startswith('- ') and ':' not in line.lstrip()[2:5]:
+            return line.lstrip()[2:]
+        if ': ' in line:
+            return line.split(': ', 1)[1]
+        if line.lstrip().startswith('- '):
+            return line.lstrip()[2:]
+        return ''
+
+    def _break_float(self, lines):
+        return self._replace_value(
+            lines,
+            lambda x: x.replace('.', '', 1).isdigit() and '.' in x,
+            self.BAD_FLOATS
+        )
+
+    def _break_kind(self, lines):
+        return self._replace_value(lines, bool, self.WRONG_KINDS)
+
+    def _duplicate_line(self, lines):
+        i = self._random.randrange(len(lines))
+        lines.insert(i, lines[i])
+        return lines
+
+    def _drop_line(self, lines):
+        del lines[self._random.randrange(len(lines))]
+        return lines
+
+    def _add_unexpected_key(self, lines):
+        lines.insert(
+            self._random.randrange(len(lines) + 1),
+            self._random.choice(('unexpected: 1', 'Key: x', 'shift: 00:00'))
+        )
+        return lines
+
+    def _break_syntax(self, lines):
+        i = self._random.randrange(len(lines))
+        position = self._random.randint(0, len(lines[i]))
+        lines[i] = lines[i][:position] + \
+            self._random.choice(self.SYNTAX_ERRORS) + lines[i][position:]
+        return lines
+
+
+class FuzzHarness:
+    """Feed a producer with generated valid and broken documents.
+
+    A producer passes when it accepts every valid document and rejects
+    broken ones with nothing but `ValidationError`; broken documents may
+    still be accepted when a mutation happens to keep them valid.
+    """
+
+    # producer name -> producer class, `DocumentGenerator` method name
+    TARGETS = dict(
+        stop=(StopProducer, 'stop'),
+        route=(RouteProducer, 'route'),
+        route_trip=(RouteTripProducer, 'route_trip')
+    )
+    MUTATION_RATE = 0.7
+
+    def __init__(self, name, random):
+        self._name = name
+        self._random = random
+        producer_class, generator_name = self.TARGETS[name]
+        self._producer = producer_class()
+        self._generate = getattr(DocumentGenerator(random), generator_name)
+        self._mutate = DocumentGenerator(random).mutate
+
+    def run(self, count):
+        documents = [self._make_document() for _ in range(count)]
+
+        accepted = rejected = 0
+        false_rejections = []
+        crashes = []
+
+        start = time.perf_counter()
+        for text, valid in documents:
+            try:
+                self._producer.produce(Yaml.create_root_node(text))
+                accepted += 1
+            except ValidationError as e:
+                rejected += 1
+                if valid:
+                    false_rejections.append(FuzzFailure(text, str(e)))
+            except Exception:
+                crashes.append(FuzzFailure(text, traceback.format_exc()))
+        seconds = time.perf_counter() - start
+
+        return FuzzResult(
+            producer=self._name,
+            documents=count,
+            accepted=accepted,
+            rejected=rejected,
+            false_rejections=false_rejections,
+            crashes=crashes,
+            seconds=seconds
+        )
+
+    def _make_document(self):
+        lines = self._generate()
+        valid = self._random.random() >= self.MUTATION_RATE
+        if not valid:
+            lines = self._mutate(lines)
+        return '\n'.join(lines) + '\n', valid
+
+
+class FuzzResultFormatter:
+    def format(self, results):
+        lines = []
+
+        for result in results:
+            lines.append(
+                '{}: {} documents, {} accepted, {} rejected, {} false '
+                'rejections, {} crashes, {:.0f} documents per second'.format(
+                    result.producer, result.documents, result.accepted,
+                    result.rejected, len(result.false_rejections),
+                    len(result.crashes),
+                    result.documents / result.seconds if result.seconds
+                    else float('inf')
+                )
+            )
+            for failure in result.false_rejections + result.crashes:
+                lines += ['', failure.document, failure.error]
+
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    Application().run()
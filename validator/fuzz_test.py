@@ -0,0 +1,41 @@
+# coding: utf-8
+
+import random
+
+import pytest
+
+from fuzz import *
+from validator import Yaml
+
+
+class TestDocumentGenerator:
+    @pytest.mark.parametrize('name', sorted(FuzzHarness.TARGETS))
+    def test_generates_valid_documents(self, name):
+        producer_class, generator_name = FuzzHarness.TARGETS[name]
+        generate = getattr(DocumentGenerator(random.Random(0)), generator_name)
+
+        for _ in range(50):
+            producer_class().produce(
+                Yaml.create_root_node('\n'.join(generate()) + '\n')
+            )
+
+    def test_mutate_does_not_change_given_lines(self):
+        generator = DocumentGenerator(random.Random(0))
+        lines = generator.stop()
+        original = list(lines)
+
+        for _ in range(20):
+            generator.mutate(lines)
+
+        assert lines == original
+
+
+class TestFuzzHarness:
+    @pytest.mark.parametrize('name', sorted(FuzzHarness.TARGETS))
+    def test_producers_only_raise_validation_errors(self, name):
+        result = FuzzHarness(name, random.Random(0)).run(200)
+
+        assert result.crashes == []
+        assert result.false_rejections == []
+        assert result.accepted + result.rejected == result.documents
+        assert result.rejected > 0
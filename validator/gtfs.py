@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import csv
+import datetime
+import io
+import sys
+import zipfile
+
+import validator
+from validator import RouteTrip, TimeShift, ValidationError
+
+
+class Application(validator.Application):
+    def run(self):
+        args = self._parse_args()
+        content_dir = self._get_content_dir(args)
+
+        print('Exporting content in {}...'.format(content_dir))
+
+        try:
+            content = self._create_and_validate(
+                *self._get_content_tree(args, content_dir)
+            )
+        except ValidationError as e:
+            print(e, file=sys.stderr)
+            sys.exit(self.VALIDATION_FAILED_STATUS)
+
+        start_date = args.start_date or datetime.date.today()
+        GtfsExporter(
+            Agency(args.agency_name, args.agency_url, args.agency_timezone),
+            start_date,
+            args.end_date or start_date + datetime.timedelta(days=365)
+        ).export(content, args.output)
+
+        print('GTFS feed written to {}.'.format(args.output))
+
+    def _make_arg_parser(self):
+        parser = super()._make_arg_parser()
+
+        parser.add_argument(
+            '-o', '--output',
+            action='store', required=True,
+            help='GTFS feed zip file path'
+        )
+        parser.add_argument(
+            '--agency-name', default=Agency.NAME, help='agency name'
+        )
+        parser.add_argument(
+            '--agency-url', default=Agency.URL, help='agency URL'
+        )
+        parser.add_argument(
+            '--agency-timezone', default=Agency.TIMEZONE,
+            help='agency timezone'
+        )
+        parser.add_argument(
+            '--start-date', type=self._parse_date,
+            help='service start date, YYYYMMDD; defaults to today'
+        )
+        parser.add_argument(
+            '--end-date', type=self._parse_date,
+            help='service end date, YYYYMMDD; defaults to a year after '
+                 'start date'
+        )
+
+        return parser
+
+    def _parse_date(self, value):
+        return datetime.datetime.strptime(value, GtfsExporter.DATE_FORMAT) \
+            .date()
+
+
+class Agency:
+    ID = 'bus-time'
+    NAME = 'Bus Time'
+    URL = 'https://github.com/IllyaZhihunou/content'
+    TIMEZONE = 'Europe/Minsk'
+
+    def __init__(self, name=NAME, url=URL, timezone=TIMEZONE):
+        self.name = name
+        self.url = url
+        self.timezone = timezone
+
+
+class GtfsExporter:
+    """Export content as a GTFS static feed.
+
+    Every route number is a GTFS route, every route direction and trip
+    start time is a GTFS trip running on the service of its day type.
+    Trips and stop times are generated lazily and streamed straight into
+    the zip file, so memory use does not grow with the network size.
+    """
+
+    DATE_FORMAT = '%Y%m%d'
+    BUS_ROUTE_TYPE = 3
+
+    # service id -> Monday..Sunday
+    SERVICE_DAYS = dict(
+        workdays=(1, 1, 1, 1, 1, 0, 0),
+        weekend=(0, 0, 0, 0, 0, 1, 1),
+        everyday=(1, 1, 1, 1, 1, 1, 1)
+    )
+
+    def __init__(self, agency, start_date, end_date):
+        self._agency = agency
+        self._start_date = start_date
+        self._end_date = end_date
+
+    def export(self, content, file):
+        catalogue = content.index.route_catalogue
+        directions = {
+            x: [y.route.value for y in catalogue.directions(x)]
+            for x in catalogue.numbers
+        }
+        tables = (
+            ('agency.txt', self._agency_rows()),
+            ('stops.txt', self._stop_rows(content)),
+            ('routes.txt', self._route_rows(directions)),
+            ('calendar.txt', self._calendar_rows()),
+            ('trips.txt', self._trip_rows(directions)),
+            ('stop_times.txt', self._stop_time_rows(directions))
+        )
+
+        with zipfile.ZipFile(file, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, rows in tables:
+                self._write_table(archive, name, rows)
+
+    def _write_table(self, archive, name, rows):
+        with archive.open(name, 'w') as binary:
+            with io.TextIOWrapper(binary, encoding='utf-8', newline='') \
+                    as text:
+                csv.writer(text, lineterminator='\n').writerows(rows)
+
+    def _agency_rows(self):
+        yield ('agency_id', 'agency_name', 'agency_url', 'agency_timezone')
+        yield (Agency.ID, self._agency.name, self._agency.url,
+               self._agency.timezone)
+
+    def _stop_rows(self, content):
+        yield ('stop_id', 'stop_name', 'stop_desc', 'stop_lat', 'stop_lon')
+        for stop in (x.value for x in content.stops):
+            yield (
+                stop.key.value,
+                stop.name.value,
+                stop.direction.value if stop.direction is not None else '',
+                stop.latitude.value,
+                stop.longitude.value
+            )
+
+    def _route_rows(self, directions):
+        yield ('route_id', 'agency_id', 'route_short_name', 'route_long_name',
+               'route_type')
+        for number, routes in directions.items():
+            yield (number, Agency.ID, number, routes[0].description.value,
+                   self.BUS_ROUTE_TYPE)
+
+    def _calendar_rows(self):
+        yield ('service_id', 'monday', 'tuesday', 'wednesday', 'thursday',
+               'friday', 'saturday', 'sunday', 'start_date', 'end_date')
+        for service_id in RouteTrip._fields:
+            yield (
+                (service_id,) + self.SERVICE_DAYS[service_id] + (
+                    self._start_date.strftime(self.DATE_FORMAT),
+                    self._end_date.strftime(self.DATE_FORMAT)
+                )
+            )
+
+    def _trip_rows(self, directions):
+        yield ('route_id', 'service_id', 'trip_id', 'trip_headsign',
+               'direction_id')
+        for number, direction_id, route, service_id, trip_id, _ in \
+                self._enumerate_trips(directions):
+            yield (number, service_id, trip_id, route.description.value,
+                   direction_id)
+
+    def _enumerate_trips(self, directions):
+        for number, routes in directions.items():
+            for i, route in enumerate(routes):
+                # GTFS has only two directions, leave the rest unspecified
+                direction_id = i if len(routes) <= 2 else ''
+                for service_id, times in zip(
+                        RouteTrip._fields, route.trips.value):
+                    if times is None:
+                        continue
+                    for j, time in enumerate(times.value):
+                        yield (
+                            number, direction_id, route, service_id,
+                            '{}-{}-{}-{}'.format(number, i, service_id, j),
+                            TimeShift.to_minutes(time.value)
+                        )
+
+    def _stop_time_rows(self, directions):
+        yield ('trip_id', 'arrival_time', 'departure_time', 'stop_id',
+               'stop_sequence')
+        for _, _, route, _, trip_id, start in \
+                self._enumerate_trips(directions):
+            for sequence, route_stop in enumerate(
+                    x.value for x in route.stops.value):
+                time = self._format_time(
+                    start + TimeShift.to_minutes(route_stop.shift.value)
+                )
+                yield (trip_id, time, time, route_stop.key.value, sequence)
+
+    def _format_time(self, minutes):
+        return '{}:00'.format(TimeShift.from_minutes(minutes))
+
+
+if __name__ == '__main__':
+    Application().run()
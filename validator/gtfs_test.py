@@ -0,0 +1,107 @@
+# coding: utf-8
+
+import csv
+import datetime
+import io
+import zipfile
+
+from gtfs import *
+from validator import Content
+from validator_test import StringYamlNodeSource
+
+
+STOPS = '''
+stops:
+  - key: key1
+    name: name1
+    direction: direction1
+    latitude: 55.542185
+    longitude: 28.666802
+  - key: key2
+    name: name2
+    latitude: 55.5418
+    longitude: 28.666802
+'''
+
+ROUTES = '''
+routes:
+  - number: 1
+    description: description1
+    stops:
+      - key: key1
+        shift: 00:00
+      - key: key2
+        shift: 00:02
+    trips:
+      workdays:
+        - 05:59
+        - 23:59
+  - number: 1
+    description: description2
+    stops:
+      - key: key2
+        shift: 00:00
+      - key: key1
+        shift: 00:03
+    trips:
+      everyday:
+        - 06:00
+'''
+
+
+class TestGtfsExporter:
+    def test_export(self):
+        tables = self._export()
+
+        assert set(tables) == {
+            'agency.txt', 'stops.txt', 'routes.txt', 'calendar.txt',
+            'trips.txt', 'stop_times.txt'
+        }
+        assert tables['stops.txt'][1] == [
+            'key1', 'name1', 'direction1', '55.542185', '28.666802'
+        ]
+        assert tables['routes.txt'][1:] == [
+            ['1', Agency.ID, '1', 'description1', '3']
+        ]
+        assert tables['calendar.txt'][1] == [
+            'workdays', '1', '1', '1', '1', '1', '0', '0',
+            '20240101', '20241231'
+        ]
+        assert tables['trips.txt'][1:] == [
+            ['1', 'workdays', '1-0-workdays-0', 'description1', '0'],
+            ['1', 'workdays', '1-0-workdays-1', 'description1', '0'],
+            ['1', 'everyday', '1-1-everyday-0', 'description2', '1']
+        ]
+
+    def _export(self):
+        content = Content(
+            StringYamlNodeSource([STOPS]), StringYamlNodeSource([ROUTES])
+        )
+        file = io.BytesIO()
+
+        GtfsExporter(
+            Agency(),
+            datetime.date(2024, 1, 1),
+            datetime.date(2024, 12, 31)
+        ).export(content, file)
+
+        with zipfile.ZipFile(file) as archive:
+            return {
+                x: list(csv.reader(
+                    io.TextIOWrapper(archive.open(x), encoding='utf-8')
+                ))
+                for x in archive.namelist()
+            }
+
+    def test_stop_times_after_midnight(self):
+        stop_times = self._export()['stop_times.txt']
+
+        assert stop_times[0] == [
+            'trip_id', 'arrival_time', 'departure_time', 'stop_id',
+            'stop_sequence'
+        ]
+        assert stop_times[3:5] == [
+            ['1-0-workdays-1', '23:59:00', '23:59:00', 'key1', '0'],
+            ['1-0-workdays-1', '24:01:00', '24:01:00', 'key2', '1']
+        ]
+        assert len(stop_times) == 7
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import gc
+import sys
+import tracemalloc
+from collections import namedtuple
+
+import validator
+from validator import RouteTripProducer, Producers, ValidationError, Yaml
+
+
+MemoryUsage = namedtuple(
+    'MemoryUsage', 'producer, unit, count, retained, peak, top'
+)
+AllocationSite = namedtuple('AllocationSite', 'file, line, size, count')
+
+
+class Application(validator.Application):
+    def run(self):
+        args = self._parse_args()
+        content_dir = self._get_content_dir(args)
+
+        print('Profiling memory of content in {}...'.format(content_dir))
+
+        try:
+            tree = self._get_content_tree(args, content_dir)
+            usages = MemoryProfiler(
+                *self._make_sources(tree.directory), args.top, tree.region
+            ).run()
+        except ValidationError as e:
+            print(e, file=sys.stderr)
+            sys.exit(self.VALIDATION_FAILED_STATUS)
+
+        print(MemoryUsageFormatter().format(usages))
+
+    def _make_arg_parser(self):
+        parser = super()._make_arg_parser()
+
+        parser.add_argument(
+            '-t', '--top', type=int, default=5,
+            help='number of allocation sites to show for each producer'
+        )
+
+        return parser
+
+
+class MemoryProfiler:
+    """Account memory kept by produced items, grouped by producer.
+
+    Each producer reads its documents under `tracemalloc` from a clean
+    state, keeping only the produced items, so `retained` is what `Content`
+    holds for them once their nodes are gone and `peak` adds the nodes of
+    the largest document. Trip times are produced on their own by
+    `RouteTripProducer` to tell them from the rest of a route.
+    """
+
+    # deep enough to reach the producing frame from namedtuple internals
+    FRAMES = 4
+
+    def __init__(self, stop_source, route_source, top=0, region=None):
+        self._stop_source = stop_source
+        self._route_source = route_source
+        self._top = top
+        self._region = region
+
+    def run(self):
+        return [self.profile_stops(), self.profile_routes(),
+                self.profile_route_trips()]
+
+    def profile_stops(self):
+        return self._profile('StopProducer', 'stop', self._produce_stops)
+
+    def profile_routes(self):
+        return self._profile('RouteProducer', 'route', self._produce_routes)
+
+    def profile_route_trips(self):
+        return self._profile(
+            'RouteTripProducer', 'trip time', self._produce_route_trips
+        )
+
+    def _warm_up(self):
+        """Import yaml and build shared producers outside of profiling"""
+        Yaml.create_root_node('')
+        Producers.stops(self._region)
+        Producers.routes()
+
+    def _produce_stops(self):
+        items = []
+        for root in self._stop_source.enumerate():
+            items += Producers.stops(self._region).produce(root) \
+                .value.stops.value
+        return items, len(items)
+
+    def _produce_routes(self):
+        items = []
+        for root in self._route_source.enumerate():
+            items += Producers.routes().produce(root).value.routes.value
+        return items, len(items)
+
+    def _produce_route_trips(self):
+        producer = RouteTripProducer()
+        items = []
+        count = 0
+
+        for root in self._route_source.enumerate():
+            for node in self._find_trip_nodes(root):
+                trip = producer.produce(node)
+                count += sum(len(x.value) for x in trip.value if x is not None)
+                items.append(trip)
+
+        return items, count
+
+    def _find_trip_nodes(self, root):
+        for key_node, routes_node in self._mapping_items(root):
+            if key_node.value != 'routes' or routes_node.id != 'sequence':
+                continue
+            for route_node in routes_node.value:
+                for key, value in self._mapping_items(route_node):
+                    if key.value == 'trips':
+                        yield value
+
+    def _mapping_items(self, node):
+        return node.value if node.id == 'mapping' else []
+
+    def _profile(self, producer, unit, produce):
+        self._warm_up()
+        gc.collect()
+        tracemalloc.start(self.FRAMES if self._top else 1)
+        try:
+            items, count = produce()
+            gc.collect()
+            retained, peak = tracemalloc.get_traced_memory()
+            top = self._group_by_site(self._take_snapshot())[:self._top] \
+                if self._top else []
+        finally:
+            tracemalloc.stop()
+        del items
+
+        return MemoryUsage(
+            producer=producer,
+            unit=unit,
+            count=count,
+            retained=retained,
+            peak=peak,
+            top=top
+        )
+
+    def _take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__)
+        ])
+
+    def _group_by_site(self, snapshot):
+        """Group traces by the most recent frame in the validator module,
+        so allocations inside namedtuple and yaml code count for the
+        producer line calling them
+        """
+        sites = {}
+        for trace in snapshot.traces:
+            frame = self._find_site_frame(trace.traceback)
+            size, count = sites.get(frame, (0, 0))
+            sites[frame] = (size + trace.size, count + 1)
+
+        return sorted(
+            (
+                AllocationSite(x.filename, x.lineno, size, count)
+                for x, (size, count) in sites.items()
+            ),
+            key=lambda x: x.size,
+            reverse=True
+        )
+
+    def _find_site_frame(self, traceback):
+        # frames are sorted from the oldest to the most recent one
+        for frame in reversed(traceback):
+            if frame.filename == validator.__file__:
+                return frame
+        return traceback[-1]
+
+
+class MemoryUsageFormatter:
+    def format(self, usages):
+        lines = []
+
+        for usage in usages:
+            lines.append(
+                '{}: {} {}s, {:.1f} KiB retained, {:.1f} KiB peak, {} bytes '
+                'per {}'.format(
+                    usage.producer, usage.count, usage.unit,
+                    usage.retained / 1024, usage.peak / 1024,
+                    usage.retained // usage.count if usage.count else 0,
+                    usage.unit
+                )
+            )
+            lines += [
+                '  {}:{}: {:.1f} KiB in {} blocks'.format(
+                    x.file, x.line, x.size / 1024, x.count
+                )
+                for x in usage.top
+            ]
+
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    Application().run()
@@ -0,0 +1,182 @@
+# coding: utf-8
+
+import gc
+import tracemalloc
+
+import yaml
+
+from memory import *
+from validator import (
+    Content, EmptyContentError, Mark, StreamingValidator, YamlNodeSource
+)
+from validator_test import StringYamlNodeSource
+
+
+class SyntheticRouteNodeSource(YamlNodeSource):
+    """Compose route documents node by node, skipping YAML parsing, which
+    would take most of the time of a large tree
+    """
+
+    STR_TAG = 'tag:yaml.org,2002:str'
+    SEQ_TAG = 'tag:yaml.org,2002:seq'
+    MAP_TAG = 'tag:yaml.org,2002:map'
+
+    def __init__(self, documents, routes_per_document, trips_per_route=2):
+        self._documents = documents
+        self._routes_per_document = routes_per_document
+        self._trips_per_route = trips_per_route
+
+    def enumerate(self):
+        for i in range(self._documents):
+            name = '{}.yaml'.format(i)
+            self._marks = (
+                yaml.Mark(name, 0, 0, 0, None, None),
+                yaml.Mark(name, 0, 0, 8, None, None)
+            )
+            yield self._mapping(routes=self._sequence([
+                self._route(i * self._routes_per_document + j)
+                for j in range(self._routes_per_document)
+            ]))
+
+    def _route(self, number):
+        return self._mapping(
+            number=self._scalar(str(number)),
+            description=self._scalar('description{}'.format(number)),
+            stops=self._sequence([
+                self._mapping(
+                    key=self._scalar('key{}-{}'.format(number, x)),
+                    shift=self._scalar('00:0{}'.format(x))
+                )
+                for x in range(2)
+            ]),
+            trips=self._mapping(everyday=self._sequence([
+                self._scalar('{:02}:{:02}'.format(*divmod(x, 60)))
+                for x in range(360, 360 + self._trips_per_route)
+            ]))
+        )
+
+    def _mapping(self, **items):
+        return yaml.MappingNode(
+            self.MAP_TAG,
+            [(self._scalar(k), v) for k, v in items.items()],
+            *self._marks
+        )
+
+    def _sequence(self, nodes):
+        return yaml.SequenceNode(self.SEQ_TAG, nodes, *self._marks)
+
+    def _scalar(self, value):
+        return yaml.ScalarNode(self.STR_TAG, value, *self._marks)
+
+
+class TestMemoryProfiler:
+    STOPS = '''
+        stops:
+          - key: key1
+            name: name1
+            latitude: 55.5
+            longitude: 28.5
+          - key: key2
+            name: name2
+            latitude: 55.5
+            longitude: 28.5
+    '''
+    ROUTES = '''
+        routes:
+          - number: 1
+            description: description1
+            stops:
+              - key: key1
+                shift: 00:00
+              - key: key2
+                shift: 00:02
+            trips:
+              workdays:
+                - 06:00
+                - 07:00
+              weekend:
+                - 08:00
+    '''
+
+    # a regression budget, not a target: peak for 10k routes of 2 stops and
+    # 2 trip times each was about 38 MiB when set
+    PEAK_BUDGET = 48 * 1024 * 1024
+
+    def make_profiler(self, top=0):
+        return MemoryProfiler(
+            StringYamlNodeSource([self.STOPS]),
+            StringYamlNodeSource([self.ROUTES]),
+            top
+        )
+
+    def test_counts_items_per_producer(self):
+        usages = self.make_profiler().run()
+
+        assert [(x.producer, x.count) for x in usages] == [
+            ('StopProducer', 2), ('RouteProducer', 1),
+            ('RouteTripProducer', 3)
+        ]
+        for usage in usages:
+            assert 0 < usage.retained <= usage.peak
+            assert usage.top == []
+
+    def test_top_sites_are_in_validator(self):
+        usage = self.make_profiler(top=3).profile_routes()
+
+        assert 0 < len(usage.top) <= 3
+        assert usage.top[0].file == validator.__file__
+        assert usage.top == sorted(
+            usage.top, key=lambda x: x.size, reverse=True
+        )
+
+    def test_items_do_not_keep_yaml_marks(self):
+        route = Producers.routes().produce(
+            Yaml.create_root_node(self.ROUTES)
+        ).value.routes.value[0]
+
+        assert type(route.start_mark) is Mark
+        assert type(route.value.trips.value.workdays.value[0].end_mark) \
+            is Mark
+
+    def test_large_tree_peak_within_budget(self):
+        profiler = MemoryProfiler(
+            StringYamlNodeSource([]), SyntheticRouteNodeSource(100, 100)
+        )
+        usage = profiler.profile_routes()
+
+        assert usage.count == 10000
+        assert usage.peak <= self.PEAK_BUDGET
+
+
+class TestStreamingValidatorMemory:
+    def _peak(self, validate):
+        # import yaml and build shared producers outside of tracing
+        Yaml.create_root_node('')
+        Producers.routes()
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            validate()
+        except EmptyContentError:
+            pass
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return peak
+
+    def test_peak_below_content_peak(self):
+        def source():
+            return SyntheticRouteNodeSource(20, 100, trips_per_route=20)
+
+        content_peak = self._peak(
+            lambda: Content(StringYamlNodeSource([]), source())
+        )
+        streaming_peak = self._peak(
+            lambda: StreamingValidator(
+                StringYamlNodeSource([]), source()
+            ).validate()
+        )
+
+        # trips are dropped with their document, stop keys are kept
+        assert streaming_peak < content_peak / 4
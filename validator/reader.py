@@ -0,0 +1,300 @@
+# coding: utf-8
+
+import abc
+import bisect
+import mmap
+import sys
+import weakref
+
+from compiler import (
+    CompiledContentFormat, ScheduleCodec, _from_little_endian_bytes
+)
+from validator import RouteTrip
+
+
+class ContentReader:
+    """Read compiled content without parsing or copying it.
+
+    Sections are exposed as `memoryview`s over the given buffer, usually a
+    memory-mapped compiled content file shared through the page cache by
+    every process that opens it. `Stop`, `Route`, `RouteStop` and
+    `RouteTrip` views read their fields on access. Views, and trip minute
+    arrays returned by them, must not be used after the reader is closed:
+    closing releases trip minute arrays still held by callers, so they
+    fail on access. Compressed trip minutes are decoded on access.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self._views = []
+        # id -> trip minute slice given out, released on close
+        self._trip_views = weakref.WeakValueDictionary()
+        self._sections = self._map_sections(buffer)
+
+        self.stops = StopListView(self)
+        self.routes = RouteListView(self)
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            return cls(buffer)
+        except Exception:
+            buffer.close()
+            raise
+
+    def _map_sections(self, buffer):
+        table = CompiledContentFormat.read_section_table(buffer)
+        data = self._export(memoryview(buffer))
+
+        sections = {}
+        for name, type_code in CompiledContentFormat.SECTIONS:
+            offset, length = table[name]
+            section = self._export(data[offset:offset + length])
+            if sys.byteorder == 'little':
+                sections[name] = self._export(section.cast(type_code))
+            else:
+                sections[name] = _from_little_endian_bytes(type_code, section)
+
+        return sections
+
+    def _export(self, view):
+        self._views.append(view)
+        return view
+
+    def _export_trips(self, view):
+        self._trip_views[id(view)] = view
+        return view
+
+    def close(self):
+        for view in list(self._trip_views.values()):
+            view.release()
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def section(self, name):
+        return self._sections[name]
+
+    def string(self, string_id):
+        offsets = self._sections['string_offsets']
+        return str(
+            self._sections['string_data'][
+                offsets[string_id]:offsets[string_id + 1]
+            ],
+            'utf8'
+        )
+
+    def find_stop(self, key):
+        """Return `StopView` with given `key` or `None`; stops are sorted by
+        key, so this is a binary search over the string table
+        """
+        index = bisect.bisect_left(_StopKeys(self), key)
+        if index < len(self.stops) and self.stops[index].key == key:
+            return self.stops[index]
+        return None
+
+
+class _StopKeys:
+    def __init__(self, reader):
+        self._reader = reader
+        self._keys = reader.section('stop_keys')
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getitem__(self, index):
+        return self._reader.string(self._keys[index])
+
+
+class _ListView(metaclass=abc.ABCMeta):
+    def __init__(self, reader, count):
+        self._reader = reader
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._make_view(index)
+
+    def __iter__(self):
+        return (self._make_view(x) for x in range(self._count))
+
+    @abc.abstractmethod
+    def _make_view(self, index):
+        """Return the view of item `index`"""
+        pass
+
+
+class StopListView(_ListView):
+    def __init__(self, reader):
+        super().__init__(reader, len(reader.section('stop_keys')))
+
+    def _make_view(self, index):
+        return StopView(self._reader, index)
+
+
+class RouteListView(_ListView):
+    def __init__(self, reader):
+        super().__init__(reader, len(reader.section('route_flags')))
+
+    def _make_view(self, index):
+        return RouteView(self._reader, index)
+
+
+class StopView:
+    __slots__ = ('_reader', 'index')
+
+    def __init__(self, reader, index):
+        self._reader = reader
+        self.index = index
+
+    @property
+    def key(self):
+        return self._reader.string(
+            self._reader.section('stop_keys')[self.index]
+        )
+
+    @property
+    def name(self):
+        return self._reader.string(
+            self._reader.section('stop_names')[self.index]
+        )
+
+    @property
+    def direction(self):
+        string_id = self._reader.section('stop_directions')[self.index]
+        if string_id == CompiledContentFormat.NO_STRING:
+            return None
+        return self._reader.string(string_id)
+
+    @property
+    def latitude(self):
+        return self._reader.section('stop_latitudes')[self.index]
+
+    @property
+    def longitude(self):
+        return self._reader.section('stop_longitudes')[self.index]
+
+
+class RouteView:
+    __slots__ = ('_reader', 'index')
+
+    def __init__(self, reader, index):
+        self._reader = reader
+        self.index = index
+
+    @property
+    def number(self):
+        return self._reader.string(
+            self._reader.section('route_numbers')[self.index]
+        )
+
+    @property
+    def description(self):
+        return self._reader.string(
+            self._reader.section('route_descriptions')[self.index]
+        )
+
+    @property
+    def hidden(self):
+        flags = self._reader.section('route_flags')[self.index]
+        if not flags & CompiledContentFormat.HIDDEN_SET_FLAG:
+            return None
+        return bool(flags & CompiledContentFormat.HIDDEN_FLAG)
+
+    @property
+    def stops(self):
+        offsets = self._reader.section('route_stop_offsets')
+        return RouteStopListView(
+            self._reader, offsets[self.index], offsets[self.index + 1]
+        )
+
+    @property
+    def trips(self):
+        return RouteTripView(self._reader, self.index)
+
+
+class RouteStopListView(_ListView):
+    def __init__(self, reader, start, end):
+        super().__init__(reader, end - start)
+        self._start = start
+
+    def _make_view(self, index):
+        return RouteStopView(self._reader, self._start + index)
+
+
+class RouteStopView:
+    __slots__ = ('_reader', 'index')
+
+    def __init__(self, reader, index):
+        self._reader = reader
+        self.index = index
+
+    @property
+    def stop(self):
+        return StopView(
+            self._reader,
+            self._reader.section('route_stop_indexes')[self.index]
+        )
+
+    @property
+    def key(self):
+        return self.stop.key
+
+    @property
+    def shift(self):
+        """Shift from the route start in minutes"""
+        return self._reader.section('route_stop_shifts')[self.index]
+
+
+class RouteTripView:
+    __slots__ = ('_reader', '_route_index')
+
+    def __init__(self, reader, route_index):
+        self._reader = reader
+        self._route_index = route_index
+
+    @property
+    def workdays(self):
+        return self._get_minutes(RouteTrip._fields.index('workdays'))
+
+    @property
+    def weekend(self):
+        return self._get_minutes(RouteTrip._fields.index('weekend'))
+
+    @property
+    def everyday(self):
+        return self._get_minutes(RouteTrip._fields.index('everyday'))
+
+    def _get_minutes(self, day_type_index):
+        """Return trip start minutes slice for given day type or `None`"""
+        flags = self._reader.section('route_flags')[self._route_index]
+        if not flags & CompiledContentFormat.TRIPS_SET_FLAGS[day_type_index]:
+            return None
+
+        offsets = self._reader.section('trip_offsets')
+        i = self._route_index * len(RouteTrip._fields) + day_type_index
+        data = self._reader.section('trip_data')[offsets[i]:offsets[i + 1]]
+
+        compressed_flag = \
+            CompiledContentFormat.TRIPS_COMPRESSED_FLAGS[day_type_index]
+        if flags & compressed_flag:
+            return memoryview(ScheduleCodec.decode(data, True))
+        return self._reader._export_trips(data)
@@ -0,0 +1,75 @@
+# coding: utf-8
+
+import pytest
+
+from reader import *
+from compiler_test import ROUTES, compile_content
+from validator import TimeShift
+
+
+class TestContentReader:
+    def test_stops(self):
+        reader = ContentReader(compile_content())
+
+        assert len(reader.stops) == 2
+        stop = reader.stops[1]
+        assert stop.key == 'key2'
+        assert stop.name == 'name2'
+        assert stop.direction == 'direction2'
+        assert stop.latitude == 55.5418
+        assert stop.longitude == 28.666802
+        assert reader.stops[0].direction is None
+
+    def test_routes(self):
+        reader = ContentReader(compile_content())
+
+        assert len(reader.routes) == 1
+        route = reader.routes[0]
+        assert route.number == '1'
+        assert route.description == 'description1'
+        assert route.hidden is True
+        assert [(x.key, x.shift) for x in route.stops] == [
+            ('key1', 0), ('key2', 2)
+        ]
+        assert isinstance(route.trips.workdays, memoryview)
+        assert list(route.trips.workdays) == [359, 390]
+        assert list(route.trips.weekend) == [420]
+        assert route.trips.everyday is None
+
+    def test_compressed_trips(self):
+        routes = ROUTES.replace(
+            '        - 05:59\n        - 06:30\n',
+            ''.join(
+                '        - {}\n'.format(TimeShift.from_minutes(x))
+                for x in range(300, 600, 15)
+            )
+        )
+        reader = ContentReader(compile_content(routes=routes))
+
+        workdays = reader.routes[0].trips.workdays
+        assert isinstance(workdays, memoryview)
+        assert list(workdays) == list(range(300, 600, 15))
+
+    def test_find_stop(self):
+        reader = ContentReader(compile_content())
+
+        assert reader.find_stop('key2').name == 'name2'
+        assert reader.find_stop('key0') is None
+        assert reader.find_stop('key3') is None
+
+    def test_open_file(self, tmpdir):
+        path = tmpdir.join('content.btc')
+        path.write_binary(compile_content())
+
+        with ContentReader.open(str(path)) as reader:
+            assert [x.key for x in reader.stops] == ['key1', 'key2']
+
+    def test_close_releases_held_trips(self, tmpdir):
+        path = tmpdir.join('content.btc')
+        path.write_binary(compile_content())
+
+        with ContentReader.open(str(path)) as reader:
+            workdays = reader.routes[0].trips.workdays
+
+        with pytest.raises(ValueError):
+            list(workdays)
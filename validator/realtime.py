@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import bisect
+import heapq
+import itertools
+import random
+import sys
+import time
+from collections import namedtuple
+
+import validator
+from validator import DayKind, TimeShift, ValidationError
+
+
+TripKey = namedtuple('TripKey', 'number, direction, trip')
+DelayUpdate = namedtuple('DelayUpdate', 'trip, stop, delay')
+Departure = namedtuple(
+    'Departure', 'minute, delay, number, description, trip'
+)
+
+
+class Application(validator.Application):
+    def run(self):
+        args = self._parse_args()
+        content_dir = self._get_content_dir(args)
+
+        try:
+            content = self._create_and_validate(
+                *self._get_content_tree(args, content_dir)
+            )
+        except ValidationError as e:
+            print(e, file=sys.stderr)
+            sys.exit(self.VALIDATION_FAILED_STATUS)
+
+        overlay = DelayOverlay(content, args.day)
+        updates = FeedSimulator(overlay, random.Random(args.seed)) \
+            .updates(args.count)
+
+        start = time.perf_counter()
+        for update in updates:
+            overlay.apply(update)
+        seconds = time.perf_counter() - start
+
+        print('Applied {} updates, {:.0f} updates per second.'.format(
+            args.count, args.count / seconds if seconds else float('inf')
+        ))
+
+        if args.board:
+            for departure in overlay.board(args.board, args.at, args.limit):
+                print('{} {:+d} {} {}'.format(
+                    TimeShift.from_minutes(departure.minute), departure.delay,
+                    departure.number, departure.description
+                ))
+
+    def _make_arg_parser(self):
+        parser = super()._make_arg_parser()
+
+        parser.add_argument(
+            '--day', choices=tuple(DayKind.DAY_TYPES), default='workdays',
+            help='day kind of the timetable'
+        )
+        parser.add_argument(
+            '-n', '--count', type=int, default=10000,
+            help='number of simulated delay updates'
+        )
+        parser.add_argument(
+            '-s', '--seed', type=int, default=0, help='random seed'
+        )
+        parser.add_argument(
+            '--board', help='stop key to show departures from'
+        )
+        parser.add_argument(
+            '--at', type=TimeShift.to_minutes, default='00:00',
+            help='show departures from time, hh:mm'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=10,
+            help='number of departures to show'
+        )
+
+        return parser
+
+
+class DelayOverlay:
+    """Realtime delays of trips running on a day kind over the static
+    timetable of `Content`.
+
+    A trip is a `TripKey` of its route number, direction index within the
+    number and index in the start time order of the direction trips. An
+    update of a trip delay at a stop holds for the rest of its stops until
+    a later update: only the stop index and the delay are recorded, so a
+    delay at a stop is a binary search over the updates of its trip.
+
+    Static departures of every stop are kept sorted, so a departure board
+    starts with a binary search too and only looks at departures whose
+    delay may move them into the board. A route leaves all of its stops
+    but the last one, where its trips end.
+    """
+
+    def __init__(self, content, day_kind):
+        self._trips = {}
+        self._departures = {}
+        self._delays = {}
+        self._min_delay = 0
+        self._max_delay = 0
+        self._stop_keys = [x.value.key.value for x in content.stops]
+
+        self._index(content, day_kind)
+
+    def _index(self, content, day_kind):
+        catalogue = content.index.route_catalogue
+        indexes = {id(x): i for i, x in enumerate(content.routes)}
+        day_type_indexes = DayKind.day_type_indexes(day_kind)
+        departures = {}
+
+        for number in catalogue.numbers:
+            for direction in catalogue.directions(number):
+                i = indexes[id(direction.route)]
+                trips = content.index.route_trip_minutes[i]
+                starts = sorted(itertools.chain.from_iterable(
+                    trips[x] for x in day_type_indexes if trips[x] is not None
+                ))
+                key_items = content.index.route_stop_keys[i]
+                description = direction.route.value.description.value
+
+                for trip, start in enumerate(starts):
+                    self._trips[TripKey(number, direction.index, trip)] = \
+                        (start, len(key_items))
+
+                for stop, (key_item, shift) in enumerate(zip(
+                        key_items[:-1], content.index.route_stop_shifts[i])):
+                    departures.setdefault(key_item.value, []).extend(
+                        (x + shift, number, description,
+                         TripKey(number, direction.index, trip), stop)
+                        for trip, x in enumerate(starts)
+                    )
+
+        for key, stop_departures in departures.items():
+            stop_departures.sort(key=lambda x: x[0])
+            self._departures[key] = (
+                [x[0] for x in stop_departures], stop_departures
+            )
+
+    @property
+    def trips(self):
+        """`TripKey`s of every trip"""
+        return self._trips.keys()
+
+    def stop_count(self, trip):
+        return self._trips[trip][1]
+
+    def apply(self, update):
+        """Record `DelayUpdate`, replacing updates of the trip from the same
+        stop on
+        """
+        if update.trip not in self._trips:
+            raise UnknownTripError(update.trip)
+        if not 0 <= update.stop < self._trips[update.trip][1]:
+            raise UnknownTripError(update.trip, update.stop)
+
+        stops, delays = self._delays.setdefault(update.trip, ([], []))
+        i = bisect.bisect_left(stops, update.stop)
+        del stops[i:], delays[i:]
+        stops.append(update.stop)
+        delays.append(update.delay)
+
+        self._min_delay = min(self._min_delay, update.delay)
+        self._max_delay = max(self._max_delay, update.delay)
+
+    def delay(self, trip, stop):
+        """Delay of `trip` at its stop index `stop` in minutes"""
+        updates = self._delays.get(trip)
+        if updates is None:
+            return 0
+
+        i = bisect.bisect_right(updates[0], stop)
+        return updates[1][i - 1] if i else 0
+
+    def board(self, stop_key, minute, count):
+        """Return the first `count` `Departure`s from stop `stop_key` at
+        `minute` or later, with delays
+        """
+        minutes, departures = self._departures.get(stop_key, ([], []))
+        board = []
+        if count <= 0:
+            return board
+
+        # departures earlier than `minute - max_delay` stay before `minute`
+        # and ones later than the board end plus `-min_delay` stay after it
+        for i in range(
+                bisect.bisect_left(minutes, minute - self._max_delay),
+                len(minutes)):
+            if len(board) == count and \
+                    minutes[i] + self._min_delay > -board[0][0]:
+                break
+
+            static_minute, number, description, trip, stop = departures[i]
+            delay = self.delay(trip, stop)
+            if static_minute + delay < minute:
+                continue
+
+            entry = (-(static_minute + delay), -i, Departure(
+                static_minute + delay, delay, number, description, trip
+            ))
+            if len(board) < count:
+                heapq.heappush(board, entry)
+            else:
+                heapq.heappushpop(board, entry)
+
+        return [x[2] for x in sorted(board, reverse=True)]
+
+    def station_board(self, station, minute, count):
+        """Return the first `count` `Departure`s from any stop of `Station`
+        at `minute` or later, with delays
+        """
+        return list(itertools.islice(heapq.merge(
+            *(self.board(self._stop_keys[x], minute, count)
+              for x in station.stops),
+            key=lambda x: x.minute
+        ), count))
+
+
+class FeedSimulator:
+    """Delay updates of a local vehicle feed.
+
+    Vehicles of random trips report at their stops in order, each delay
+    a random walk from the previous report of the trip.
+    """
+
+    MAX_STEP = 2  # minutes
+    MIN_DELAY = -3
+    MAX_DELAY = 30
+
+    def __init__(self, overlay, random):
+        self._overlay = overlay
+        self._random = random
+
+    def updates(self, count):
+        """Return `count` `DelayUpdate`s"""
+        trips = [x for x in self._overlay.trips if self._overlay.stop_count(x)]
+        vehicles = {}
+        updates = []
+
+        for _ in range(count):
+            trip = self._random.choice(trips)
+            stop, delay = vehicles.get(trip, (-1, 0))
+            stop = (stop + 1) % self._overlay.stop_count(trip)
+            delay = min(max(
+                delay + self._random.randint(-self.MAX_STEP, self.MAX_STEP),
+                self.MIN_DELAY
+            ), self.MAX_DELAY)
+            vehicles[trip] = stop, delay
+            updates.append(DelayUpdate(trip, stop, delay))
+
+        return updates
+
+
+class UnknownTripError(Exception):
+    def __init__(self, trip, stop=None):
+        super().__init__(trip, stop)
+        self.trip = trip
+        self.stop = stop
+
+    def __str__(self):
+        if self.stop is None:
+            return 'Trip {} not found.'.format(tuple(self.trip))
+        return 'Trip {} has no stop {}.'.format(tuple(self.trip), self.stop)
+
+
+if __name__ == '__main__':
+    Application().run()
@@ -0,0 +1,141 @@
+# coding: utf-8
+
+import array
+import random
+import time
+
+import pytest
+
+from realtime import *
+from validator import Station
+from validator_test import make_content
+
+
+ROUTES = '''
+routes:
+  - number: 1
+    description: description1
+    stops:
+      - key: key1
+        shift: 00:00
+      - key: key2
+        shift: 00:10
+      - key: key3
+        shift: 00:20
+    trips:
+      workdays:
+        - 06:00
+        - 06:30
+  - number: 2
+    description: description2
+    stops:
+      - key: key3
+        shift: 00:00
+      - key: key2
+        shift: 00:05
+    trips:
+      everyday:
+        - 06:12
+'''
+
+TRIP1 = TripKey('1', 0, 0)
+TRIP2 = TripKey('1', 0, 1)
+TRIP3 = TripKey('2', 0, 0)
+
+
+def make_overlay(day_kind='workdays'):
+    return DelayOverlay(make_content(ROUTES), day_kind)
+
+
+class TestDelayOverlay:
+    def test_delay_spreads_down_trip(self):
+        overlay = make_overlay()
+        overlay.apply(DelayUpdate(TRIP1, 1, 5))
+
+        assert [overlay.delay(TRIP1, x) for x in range(3)] == [0, 5, 5]
+        assert overlay.delay(TRIP2, 1) == 0
+
+    def test_later_update_replaces_rest_of_trip(self):
+        overlay = make_overlay()
+        overlay.apply(DelayUpdate(TRIP1, 2, 7))
+        overlay.apply(DelayUpdate(TRIP1, 1, 3))
+
+        assert [overlay.delay(TRIP1, x) for x in range(3)] == [0, 3, 3]
+
+    def test_unknown_trip_fails(self):
+        with pytest.raises(UnknownTripError) as ex_info:
+            make_overlay('weekend').apply(DelayUpdate(TRIP2, 0, 1))
+
+        assert str(ex_info.value) == "Trip ('1', 0, 1) not found."
+
+    def test_unknown_stop_fails(self):
+        with pytest.raises(UnknownTripError) as ex_info:
+            make_overlay().apply(DelayUpdate(TRIP3, 2, 1))
+
+        assert str(ex_info.value) == "Trip ('2', 0, 0) has no stop 2."
+
+    def test_board(self):
+        board = make_overlay().board('key2', TimeShift.to_minutes('06:00'), 3)
+
+        # key2 is the last stop of route 2
+        assert board == [
+            Departure(
+                TimeShift.to_minutes('06:10'), 0, '1', 'description1', TRIP1
+            ),
+            Departure(
+                TimeShift.to_minutes('06:40'), 0, '1', 'description1', TRIP2
+            )
+        ]
+
+    def test_board_with_delays(self):
+        overlay = make_overlay()
+        overlay.apply(DelayUpdate(TRIP1, 0, 10))
+        overlay.apply(DelayUpdate(TRIP2, 1, -3))
+
+        board = overlay.board('key2', TimeShift.to_minutes('06:12'), 2)
+
+        assert board == [
+            Departure(
+                TimeShift.to_minutes('06:20'), 10, '1', 'description1', TRIP1
+            ),
+            Departure(
+                TimeShift.to_minutes('06:37'), -3, '1', 'description1', TRIP2
+            )
+        ]
+
+    def test_station_board(self):
+        overlay = make_overlay()
+        station = Station('key', 'name', array.array('I', [0, 2]))
+
+        board = overlay.station_board(
+            station, TimeShift.to_minutes('06:00'), 3
+        )
+
+        assert board == [
+            Departure(
+                TimeShift.to_minutes('06:00'), 0, '1', 'description1', TRIP1
+            ),
+            Departure(
+                TimeShift.to_minutes('06:12'), 0, '2', 'description2', TRIP3
+            ),
+            Departure(
+                TimeShift.to_minutes('06:30'), 0, '1', 'description1', TRIP2
+            )
+        ]
+
+    def test_board_of_unknown_stop_is_empty(self):
+        assert make_overlay().board('key4', 0, 3) == []
+
+
+class TestFeedSimulator:
+    def test_updates_per_second(self):
+        overlay = make_overlay()
+        updates = FeedSimulator(overlay, random.Random(0)).updates(10000)
+
+        start = time.perf_counter()
+        for update in updates:
+            overlay.apply(update)
+            overlay.board('key2', TimeShift.to_minutes('06:00'), 3)
+        seconds = time.perf_counter() - start
+
+        assert seconds < 1
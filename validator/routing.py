@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import array
+import bisect
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import validator
+from connections import ConnectionTable
+from analytics import Table, TableFormatter
+from validator import DayKind, Geo, TimeShift, ValidationError
+
+
+Arrival = namedtuple('Arrival', 'key, minutes')
+
+
+class Application(validator.Application):
+    def run(self):
+        args = self._parse_args()
+        content_dir = self._get_content_dir(args)
+
+        try:
+            content = self._create_and_validate(
+                *self._get_content_tree(args, content_dir)
+            )
+            engine = IsochroneEngine.from_content(content, args.day)
+            table = args.func(engine, args)
+        except ValidationError as e:
+            print(e, file=sys.stderr)
+            sys.exit(self.VALIDATION_FAILED_STATUS)
+
+        TableFormatter.create(args.format).write(table, sys.stdout)
+
+    def _make_arg_parser(self):
+        parser = super()._make_arg_parser()
+
+        parser.add_argument(
+            '--day', choices=tuple(DayKind.DAY_TYPES), default='workdays',
+            help='day kind of the timetable'
+        )
+        parser.add_argument(
+            '--at', type=TimeShift.to_minutes, required=True,
+            help='departure time, hh:mm'
+        )
+        parser.add_argument(
+            '--budget', type=int, default=30, help='travel time budget, '
+                                                   'minutes'
+        )
+        parser.add_argument(
+            '--format', choices=tuple(TableFormatter.FORMATTERS),
+            default='csv', help='output format'
+        )
+
+        subparsers = parser.add_subparsers(dest='command')
+        subparsers.required = True
+
+        isochrone_parser = subparsers.add_parser(
+            'isochrone', help='stops reachable from a stop'
+        )
+        isochrone_parser.add_argument(
+            '--from', dest='start_key', required=True, help='start stop key'
+        )
+        isochrone_parser.set_defaults(func=self._isochrone_table)
+
+        subparsers.add_parser(
+            'batch',
+            help='number of stops reachable from every stop, with stop '
+                 'coordinates for heatmaps'
+        ).set_defaults(func=self._batch_table)
+
+        return parser
+
+    def _isochrone_table(self, engine, args):
+        return Table(
+            columns=['stop_key', 'arrival'],
+            rows=[
+                [x.key, TimeShift.from_minutes(x.minutes)]
+                for x in engine.isochrone(args.start_key, args.at, args.budget)
+            ]
+        )
+
+    def _batch_table(self, engine, args):
+        counts = engine.reachable_counts(args.at, args.budget)
+        return Table(
+            columns=['stop_key', 'latitude', 'longitude', 'reachable_stops'],
+            rows=[
+                [key, latitude, longitude, count]
+                for key, latitude, longitude, count in zip(
+                    engine.stop_keys, engine.latitudes, engine.longitudes,
+                    counts
+                )
+            ]
+        )
+
+
+class Footpaths:
+    """Walking transfers between stops close to each other, e.g. on the
+    opposite sides of a street
+    """
+
+    MAX_DISTANCE = 300  # meters
+
+    @classmethod
+    def from_coordinates(cls, latitudes, longitudes,
+                         max_distance=MAX_DISTANCE):
+        """Return (stop index, walking minutes) lists of every stop; stops
+        are swept in latitude order, so only stops within `max_distance`
+        by latitude are measured
+        """
+        order = sorted(range(len(latitudes)), key=latitudes.__getitem__)
+        sorted_latitudes = [latitudes[x] for x in order]
+        window = Geo.latitude_degrees(max_distance)
+
+        footpaths = [[] for _ in latitudes]
+        for i, stop in enumerate(order):
+            end = bisect.bisect_right(
+                sorted_latitudes, sorted_latitudes[i] + window
+            )
+            for other in order[i + 1:end]:
+                distance = Geo.distance(
+                    latitudes[stop], longitudes[stop],
+                    latitudes[other], longitudes[other]
+                )
+                if distance <= max_distance:
+                    minutes = Geo.walking_minutes(distance)
+                    footpaths[stop].append((other, minutes))
+                    footpaths[other].append((stop, minutes))
+
+        return footpaths
+
+
+class IsochroneEngine:
+    """Earliest arrivals from a stop within a travel time budget.
+
+    A single forward connection scan: connections departing from the
+    departure time on are scanned in departure order, a connection is
+    taken if its trip was already boarded or its departure stop is
+    reached by then, until departures exceed the budget. Reaching a stop
+    also reaches stops within a walk from it.
+    """
+
+    UNREACHED = 0xFFFFFFFF
+
+    def __init__(self, stop_keys, latitudes, longitudes, connections,
+                 footpaths):
+        self.stop_keys = stop_keys
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self._stop_indexes = {x: i for i, x in enumerate(stop_keys)}
+        self._connections = connections
+        self._footpaths = footpaths
+
+    @classmethod
+    def from_content(cls, content, day_kind):
+        stops = [x.value for x in content.stops]
+        stop_keys = [x.key.value for x in stops]
+        latitudes = [x.latitude.value for x in stops]
+        longitudes = [x.longitude.value for x in stops]
+
+        return cls(
+            stop_keys, latitudes, longitudes,
+            ConnectionTable.build(content).for_day_kind(day_kind),
+            Footpaths.from_coordinates(latitudes, longitudes)
+        )
+
+    def isochrone(self, start_key, departure, budget):
+        """Return `Arrival`s at every stop reachable from stop `start_key`
+        departing at `departure` minutes within `budget` minutes, in
+        arrival order
+        """
+        start = self._stop_indexes.get(start_key)
+        if start is None:
+            raise UnknownStopError(start_key)
+
+        arrivals = self._scan(start, departure, departure + budget)
+        return sorted(
+            (
+                Arrival(self.stop_keys[i], x)
+                for i, x in enumerate(arrivals) if x != self.UNREACHED
+            ),
+            key=lambda x: (x.minutes, x.key)
+        )
+
+    def _scan(self, start, departure, deadline):
+        connections = self._connections
+        departures = connections.departures
+        arrivals = connections.arrivals
+        from_stops = connections.from_stops
+        to_stops = connections.to_stops
+        trips = connections.trips
+
+        earliest = array.array('I', [self.UNREACHED]) * len(self.stop_keys)
+        boarded = bytearray(connections.trip_count)
+        self._reach(earliest, start, departure, deadline)
+
+        end = bisect.bisect_right(departures, deadline)
+        for i in range(bisect.bisect_left(departures, departure), end):
+            trip = trips[i]
+            if not boarded[trip]:
+                if earliest[from_stops[i]] > departures[i]:
+                    continue
+                boarded[trip] = 1
+            if arrivals[i] < earliest[to_stops[i]]:
+                self._reach(earliest, to_stops[i], arrivals[i], deadline)
+
+        return earliest
+
+    def _reach(self, earliest, stop, minutes, deadline):
+        if minutes > deadline:
+            return
+        earliest[stop] = minutes
+        for other, walk in self._footpaths[stop]:
+            if minutes + walk < earliest[other] and minutes + walk <= deadline:
+                earliest[other] = minutes + walk
+
+    def reachable_counts(self, departure, budget, executor=None):
+        """Return the number of stops reachable from every stop, in stop
+        order; isochrones are computed in parallel processes
+        """
+        if executor is None:
+            with ProcessPoolExecutor(
+                    initializer=_init_worker, initargs=(self,)) as executor:
+                return self.reachable_counts(departure, budget, executor)
+
+        return list(executor.map(
+            _count_reachable,
+            range(len(self.stop_keys)),
+            [departure] * len(self.stop_keys),
+            [budget] * len(self.stop_keys),
+            chunksize=max(1, len(self.stop_keys) // 64)
+        ))
+
+    def count_reachable(self, start, departure, budget):
+        arrivals = self._scan(start, departure, departure + budget)
+        return len(arrivals) - arrivals.count(self.UNREACHED)
+
+
+class UnknownStopError(ValidationError):
+    def __init__(self, key):
+        super().__init__(key)
+        self.key = key
+
+    def __str__(self):
+        return 'Stop "{}" not found.'.format(self.key)
+
+
+# engine of the current batch worker process
+_worker_engine = None
+
+
+def _init_worker(engine):
+    global _worker_engine
+    _worker_engine = engine
+
+
+def _count_reachable(start, departure, budget):
+    return _worker_engine.count_reachable(start, departure, budget)
+
+
+if __name__ == '__main__':
+    Application().run()
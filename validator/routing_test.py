@@ -0,0 +1,109 @@
+# coding: utf-8
+
+import pytest
+
+from routing import *
+from validator_test import make_content
+
+
+# key3 is about 110 meters north of key2, key4 is far away
+STOPS = '''
+stops:
+  - key: key1
+    name: name1
+    latitude: 55.5
+    longitude: 28.6
+  - key: key2
+    name: name2
+    latitude: 55.51
+    longitude: 28.6
+  - key: key3
+    name: name3
+    latitude: 55.511
+    longitude: 28.6
+  - key: key4
+    name: name4
+    latitude: 55.6
+    longitude: 28.6
+'''
+
+ROUTES = '''
+routes:
+  - number: 1
+    description: description1
+    stops:
+      - key: key1
+        shift: 00:00
+      - key: key2
+        shift: 00:10
+    trips:
+      workdays:
+        - 06:00
+        - 07:00
+      weekend:
+        - 08:00
+  - number: 2
+    description: description2
+    stops:
+      - key: key3
+        shift: 00:00
+      - key: key4
+        shift: 00:15
+    trips:
+      everyday:
+        - 06:15
+        - 06:30
+'''
+
+
+def make_engine(day_kind='workdays'):
+    return IsochroneEngine.from_content(make_content(ROUTES, STOPS), day_kind)
+
+
+class TestIsochroneEngine:
+    def test_isochrone(self):
+        arrivals = make_engine().isochrone(
+            'key1', TimeShift.to_minutes('05:55'), 60
+        )
+
+        assert arrivals == [
+            Arrival('key1', TimeShift.to_minutes('05:55')),
+            Arrival('key2', TimeShift.to_minutes('06:10')),
+            # a walk of 2 minutes from key2
+            Arrival('key3', TimeShift.to_minutes('06:12')),
+            Arrival('key4', TimeShift.to_minutes('06:30'))
+        ]
+
+    def test_isochrone_budget(self):
+        arrivals = make_engine().isochrone(
+            'key1', TimeShift.to_minutes('05:55'), 20
+        )
+
+        assert [x.key for x in arrivals] == ['key1', 'key2', 'key3']
+
+    def test_isochrone_day_kind(self):
+        arrivals = make_engine('weekend').isochrone(
+            'key1', TimeShift.to_minutes('05:55'), 60
+        )
+
+        assert arrivals == [Arrival('key1', TimeShift.to_minutes('05:55'))]
+
+    def test_isochrone_missed_trip(self):
+        arrivals = make_engine().isochrone(
+            'key1', TimeShift.to_minutes('06:01'), 30
+        )
+
+        assert arrivals == [Arrival('key1', TimeShift.to_minutes('06:01'))]
+
+    def test_isochrone_unknown_stop(self):
+        with pytest.raises(UnknownStopError) as ex_info:
+            make_engine().isochrone('key5', TimeShift.to_minutes('06:00'), 30)
+
+        assert str(ex_info.value) == 'Stop "key5" not found.'
+
+    def test_reachable_counts(self):
+        counts = make_engine().reachable_counts(
+            TimeShift.to_minutes('05:55'), 60
+        )
+
+        assert counts == [4, 3, 3, 1]
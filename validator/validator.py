@@ -2,108 +2,990 @@
 # coding: utf-8
 
 import abc
-import argparse
+import array
+import functools
+import importlib
+import io
+import itertools
+import math
+import operator
 import os
 import string
 import sys
+import time
 from collections import namedtuple
 
-import yaml
 
+class LazyModule:
+    """Module proxy importing the module on first attribute access.
 
-Item = namedtuple('Item', 'value, start_mark, end_mark')
+    Keeps start up fast for the runs never touching the module, e.g.
+    printing help or validating nothing.
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+
+    def __getattr__(self, attr):
+        value = getattr(importlib.import_module(self._name), attr)
+        self.__dict__[attr] = value
+        return value
+
+
+yaml = LazyModule('yaml')
+
+
+# `flags` are `TripFlags` of trip times with comments, `None` otherwise
+Item = namedtuple(
+    'Item', 'value, start_mark, end_mark, flags', defaults=(None,)
+)
 Stop = namedtuple('Stop', 'key, name, direction, latitude, longitude')
 Route = namedtuple('Route', 'number, description, hidden, stops, trips')
 RouteStop = namedtuple('RouteStop', 'key, shift')
 RouteTrip = namedtuple('RouteTrip', 'workdays, weekend, everyday')
+TripFlags = namedtuple('TripFlags', 'to_depot, fridays, via, note')
 Routes = namedtuple('Routes', 'routes')
 Stops = namedtuple('Stops', 'stops')
+Region = namedtuple(
+    'Region',
+    'key, name, min_latitude, max_latitude, min_longitude, max_longitude'
+)
+Regions = namedtuple('Regions', 'regions')
+ContentTree = namedtuple('ContentTree', 'directory, region')
+FileTiming = namedtuple('FileTiming', 'file, seconds')
+DiagnosticLocation = namedtuple(
+    'DiagnosticLocation',
+    'file, start_line, start_column, end_line, end_column'
+)
+RouteDirection = namedtuple(
+    'RouteDirection', 'id, number, index, terminal_key, route'
+)
+# `stops` are content stop indexes in content order
+Station = namedtuple('Station', 'key, name, stops')
+ContentStats = namedtuple(
+    'ContentStats',
+    'stops, routes, directions, route_stops, trip_times, largest_files, '
+    'most_referenced_stops, trips_per_route'
+)
+FileStats = namedtuple(
+    'FileStats', 'file, stops, directions, route_stops, trip_times'
+)
+StopReferences = namedtuple('StopReferences', 'key, routes')
+# `buckets` are (lowest, highest or `None`, count) triples
+Distribution = namedtuple(
+    'Distribution', 'min, median, p90, max, mean, buckets'
+)
 
 
 class Application:
     VALIDATION_FAILED_STATUS = -1
+    INDEX_FILE_NAME = '.stop-key-index.json'
 
     def run(self):
-        content_dir = self._get_content_dir(self._parse_args())
+        if sys.argv[1:2] == ['stats']:
+            self._run_stats(sys.argv[2:])
+            return
 
-        print('Validating content in {}...'.format(content_dir))
+        args = self._make_validation_arg_parser().parse_args()
+        content_dir = self._get_content_dir(args)
+        # keep standard output machine-readable
+        self._quiet = args.format != 'text'
+        report = ContentReadReport()
 
         try:
-            self._create_and_validate(content_dir)
+            trees = self._get_content_trees(args, content_dir)
+            if len(trees) == 1:
+                self._validate_tree(
+                    args, trees[0], args.index_file, report
+                )
+            else:
+                self._validate_trees(args, trees, report)
+        except ValidationError as e:
+            report.errors.append(e)
+
+        if self._quiet:
+            print(DiagnosticsFormatter.create(args.format).format(report))
+        elif report.errors:
+            print(report.errors[0], file=sys.stderr)
+        else:
+            print('Content is valid.')
+
+        if report.errors:
+            sys.exit(self.VALIDATION_FAILED_STATUS)
+
+    def _log(self, message):
+        if not self._quiet:
+            print(message)
+
+    def _run_stats(self, argv):
+        args = self._make_stats_arg_parser().parse_args(argv)
+        content_dir = self._get_content_dir(args)
+
+        try:
+            tree = self._get_content_tree(args, content_dir)
+            content = Content(*self._make_sources(tree.directory))
         except ValidationError as e:
             print(e, file=sys.stderr)
             sys.exit(self.VALIDATION_FAILED_STATUS)
 
-        print('Content is valid.')
+        stats = ContentStatistics(content, args.top, tree.directory).compute()
+        print(StatsFormatter.create(args.format).format(stats))
+
+    def _make_stats_arg_parser(self):
+        parser = self._make_arg_parser()
+        parser.prog = '{} stats'.format(parser.prog)
+        parser.description = 'Report content cardinalities for capacity ' \
+                             'planning.'
+
+        parser.add_argument(
+            '--top', type=int, default=5,
+            help='number of largest files and most referenced stops'
+        )
+        parser.add_argument(
+            '--format', choices=tuple(StatsFormatter.FORMATTERS),
+            default='text', help='output format'
+        )
+
+        return parser
+
+    def _validate_trees(self, args, trees, report):
+        """Validate regions in parallel processes, each with its own stop
+        key index, and collect their errors in manifest order
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(min(len(trees), os.cpu_count() or 1)) \
+                as executor:
+            tree_reports = executor.map(
+                self._validate_tree_reporting, [args] * len(trees), trees
+            )
+            for tree_report in tree_reports:
+                report.errors += tree_report.errors
+                report.timings += tree_report.timings
+
+    def _validate_tree_reporting(self, args, tree):
+        report = ContentReadReport()
+        try:
+            self._validate_tree(args, tree, None, report)
+        except ValidationError as e:
+            report.errors.append(e)
+        return report
+
+    def _validate_tree(self, args, tree, index_file, report):
+        index_file = index_file or os.path.join(
+            tree.directory, self.INDEX_FILE_NAME
+        )
+
+        if (args.files or args.staged) and os.path.isfile(index_file):
+            self._validate_changed(tree, index_file, args)
+        else:
+            self._validate_all(
+                tree, index_file, report if self._quiet else None,
+                args.streaming
+            )
+
+    def _validate_all(self, tree, index_file, report=None, streaming=False):
+        content_dir = tree.directory
+        self._log('Validating content in {}...'.format(content_dir))
+
+        if streaming:
+            index = StreamingValidator(
+                *self._make_sources(content_dir), report, tree.region
+            ).validate()
+        else:
+            index = self._validate_content(tree, report)
+
+        if index is None or ContentArchive.is_archive(content_dir):
+            return
+
+        try:
+            index.save(index_file, content_dir)
+        except OSError as e:
+            print('Stop key index not saved: {}'.format(e), file=sys.stderr)
+
+    def _validate_content(self, tree, report=None):
+        """Return `StopKeyIndex` of valid content; raise the first error,
+        or return `None` once errors are collected in `report`
+        """
+        if report is None:
+            content = self._create_and_validate(*tree)
+        else:
+            content = Content(
+                *self._make_sources(tree.directory), report, tree.region
+            )
+            if not report.errors:
+                report.errors += self._run_validators(content)
+            if report.errors:
+                return None
+
+        return StopKeyIndex.from_content(content)
+
+    def _validate_changed(self, tree, index_file, args):
+        content_dir = tree.directory
+        documents = [
+            (os.path.abspath(x), self._read_text(x)) for x in args.files
+            if self._is_in_directory(x, content_dir)
+        ]
+        if args.staged:
+            documents += GitStagedFiles(content_dir).read()
+
+        self._log('Validating {} changed files in {}...'.format(
+            len(documents), content_dir
+        ))
+
+        index = IncrementalValidator(
+            content_dir, StopKeyIndex.load(index_file, content_dir),
+            tree.region
+        ).validate(documents)
+
+        try:
+            index.save(index_file, content_dir)
+        except OSError as e:
+            print('Stop key index not saved: {}'.format(e), file=sys.stderr)
+
+    def _is_in_directory(self, path, directory):
+        return os.path.abspath(path).startswith(directory + os.sep)
+
+    def _read_text(self, path):
+        try:
+            with open(path, encoding=FileSystemNodeSource.ENCODING) as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
 
     def _get_content_dir(self, args):
         return os.path.abspath(args.content_dir or os.getcwd())
 
+    def _get_content_trees(self, args, content_dir):
+        """Content trees to read: the content directory itself, or the
+        directories of every region of `RegionManifest`, or of the one
+        given by `--region`
+        """
+        regions = RegionManifest.load(content_dir)
+
+        if regions is None:
+            if args.region is not None:
+                raise NoRegionError(args.region, [])
+            return [ContentTree(content_dir, None)]
+
+        if args.region is not None:
+            regions = [RegionManifest.find(regions, args.region)]
+
+        return [
+            ContentTree(os.path.join(content_dir, x.key), x) for x in regions
+        ]
+
+    def _get_content_tree(self, args, content_dir):
+        """Single content tree to read; content sharded by more than one
+        region requires `--region`
+        """
+        trees = self._get_content_trees(args, content_dir)
+        if len(trees) > 1:
+            raise NoRegionError(None, [x.region.key for x in trees])
+        return trees[0]
+
     def _parse_args(self):
+        return self._make_arg_parser().parse_args()
+
+    def _make_arg_parser(self):
+        import argparse
+
         parser = argparse.ArgumentParser()
 
         parser.add_argument(
             '-d', '--content-dir',
             action='store',
             help='content directory absolute or relative to current directory '
-                 'path; defaults to current directory'
+                 'path, or .tar.gz, .tar or .zip release archive of it; '
+                 'defaults to current directory'
         )
+        parser.add_argument(
+            '-r', '--region',
+            action='store',
+            help='key of the only region to read from content sharded by '
+                 'region; all regions are read if omitted'
+        )
+
+        return parser
 
-        return parser.parse_args()
+    def _make_validation_arg_parser(self):
+        parser = self._make_arg_parser()
 
-    def _create_and_validate(self, content_dir):
-        content = Content(
+        parser.add_argument(
+            'files',
+            nargs='*',
+            help='changed stops and routes files to validate against the '
+                 'stop key index of the last full run; validates all '
+                 'content if omitted'
+        )
+        parser.add_argument(
+            '--staged',
+            action='store_true',
+            help='validate stops and routes files staged in git'
+        )
+        parser.add_argument(
+            '--streaming',
+            action='store_true',
+            help='validate one file at a time, keeping only stop keys, to '
+                 'validate content too large to hold in memory'
+        )
+        parser.add_argument(
+            '--index-file',
+            action='store',
+            help='stop key index file path; defaults to {} in the content '
+                 'directory, or in every region directory if several '
+                 'regions are validated'.format(self.INDEX_FILE_NAME)
+        )
+        parser.add_argument(
+            '--format',
+            choices=('text',) + tuple(DiagnosticsFormatter.FORMATTERS),
+            default='text',
+            help='output format; json and sarif list every diagnostic and '
+                 'per-file read timings on standard output'
+        )
+
+        return parser
+
+    def _make_sources(self, content_dir):
+        """Stop and route sources of a content directory or archive"""
+        if ContentArchive.is_archive(content_dir):
+            archive = ContentArchive.open(content_dir)
+            return archive.stop_source(), archive.route_source()
+
+        return (
             StopFileSystemNodeSource(content_dir),
             RouteFileSystemNodeSource(content_dir)
         )
+
+    def _create_and_validate(self, content_dir, region=None):
+        content = Content(*self._make_sources(content_dir), region=region)
         self._validate(content)
 
+        return content
+
     def _validate(self, content):
-        validators = [
+        errors = self._run_validators(content)
+        if errors:
+            raise errors[0]
+
+    def _run_validators(self, content):
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor() as executor:
+            return ValidatorScheduler(
+                self._make_validators(), executor
+            ).run(content)
+
+    def _make_validators(self):
+        return [
             NonEmptyContentValidator(),
             StopKeyUniquenessValidator(),
-            StopKeyReferentialIntegrityValidator()
+            StopKeyReferentialIntegrityValidator(),
+            RouteSpeedValidator()
         ]
 
-        for validator in validators:
-            validator.validate(content)
-
 
 class Content:
     STOPS_SUBDIR = 'stops'
     ROUTES_SUBDIR = 'routes'
 
-    def __init__(self, stop_source, route_source):
-        self.stops = self._read_stops(stop_source)
-        self.routes = self._read_routes(route_source)
+    def __init__(self, stop_source, route_source, report=None, region=None):
+        """Read stops and routes; documents failing validation raise
+        `ValidationError`, or are skipped and collected in `report` if it
+        is given. Stops are checked against `region` bounds if given.
+        """
+        self.stops = self._read_stops(stop_source, report, region)
+        self.routes = self._read_routes(route_source, report)
+
+    @functools.cached_property
+    def index(self):
+        return ContentIndex(self)
+
+    @classmethod
+    def _read_stops(cls, source, report=None, region=None):
+        return list(itertools.chain.from_iterable(
+            cls.enumerate_stops(source, report, region)
+        ))
 
     @classmethod
-    def _read_stops(cls, source):
-        return cls._read_items(
-            source, StopsProducer(), lambda x: x.value.stops.value
+    def enumerate_stops(cls, source, report=None, region=None):
+        """Yield stop `Item`s of every document, see `__init__`"""
+        return cls._enumerate_items(
+            source, Producers.stops(region), lambda x: x.value.stops.value,
+            report
         )
 
     @classmethod
-    def _read_items(cls, source, producer, item_get_func):
-        items = []
+    def _enumerate_items(cls, source, producer, item_get_func, report=None):
+        if report is not None:
+            yield from cls._enumerate_reported_items(
+                source, producer, item_get_func, report
+            )
+            return
 
         for root in source.enumerate():
-            items += item_get_func(producer.produce(root))
+            yield item_get_func(producer.produce(root))
+
+    @classmethod
+    def _enumerate_reported_items(cls, source, producer, item_get_func,
+                                  report):
+        try:
+            documents = source.enumerate_with_errors()
+            start = time.perf_counter()
+            for root in documents:
+                items = []
+                try:
+                    if isinstance(root, ValidationError):
+                        raise root
+                    file = root.start_mark.name
+                    items = item_get_func(producer.produce(root))
+                except ValidationError as e:
+                    report.errors.append(e)
+                    file = next(
+                        (x.location.file for x in e.diagnostics()
+                         if x.location), None
+                    )
+                report.timings.append(
+                    FileTiming(file, time.perf_counter() - start)
+                )
+                yield items
+                start = time.perf_counter()
+        except ValidationError as e:
+            report.errors.append(e)
 
-        return items
+    @classmethod
+    def _read_routes(cls, source, report=None):
+        return list(itertools.chain.from_iterable(
+            cls.enumerate_routes(source, report)
+        ))
 
     @classmethod
-    def _read_routes(cls, source):
-        return cls._read_items(
-            source, RoutesProducer(), lambda x: x.value.routes.value
+    def enumerate_routes(cls, source, report=None):
+        """Yield route `Item`s of every document, see `__init__`"""
+        return cls._enumerate_items(
+            source, Producers.routes(), lambda x: x.value.routes.value, report
         )
 
 
+class ContentReadReport:
+    """Errors and per-file read timings collected while reading `Content`"""
+
+    def __init__(self):
+        self.errors = []
+        self.timings = []
+
+
+class ContentIndex:
+    """Lookups over `Content` built on first use and shared by validators
+    and queries, so none of them has to walk all stops and routes again.
+    Stops and routes are `Item`s of `Content`.
+    """
+
+    def __init__(self, content):
+        self._content = content
+
+    @functools.cached_property
+    def _stop_keys(self):
+        stops_by_key = {}
+        duplicates = []
+
+        for stop in self._content.stops:
+            first_stop = stops_by_key.setdefault(stop.value.key.value, stop)
+            if first_stop is not stop:
+                duplicates.append((stop.value.key, first_stop.value.key))
+
+        return stops_by_key, duplicates
+
+    @property
+    def stops_by_key(self):
+        """Stop key -> first stop declaring it"""
+        return self._stop_keys[0]
+
+    @property
+    def duplicate_stop_keys(self):
+        """(key `Item`, first key `Item`) for every stop key used again"""
+        return self._stop_keys[1]
+
+    @functools.cached_property
+    def stops_by_name(self):
+        stops_by_name = {}
+        for stop in self._content.stops:
+            stops_by_name.setdefault(stop.value.name.value, []).append(stop)
+        return stops_by_name
+
+    @functools.cached_property
+    def routes_by_number(self):
+        """Route number -> route directions in content order"""
+        routes_by_number = {}
+        for route in self._content.routes:
+            routes_by_number.setdefault(
+                route.value.number.value, []
+            ).append(route)
+        return routes_by_number
+
+    @functools.cached_property
+    def route_catalogue(self):
+        return RouteCatalogue(self._content.routes)
+
+    @functools.cached_property
+    def stations(self):
+        return StationIndex(self._content.stops)
+
+    @functools.cached_property
+    def route_stop_keys(self):
+        """Route stop key `Item`s of every route in content order"""
+        return [
+            [y.value.key for y in x.value.stops.value]
+            for x in self._content.routes
+        ]
+
+    @functools.cached_property
+    def routes_by_stop_key(self):
+        """Stop key -> routes stopping there, each route once"""
+        routes_by_stop_key = {}
+        for route, key_items in zip(
+                self._content.routes, self.route_stop_keys):
+            for key in dict.fromkeys(x.value for x in key_items):
+                routes_by_stop_key.setdefault(key, []).append(route)
+        return routes_by_stop_key
+
+    @functools.cached_property
+    def route_stop_shifts(self):
+        """Route stop shift minute arrays of every route in content order"""
+        return [
+            array.array('H', (TimeShift.to_minutes(y.value.shift.value)
+                              for y in x.value.stops.value))
+            for x in self._content.routes
+        ]
+
+    @functools.cached_property
+    def _route_shapes(self):
+        """Segment distances and distances from the first stop of every
+        route, for stops of all routes at once
+        """
+        stops_by_key = self.stops_by_key
+        latitudes = array.array('d')
+        longitudes = array.array('d')
+        offsets = [0]
+
+        for key_items in self.route_stop_keys:
+            stops = [stops_by_key.get(x.value) for x in key_items]
+            latitudes.extend(
+                x.value.latitude.value if x else math.nan for x in stops
+            )
+            longitudes.extend(
+                x.value.longitude.value if x else math.nan for x in stops
+            )
+            offsets.append(len(latitudes))
+
+        # distances between the last stop of a route and the first stop of
+        # the next one are dropped
+        distances = Geo.distances(latitudes, longitudes)
+        segments = [
+            distances[start:max(start, end - 1)]
+            for start, end in zip(offsets, offsets[1:])
+        ]
+        return segments, [
+            array.array('d', itertools.accumulate(x, initial=0.0))
+            if offsets[i] < offsets[i + 1] else array.array('d')
+            for i, x in enumerate(segments)
+        ]
+
+    @property
+    def route_segment_distances(self):
+        """Distances in meters between consecutive stops of every route in
+        content order, `nan` next to undeclared stops
+        """
+        return self._route_shapes[0]
+
+    @property
+    def route_stop_distances(self):
+        """Distances in meters from the first stop to every stop of every
+        route in content order, `nan` from an undeclared stop on
+        """
+        return self._route_shapes[1]
+
+    @functools.cached_property
+    def route_segment_speeds(self):
+        """Speeds in km/h between consecutive stops of every route in
+        content order; shifts are whole minutes, so a segment takes a minute
+        at least
+        """
+        return list(map(
+            Geo.segment_speeds, self.route_segment_distances,
+            self.route_stop_shifts
+        ))
+
+    @functools.cached_property
+    def route_trip_minutes(self):
+        """`RouteTrip` of trip start minute arrays, or `None`s for missing
+        day types, of every route in content order
+        """
+        return [
+            RouteTrip._make(
+                array.array('H', (TimeShift.to_minutes(y.value)
+                                  for y in x.value))
+                if x is not None else None
+                for x in route.value.trips.value
+            )
+            for route in self._content.routes
+        ]
+
+
+class RouteCatalogue:
+    """Route directions grouped by route number.
+
+    Every direction gets an id made of its route number and terminal stop
+    key, stable across content changes not touching them, and a position
+    within its route number. Lookups by number, by id and by number and
+    terminal stop key are dictionary lookups.
+    """
+
+    def __init__(self, routes):
+        self._directions_by_number = {}
+        self._directions_by_id = {}
+        self._directions_by_terminal = {}
+        # (number, terminal stop key) -> number of directions
+        self._terminal_counts = {}
+
+        for route in routes:
+            self._add(route)
+
+        self.numbers = sorted(
+            self._directions_by_number, key=RouteNumber.sort_key
+        )
+
+    def _add(self, route):
+        number = route.value.number.value
+        terminal_key = route.value.stops.value[-1].value.key.value \
+            if route.value.stops.value else ''
+        directions = self._directions_by_number.setdefault(number, [])
+
+        direction_id = '{}:{}'.format(number, terminal_key)
+        variant = self._terminal_counts.get((number, terminal_key), 0)
+        self._terminal_counts[number, terminal_key] = variant + 1
+        if variant:
+            # a variant with the same terminal, e.g. a short working; only
+            # these are counted, so other directions don't renumber it
+            direction_id = '{}#{}'.format(direction_id, variant)
+
+        direction = RouteDirection(
+            id=direction_id,
+            number=number,
+            index=len(directions),
+            terminal_key=terminal_key,
+            route=route
+        )
+
+        directions.append(direction)
+        self._directions_by_id[direction_id] = direction
+        self._directions_by_terminal.setdefault(
+            (number, terminal_key), direction
+        )
+
+    def directions(self, number):
+        """Directions of route `number` in content order, empty if unknown"""
+        return self._directions_by_number.get(number, [])
+
+    def direction(self, direction_id):
+        return self._directions_by_id.get(direction_id)
+
+    def find(self, number, terminal_key):
+        """First direction of route `number` ending at `terminal_key`"""
+        return self._directions_by_terminal.get((number, terminal_key))
+
+
+class ContentStatistics:
+    """Cardinalities of `Content` to size caches and compiled artifacts by.
+
+    Counts come from `ContentIndex` parts shared with validators and
+    queries, file counts from one pass over stops and routes.
+    """
+
+    # lowest trip numbers of trips per route buckets
+    TRIP_BUCKETS = (0, 1, 10, 25, 50, 100, 200)
+
+    def __init__(self, content, top=5, directory=None):
+        self._content = content
+        self._top = top
+        self._directory = directory
+
+    def compute(self):
+        index = self._content.index
+        trip_minutes = index.route_trip_minutes
+        catalogue = index.route_catalogue
+
+        return ContentStats(
+            stops=len(self._content.stops),
+            routes=len(catalogue.numbers),
+            directions=len(self._content.routes),
+            route_stops=sum(len(x) for x in index.route_stop_keys),
+            trip_times=dict(zip(RouteTrip._fields, (
+                sum(len(x) for x in day_type if x is not None)
+                for day_type in zip(*trip_minutes)
+            ) if trip_minutes else [0] * len(RouteTrip._fields))),
+            largest_files=self._largest_files(trip_minutes),
+            most_referenced_stops=sorted(
+                (
+                    StopReferences(x, len({z.value.number.value for z in y}))
+                    for x, y in index.routes_by_stop_key.items()
+                ),
+                key=lambda x: -x.routes
+            )[:self._top],
+            trips_per_route=self._distribution(
+                list(self._route_trips(trip_minutes).values())
+            )
+        )
+
+    def _route_trips(self, trip_minutes):
+        """Route number -> trips of all its directions"""
+        trips = {}
+        for route, route_trips in zip(self._content.routes, trip_minutes):
+            number = route.value.number.value
+            trips[number] = trips.get(number, 0) + sum(
+                len(x) for x in route_trips if x is not None
+            )
+        return trips
+
+    def _largest_files(self, trip_minutes):
+        files = {}
+
+        for stop in self._content.stops:
+            self._count(files, stop.start_mark.name, stops=1)
+        for route, trips in zip(self._content.routes, trip_minutes):
+            self._count(
+                files, route.start_mark.name, directions=1,
+                route_stops=len(route.value.stops.value),
+                trip_times=sum(len(x) for x in trips if x is not None)
+            )
+
+        return sorted(
+            files.values(),
+            key=lambda x: (-(x.stops + x.route_stops + x.trip_times), x.file)
+        )[:self._top]
+
+    def _count(self, files, name, **counts):
+        stats = files.get(name) or FileStats(
+            os.path.relpath(name, self._directory) if self._directory
+            else name, 0, 0, 0, 0
+        )
+        files[name] = stats._replace(
+            **{x: getattr(stats, x) + y for x, y in counts.items()}
+        )
+
+    def _distribution(self, values):
+        values = sorted(values)
+        if not values:
+            return Distribution(0, 0, 0, 0, 0, [])
+
+        bounds = self.TRIP_BUCKETS + (None,)
+        buckets = []
+        for low, high in zip(bounds, bounds[1:]):
+            count = sum(1 for x in values if x >= low and (
+                high is None or x < high
+            ))
+            buckets.append((low, high - 1 if high is not None else None,
+                            count))
+
+        return Distribution(
+            min=values[0],
+            median=values[(len(values) - 1) // 2],
+            p90=values[math.ceil(len(values) * 0.9) - 1],
+            max=values[-1],
+            mean=sum(values) / len(values),
+            buckets=buckets
+        )
+
+
+class RouteNumber:
+    @classmethod
+    def sort_key(cls, number):
+        """Order route numbers naturally: 2, 10, 10а, 11"""
+        digits = len(number) - len(number.lstrip('0123456789'))
+        if not digits:
+            return float('inf'), number
+        return int(number[:digits]), number[digits:]
+
+
+class StationIndex:
+    """Stops of one physical place grouped into stations.
+
+    Stops with the same name within `MAX_DISTANCE` of each other, like
+    the `-to-`/`-from-` stops on the opposite sides of a street, make a
+    station; they are found by a grid of `MAX_DISTANCE` cells, comparing
+    stops of neighbouring cells only. A station key is the common prefix
+    of its stop keys up to a dash, the stop key for a single stop.
+    Walking minutes between stops of a station are kept as a flat matrix
+    per station, in `Station.stops` order.
+    """
+
+    MAX_DISTANCE = 300  # meters
+
+    def __init__(self, stops, max_distance=MAX_DISTANCE):
+        self._max_distance = max_distance
+        values = [x.value for x in stops]
+
+        self.stations = self._make_stations(values, self._cluster(values))
+        self._station_indexes = {x.key: i for i, x in enumerate(self.stations)}
+        self.stop_stations = array.array('I', [0]) * len(values)
+        for i, station in enumerate(self.stations):
+            for stop in station.stops:
+                self.stop_stations[stop] = i
+        self._station_by_stop_key = {
+            x.key.value: self.stations[self.stop_stations[i]]
+            for i, x in enumerate(values)
+        }
+        self._transfer_minutes = [
+            self._make_transfer_minutes(values, x) for x in self.stations
+        ]
+
+    def _cluster(self, stops):
+        """Return the smallest stop index of the cluster of every stop"""
+        cell_height = Geo.latitude_degrees(self._max_distance)
+        cells = {}
+        for i, stop in enumerate(stops):
+            cell_width = cell_height / max(
+                math.cos(math.radians(stop.latitude.value)), 0.01
+            )
+            cells.setdefault(
+                (int(stop.latitude.value // cell_height),
+                 int(stop.longitude.value // cell_width)), []
+            ).append(i)
+
+        roots = list(range(len(stops)))
+
+        def find(i):
+            while roots[i] != i:
+                roots[i] = roots[roots[i]]
+                i = roots[i]
+            return i
+
+        for (row, column), members in cells.items():
+            neighbours = [
+                j for r in (row - 1, row, row + 1)
+                for c in (column - 1, column, column + 1)
+                for j in cells.get((r, c), ())
+            ]
+            for i in members:
+                for j in neighbours:
+                    if j <= i or stops[i].name.value != stops[j].name.value:
+                        continue
+                    if Geo.distance(
+                            stops[i].latitude.value, stops[i].longitude.value,
+                            stops[j].latitude.value, stops[j].longitude.value
+                    ) <= self._max_distance:
+                        a, b = find(i), find(j)
+                        roots[max(a, b)] = min(a, b)
+
+        return [find(i) for i in range(len(stops))]
+
+    def _make_stations(self, stops, roots):
+        members = {}
+        for i, root in enumerate(roots):
+            members.setdefault(root, []).append(i)
+
+        stations = []
+        keys = set()
+        for root in sorted(members):
+            key = self._make_key([stops[x].key.value for x in members[root]])
+            if key in keys:
+                # a prefix shared with another station, e.g. a single stop
+                key = stops[root].key.value
+            keys.add(key)
+            stations.append(Station(
+                key=key,
+                name=stops[root].name.value,
+                stops=array.array('I', members[root])
+            ))
+
+        return stations
+
+    def _make_key(self, keys):
+        if len(keys) == 1:
+            return keys[0]
+
+        prefix = os.path.commonprefix(keys)
+        if all(len(x) == len(prefix) or x[len(prefix)] == '-' for x in keys):
+            return prefix
+        return prefix[:prefix.rfind('-')] if '-' in prefix else keys[0]
+
+    def _make_transfer_minutes(self, stops, station):
+        return array.array('H', (
+            Geo.walking_minutes(Geo.distance(
+                stops[x].latitude.value, stops[x].longitude.value,
+                stops[y].latitude.value, stops[y].longitude.value
+            )) if x != y else 0
+            for x in station.stops for y in station.stops
+        ))
+
+    def __len__(self):
+        return len(self.stations)
+
+    def station(self, key):
+        """Station by its key, `None` if unknown"""
+        i = self._station_indexes.get(key)
+        return self.stations[i] if i is not None else None
+
+    def station_of(self, stop_key):
+        """Station of stop `stop_key`, `None` if unknown"""
+        return self._station_by_stop_key.get(stop_key)
+
+    def transfer_minutes(self, station, from_position, to_position):
+        """Walking minutes between stops at positions of `Station.stops`"""
+        matrix = self._transfer_minutes[self._station_indexes[station.key]]
+        return matrix[from_position * len(station.stops) + to_position]
+
+
+class RegionManifest:
+    """Regions of content sharded by region.
+
+    The manifest lists every region with its key and stop coordinate
+    bounds; a region keeps its own stops and routes subdirectories in the
+    content subdirectory named by its key, so any region reads without
+    touching the others.
+    """
+
+    FILE_NAME = 'regions.yaml'
+
+    @classmethod
+    def load(cls, content_directory):
+        """Return `Region`s of plain values in manifest order, or `None`
+        for content not sharded by region
+        """
+        path = os.path.join(content_directory, cls.FILE_NAME)
+        if not os.path.isfile(path):
+            return None
+
+        with open(path, encoding=FileSystemNodeSource.ENCODING) as file:
+            root = Yaml.create_root_node(file)
+
+        return [
+            Region._make(y.value for y in x.value)
+            for x in RegionsProducer().produce(root).value.regions.value
+        ]
+
+    @classmethod
+    def find(cls, regions, key):
+        region = next((x for x in regions if x.key == key), None)
+        if region is None:
+            raise NoRegionError(key, [x.key for x in regions])
+        return region
+
+
 class YamlNodeSource(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def enumerate(self):
         pass
 
+    def enumerate_with_errors(self):
+        """Like `enumerate`, but yield `ValidationError`s of documents
+        failing to parse instead of raising them
+        """
+        try:
+            yield from self.enumerate()
+        except ValidationError as e:
+            yield e
+
 
 class FileSystemNodeSource(YamlNodeSource):
     ENCODING = 'utf8'
@@ -112,68 +994,634 @@ class FileSystemNodeSource(YamlNodeSource):
     def __init__(self, directory):
         self._directory = os.path.abspath(directory)
 
-    def enumerate(self):
-        paths = (os.path.join(self._directory, x)
-                 for x in self._list_content_dir(self._directory))
-        file_paths = (x for x in paths if self._is_yaml_file(x))
+    def enumerate(self):
+        for file_path in self._list_yaml_files():
+            yield self._read(file_path)
+
+    def enumerate_with_errors(self):
+        for file_path in self._list_yaml_files():
+            try:
+                yield self._read(file_path)
+            except ValidationError as e:
+                yield e
+
+    def _list_yaml_files(self):
+        paths = (os.path.join(self._directory, x)
+                 for x in sorted(self._list_content_dir(self._directory)))
+        return [x for x in paths if self._is_yaml_file(x)]
+
+    def _read(self, file_path):
+        with open(file_path, encoding=self.ENCODING) as file:
+            return Yaml.create_root_node(file)
+
+    def _list_content_dir(self, directory):
+        try:
+            return os.listdir(directory)
+        except FileNotFoundError:
+            raise NoContentDirError(directory)
+
+    def _is_yaml_file(self, file_name):
+        return os.path.isfile(file_name) and file_name.endswith(self.YAML_EXT)
+
+
+class RouteFileSystemNodeSource(FileSystemNodeSource):
+    ROUTES_SUBDIR = 'routes'
+
+    def __init__(self, content_directory):
+        super().__init__(os.path.join(content_directory, self.ROUTES_SUBDIR))
+
+
+class StopFileSystemNodeSource(FileSystemNodeSource):
+    STOPS_SUBDIR = 'stops'
+
+    def __init__(self, content_directory):
+        super().__init__(os.path.join(content_directory, self.STOPS_SUBDIR))
+
+
+class ContentArchive(metaclass=abc.ABCMeta):
+    """Stops and routes files of content packed in a release archive or
+    kept in memory, read without extracting them to disk.
+
+    Content files are members named `stops/*.yaml` and `routes/*.yaml`
+    under the shallowest directory having them, so archives of the
+    content directory itself or of a directory above it both work.
+    """
+
+    ZIP_EXTS = ('.zip',)
+    TAR_EXTS = ('.tar', '.tar.gz', '.tgz')
+
+    def __init__(self, name):
+        self.name = name
+
+    @classmethod
+    def is_archive(cls, path):
+        return os.path.isfile(path) and \
+            path.endswith(cls.ZIP_EXTS + cls.TAR_EXTS)
+
+    @classmethod
+    def open(cls, path):
+        if path.endswith(cls.ZIP_EXTS):
+            return ZipContentArchive(path)
+        return TarContentArchive(path)
+
+    def stop_source(self, executor=None):
+        return ArchiveNodeSource(
+            self, StopFileSystemNodeSource.STOPS_SUBDIR, executor
+        )
+
+    def route_source(self, executor=None):
+        return ArchiveNodeSource(
+            self, RouteFileSystemNodeSource.ROUTES_SUBDIR, executor
+        )
+
+    def read(self, subdir):
+        """Return (name, text) of every file in `subdir`, sorted by name"""
+        members = {}
+        for name, read in self._enumerate_members():
+            parts = name.split('/')
+            if len(parts) >= 2 and parts[-2] == subdir and \
+                    parts[-1].endswith(FileSystemNodeSource.YAML_EXT):
+                members.setdefault(tuple(parts[:-2]), []).append(
+                    (name, read())
+                )
+
+        if not members:
+            return []
+
+        root = min(members, key=lambda x: (len(x), x))
+        return sorted(
+            ('{}/{}'.format(self.name, x), y) for x, y in members[root]
+        )
+
+    @abc.abstractmethod
+    def _enumerate_members(self):
+        """Yield the name and a function reading the text of every member,
+        in any order; the function must be called before the next member
+        """
+        pass
+
+    @classmethod
+    def _read_text(cls, read):
+        return read().decode(FileSystemNodeSource.ENCODING)
+
+
+class TarContentArchive(ContentArchive):
+    """Content of a tar archive, optionally compressed, read as a stream"""
+
+    def __init__(self, path):
+        super().__init__(os.path.abspath(path))
+
+    def _enumerate_members(self):
+        import tarfile
+
+        try:
+            with tarfile.open(self.name, 'r|*') as archive:
+                for member in archive:
+                    if member.isfile():
+                        yield member.name, functools.partial(
+                            self._read_text, archive.extractfile(member).read
+                        )
+        except (OSError, tarfile.TarError) as e:
+            raise ContentArchiveError(self.name, e)
+
+
+class ZipContentArchive(ContentArchive):
+    def __init__(self, path):
+        super().__init__(os.path.abspath(path))
+
+    def _enumerate_members(self):
+        import zipfile
+
+        try:
+            with zipfile.ZipFile(self.name) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        yield info.filename, functools.partial(
+                            self._read_text,
+                            functools.partial(archive.read, info)
+                        )
+        except (OSError, zipfile.BadZipFile) as e:
+            raise ContentArchiveError(self.name, e)
+
+
+class SnapshotContentArchive(ContentArchive):
+    """Content files kept in memory as a dict of name -> text"""
+
+    def __init__(self, files, name='snapshot'):
+        super().__init__(name)
+        self._files = files
+
+    def _enumerate_members(self):
+        for name, text in self._files.items():
+            yield name, functools.partial(str, text)
+
+
+class ArchiveNodeSource(YamlNodeSource):
+    """Documents of a `ContentArchive` subdirectory; parsed on `executor`
+    in parallel if it is given, one after another otherwise
+    """
+
+    def __init__(self, archive, subdir, executor=None):
+        self._archive = archive
+        self._subdir = subdir
+        self._executor = executor
+
+    def enumerate(self):
+        for parse in self._parse_all():
+            yield parse()
+
+    def enumerate_with_errors(self):
+        for parse in self._parse_all():
+            try:
+                yield parse()
+            except ValidationError as e:
+                yield e
+
+    def _parse_all(self):
+        """Return functions returning root nodes of every document"""
+        members = self._archive.read(self._subdir)
+        if self._executor is None:
+            return [functools.partial(_parse_member, *x) for x in members]
+
+        futures = [self._executor.submit(_parse_member, *x) for x in members]
+        return [x.result for x in futures]
+
+
+def _parse_member(name, text):
+    stream = io.StringIO(text)
+    stream.name = name
+    return Yaml.create_root_node(stream)
+
+
+class GitStagedFiles:
+    """Stops and routes files staged in git, read from the staging area"""
+
+    def __init__(self, content_directory):
+        self._content_directory = os.path.abspath(content_directory)
+
+    def read(self):
+        top_level = self._git('rev-parse', '--show-toplevel').strip()
+        output = self._git(
+            'diff', '--cached', '--name-status', '--no-renames', '-z',
+            '--', self._content_directory
+        )
+        fields = output.split('\0')
+
+        documents = []
+        for status, path in zip(fields[0::2], fields[1::2]):
+            if not path.endswith(FileSystemNodeSource.YAML_EXT):
+                continue
+            documents.append((
+                os.path.join(top_level, path),
+                None if status == 'D' else self._git('show', ':' + path)
+            ))
+
+        return documents
+
+    def _git(self, *args):
+        import subprocess
+
+        try:
+            return subprocess.check_output(
+                ('git',) + args, cwd=self._content_directory,
+                universal_newlines=True, encoding=FileSystemNodeSource.ENCODING
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise GitError(str(e))
+
+
+class StopKeyIndex:
+    """Stop keys declared and referenced by every content file as of the
+    last full validation, with the marks to report them by. Lets
+    validating a few changed files skip reading all the rest.
+    """
+
+    VERSION = 1
+
+    def __init__(self, declared, references):
+        # stop key -> key `Item`
+        self.declared = declared
+        # route file name -> stop key -> first reference key `Item`
+        self.references = references
+
+    @classmethod
+    def from_content(cls, content):
+        declared = {}
+        for key_item in (x.value.key for x in content.stops):
+            declared.setdefault(key_item.value, key_item)
+
+        references = {}
+        for route in content.routes:
+            file_references = references.setdefault(route.start_mark.name, {})
+            for key_item in (x.value.key for x in route.value.stops.value):
+                file_references.setdefault(key_item.value, key_item)
+
+        return cls(declared, references)
+
+    @classmethod
+    def load(cls, path, content_directory):
+        import json
+
+        with open(path, encoding=FileSystemNodeSource.ENCODING) as file:
+            data = json.load(file)
+
+        if data.get('version') != cls.VERSION:
+            return cls({}, {})
+
+        def load_item(key, file_name, marks):
+            name = os.path.join(content_directory, file_name)
+            return Item(key, Mark(name, *marks[0:2]), Mark(name, *marks[2:4]))
+
+        return cls(
+            declared={
+                x: load_item(x, y[0], y[1:])
+                for x, y in data['declared'].items()
+            },
+            references={
+                os.path.join(content_directory, x): {
+                    z: load_item(z, x, w) for z, w in y.items()
+                }
+                for x, y in data['references'].items()
+            }
+        )
+
+    def save(self, path, content_directory):
+        import json
+
+        def dump_marks(item):
+            return [
+                item.start_mark.line, item.start_mark.column,
+                item.end_mark.line, item.end_mark.column
+            ]
+
+        def relative(name):
+            return os.path.relpath(name, content_directory)
+
+        data = dict(
+            version=self.VERSION,
+            declared={
+                x: [relative(y.start_mark.name)] + dump_marks(y)
+                for x, y in self.declared.items()
+            },
+            references={
+                relative(x): {z: dump_marks(w) for z, w in y.items()}
+                for x, y in self.references.items()
+            }
+        )
+
+        with open(path, 'w', encoding=FileSystemNodeSource.ENCODING) as file:
+            json.dump(data, file, ensure_ascii=False, sort_keys=True)
+
+
+class IncrementalValidator:
+    """Validate changed stops and routes files against `StopKeyIndex`
+    instead of the whole content. Changed files are given as (path, text)
+    pairs, text is `None` for removed files.
+    """
+
+    def __init__(self, content_directory, index, region=None):
+        self._content_directory = os.path.abspath(content_directory)
+        self._index = index
+        self._region = region
+
+    def validate(self, documents):
+        """Return `StopKeyIndex` updated with `documents`"""
+        stop_documents = {}
+        route_documents = {}
+        for path, text in documents:
+            subdir = os.path.relpath(path, self._content_directory) \
+                .split(os.sep)[0]
+            if subdir == StopFileSystemNodeSource.STOPS_SUBDIR:
+                stop_documents[path] = text
+            elif subdir == RouteFileSystemNodeSource.ROUTES_SUBDIR:
+                route_documents[path] = text
+
+        declared = self._validate_stops(stop_documents)
+        references = self._validate_routes(route_documents, declared)
+        self._validate_unchanged_references(route_documents, declared)
+
+        references.update(
+            (x, y) for x, y in self._index.references.items()
+            if x not in route_documents
+        )
+        return StopKeyIndex(declared, references)
+
+    def _validate_stops(self, documents):
+        declared = {
+            x: y for x, y in self._index.declared.items()
+            if y.start_mark.name not in documents
+        }
+
+        for key_item in (x.value.key for x in self._produce(
+                documents, Producers.stops(self._region),
+                lambda x: x.value.stops.value)):
+            key = key_item.value
+            if key in declared:
+                error = KeySecondUsageError(key, key_item, declared[key])
+                error.rule_id = StopKeyUniquenessValidator.__name__
+                raise error
+            declared[key] = key_item
+
+        return declared
+
+    def _produce(self, documents, producer, item_get_func):
+        for path, text in documents.items():
+            if text is None:
+                continue
+
+            stream = io.StringIO(text)
+            stream.name = path
+            yield from item_get_func(
+                producer.produce(Yaml.create_root_node(stream))
+            )
+
+    def _validate_routes(self, documents, declared):
+        references = {}
+        for route in self._produce(
+                documents, Producers.routes(),
+                lambda x: x.value.routes.value):
+            file_references = references.setdefault(route.start_mark.name, {})
+            for key_item in (x.value.key for x in route.value.stops.value):
+                if key_item.value not in declared:
+                    raise DataError.from_item(
+                        'Undeclared stop key "{}"'.format(key_item.value),
+                        key_item, StopKeyReferentialIntegrityValidator
+                    )
+                file_references.setdefault(key_item.value, key_item)
+
+        return references
+
+    def _validate_unchanged_references(self, documents, declared):
+        removed_keys = self._index.declared.keys() - declared.keys()
+        if not removed_keys:
+            return
+
+        for file_name, references in self._index.references.items():
+            if file_name in documents:
+                continue
+            for key in removed_keys & references.keys():
+                raise DataError.from_item(
+                    'Undeclared stop key "{}"'.format(key), references[key],
+                    StopKeyReferentialIntegrityValidator
+                )
+
+
+class StreamingValidator:
+    """Validate content one document at a time in bounded memory.
+
+    Every document is produced, reduced to what content validators need,
+    that is declared stop keys with their coordinates and stop keys
+    referenced by routes, and dropped, so memory grows with the number of
+    distinct stop keys and the largest document rather than with the
+    number of trips. Errors are the ones of `Application._make_validators`
+    on the whole `Content`, in the same order.
+    """
+
+    def __init__(self, stop_source, route_source, report=None, region=None):
+        """Document errors raise `ValidationError`, or are collected in
+        `report` if it is given, like in `Content`
+        """
+        self._stop_source = stop_source
+        self._route_source = route_source
+        self._report = report
+        self._region = region
+
+    def validate(self):
+        """Return `StopKeyIndex` of valid content; raise the first error,
+        or return `None` once errors are collected in `report`
+        """
+        # validator class -> first error
+        errors = {}
+        # stop key -> key `Item`, latitude, longitude
+        declared = {}
+        references = {}
+
+        stop_count = 0
+        for stops in Content.enumerate_stops(
+                self._stop_source, self._report, self._region):
+            stop_count += len(stops)
+            for stop in (x.value for x in stops):
+                first = declared.setdefault(stop.key.value, (
+                    stop.key, stop.latitude.value, stop.longitude.value
+                ))
+                if first[0] is not stop.key and \
+                        StopKeyUniquenessValidator not in errors:
+                    errors[StopKeyUniquenessValidator] = KeySecondUsageError(
+                        stop.key.value, stop.key, first[0]
+                    )
+
+        route_count = 0
+        speed_validator = RouteSpeedValidator()
+        for routes in Content.enumerate_routes(
+                self._route_source, self._report):
+            route_count += len(routes)
+            for route in routes:
+                key_items = [x.value.key for x in route.value.stops.value]
+                self._reduce_route(
+                    route, key_items, declared, references, errors,
+                    speed_validator
+                )
+
+        if not stop_count:
+            errors[NonEmptyContentValidator] = \
+                EmptyContentError.no_stops_error()
+        elif not route_count:
+            errors[NonEmptyContentValidator] = \
+                EmptyContentError.no_routes_error()
+
+        if self._report is not None and self._report.errors:
+            return None
+
+        ordered_errors = []
+        for validator in Application()._make_validators():
+            error = errors.get(type(validator))
+            if error is not None:
+                error.rule_id = error.rule_id or type(validator).__name__
+                ordered_errors.append(error)
+
+        if self._report is not None:
+            self._report.errors += ordered_errors
+        elif ordered_errors:
+            raise ordered_errors[0]
+
+        if ordered_errors:
+            return None
+        return StopKeyIndex(
+            {x: y[0] for x, y in declared.items()}, references
+        )
+
+    def _reduce_route(self, route, key_items, declared, references, errors,
+                      speed_validator):
+        file_references = references.setdefault(route.start_mark.name, {})
+        for key_item in key_items:
+            file_references.setdefault(key_item.value, key_item)
+            if key_item.value not in declared and \
+                    StopKeyReferentialIntegrityValidator not in errors:
+                errors[StopKeyReferentialIntegrityValidator] = \
+                    DataError.from_item(
+                        'Undeclared stop key "{}"'.format(key_item.value),
+                        key_item, StopKeyReferentialIntegrityValidator
+                    )
 
-        for file_path in file_paths:
-            with open(file_path, encoding=self.ENCODING) as file:
-                yield Yaml.create_root_node(file)
+        if RouteSpeedValidator in errors:
+            return
 
-    def _list_content_dir(self, directory):
+        nowhere = (None, math.nan, math.nan)
+        stops = [declared.get(x.value, nowhere) for x in key_items]
+        speeds = Geo.segment_speeds(
+            Geo.distances([x[1] for x in stops], [x[2] for x in stops]),
+            [TimeShift.to_minutes(x.value.shift.value)
+             for x in route.value.stops.value]
+        )
         try:
-            return os.listdir(directory)
-        except FileNotFoundError:
-            raise NoContentDirError(directory)
+            speed_validator.validate_route(key_items, speeds)
+        except ValidationError as e:
+            errors[RouteSpeedValidator] = e
 
-    def _is_yaml_file(self, file_name):
-        return os.path.isfile(file_name) and file_name.endswith(self.YAML_EXT)
 
+class ValidatorScheduler:
+    """Run `ContentValidator`s on shared `ContentIndex`.
 
-class RouteFileSystemNodeSource(FileSystemNodeSource):
-    ROUTES_SUBDIR = 'routes'
+    `ContentIndex` parts required by the validators are built once, then
+    the validators run concurrently on `executor`, or one after another if
+    it is `None`. Errors are returned in the order of the validators.
+    """
 
-    def __init__(self, content_directory):
-        super().__init__(os.path.join(content_directory, self.ROUTES_SUBDIR))
+    def __init__(self, validators, executor=None):
+        self._validators = validators
+        self._executor = executor
 
+    def run(self, content):
+        for validator in self._validators:
+            for name in validator.REQUIRED_INDEXES:
+                getattr(content.index, name)
 
-class StopFileSystemNodeSource(FileSystemNodeSource):
-    STOPS_SUBDIR = 'stops'
+        if self._executor is None:
+            results = [
+                self._run_validator(x, content) for x in self._validators
+            ]
+        else:
+            futures = [
+                self._executor.submit(self._run_validator, x, content)
+                for x in self._validators
+            ]
+            results = [x.result() for x in futures]
 
-    def __init__(self, content_directory):
-        super().__init__(os.path.join(content_directory, self.STOPS_SUBDIR))
+        return [x for x in results if x is not None]
+
+    @classmethod
+    def _run_validator(cls, validator, content):
+        try:
+            validator.validate(content)
+        except ValidationError as e:
+            e.rule_id = e.rule_id or type(validator).__name__
+            return e
+        return None
 
 
 class ContentValidator(metaclass=abc.ABCMeta):
+    # names of `ContentIndex` attributes used by `validate`
+    REQUIRED_INDEXES = ()
+
     @abc.abstractmethod
     def validate(self, content):
         pass
 
 
 class StopKeyUniquenessValidator(ContentValidator):
+    REQUIRED_INDEXES = ('duplicate_stop_keys',)
+
     def validate(self, content):
-        used_keys = {}
-        for stop in (x.value for x in content.stops):
-            key = stop.key.value
-            if key in used_keys:
-                raise KeySecondUsageError(key, stop.key, used_keys[key])
-            used_keys[key] = stop.key
+        duplicates = content.index.duplicate_stop_keys
+        if duplicates:
+            key_item, first_item = duplicates[0]
+            raise KeySecondUsageError(key_item.value, key_item, first_item)
 
 
 class StopKeyReferentialIntegrityValidator(ContentValidator):
+    REQUIRED_INDEXES = ('stops_by_key', 'route_stop_keys')
+
     def validate(self, content):
-        valid_stop_keys = set(x.value.key.value for x in content.stops)
+        valid_stop_keys = content.index.stops_by_key
 
-        for route_stops in (x.value.stops.value for x in content.routes):
-            for key_item in (y.value.key for y in route_stops):
+        for route_stop_keys in content.index.route_stop_keys:
+            for key_item in route_stop_keys:
                 if key_item.value not in valid_stop_keys:
                     raise DataError.from_item(
                         'Undeclared stop key "{}"'.format(key_item.value),
-                        key_item
+                        key_item, self
                     )
 
 
+class RouteSpeedValidator(ContentValidator):
+    """Flag route stops reached faster than a bus goes, usually a wrong
+    stop key, shift or stop coordinates
+    """
+
+    REQUIRED_INDEXES = ('route_stop_keys', 'route_segment_speeds')
+
+    MAX_SPEED = 90  # km/h
+
+    def validate(self, content):
+        for key_items, speeds in zip(
+                content.index.route_stop_keys,
+                content.index.route_segment_speeds):
+            self.validate_route(key_items, speeds)
+
+    def validate_route(self, key_items, speeds):
+        """Validate route of stop key `Item`s with segment `speeds`"""
+        for i, speed in enumerate(speeds):
+            if speed > self.MAX_SPEED:
+                raise DataError.from_item(
+                    'Implausible speed of {:.0f} km/h from stop "{}" to stop '
+                    '"{}", at most {} km/h expected'.format(
+                        speed, key_items[i].value, key_items[i + 1].value,
+                        self.MAX_SPEED
+                    ),
+                    key_items[i + 1], self
+                )
+
+
 class NonEmptyContentValidator(ContentValidator):
     def validate(self, content):
         if not content.stops:
@@ -183,6 +1631,21 @@ class NonEmptyContentValidator(ContentValidator):
             raise EmptyContentError.no_routes_error()
 
 
+class Mark(namedtuple('Mark', 'name, line, column')):
+    """Position of an `Item` in its file.
+
+    Items outlive their nodes, so they do not keep `yaml.Mark`s holding
+    index, pointer and, for documents read from strings, the whole
+    document buffer.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_yaml(cls, mark):
+        return cls(mark.name, mark.line, mark.column)
+
+
 class ItemProducer(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def produce(self, node):
@@ -191,6 +1654,13 @@ class ItemProducer(metaclass=abc.ABCMeta):
         """
         pass
 
+    def _make_item(self, value, node):
+        return Item(
+            value=value,
+            start_mark=Mark.from_yaml(node.start_mark),
+            end_mark=Mark.from_yaml(node.end_mark)
+        )
+
 
 class ScalarProducer(ItemProducer):
     def __init__(self, extractor, *validators):
@@ -198,18 +1668,14 @@ class ScalarProducer(ItemProducer):
         self._validators = validators
 
     def produce(self, node):
-        if not isinstance(node, yaml.ScalarNode):
-            raise DataError.from_node('Scalar expected', node)
+        if node.id != 'scalar':
+            raise DataError.from_node('Scalar expected', node, self)
 
         value = self._extractor.extract(node)
         for validator in self._validators:
             validator.validate(value, node)
 
-        return Item(
-            value=value,
-            start_mark=node.start_mark,
-            end_mark=node.end_mark
-        )
+        return self._make_item(value, node)
 
 
 class ListProducer(ItemProducer):
@@ -218,27 +1684,22 @@ class ListProducer(ItemProducer):
         self._validators = validators
 
     def produce(self, node):
-        if not isinstance(node, yaml.SequenceNode):
-            raise DataError.from_node('Sequence expected', node)
+        if node.id != 'sequence':
+            raise DataError.from_node('Sequence expected', node, self)
 
         value = [self._list_item_producer.produce(x) for x in node.value]
         for validator in self._validators:
             validator.validate(value, node)
 
-        return Item(
-            value=value,
-            start_mark=node.start_mark,
-            end_mark=node.end_mark
-        )
+        return self._make_item(value, node)
 
 
 class NamedTupleProducer(ItemProducer):
     class ProducerDescriptor:
-        def __init__(self, key, producer, required, produced):
+        def __init__(self, key, producer, required):
             self.key = key
             self.producer = producer
             self.required = required
-            self.produced = produced
 
     def __init__(self, tuple_class, required_attr_producers=None,
                  optional_attr_producers=None, validators=None):
@@ -257,79 +1718,74 @@ class NamedTupleProducer(ItemProducer):
         descriptors = {}
 
         for key, producer in required_producers.items():
-            descriptors[key] = self.ProducerDescriptor(
-                key, producer, True, False
-            )
+            descriptors[key] = self.ProducerDescriptor(key, producer, True)
 
         for key, producer in optional_producers.items():
             if key in descriptors:
                 raise RuntimeError('Key {0} used more than once'.format(key))
-            descriptors[key] = self.ProducerDescriptor(
-                key, producer, False, False
-            )
+            descriptors[key] = self.ProducerDescriptor(key, producer, False)
 
         return descriptors
 
     def produce(self, node):
-        if not isinstance(node, yaml.MappingNode):
-            raise DataError.from_node('Mapping expected', node)
+        if node.id != 'mapping':
+            raise DataError.from_node('Mapping expected', node, self)
 
-        tuple_dict = {x: None for x in self._tuple_class._fields}
+        # produced keys are kept locally, not in descriptors, so a single
+        # producer graph is safe to share and to reuse
+        tuple_dict = dict.fromkeys(self._tuple_class._fields)
+        produced = set()
 
         for key_node, value_node in node.value:
-            descriptor = self._get_descriptor(key_node)
+            descriptor = self._get_descriptor(key_node, produced)
             value = descriptor.producer.produce(value_node)
             tuple_dict[descriptor.key] = value
-            descriptor.produced = True
+            produced.add(descriptor.key)
 
-        self._validate_required_produced(node)
-        self._clear_produced_flag()
+        self._validate_required_produced(node, produced)
 
         value = self._tuple_class(**tuple_dict)
 
         for validator in self._validators:
             validator.validate(value, node)
 
-        return Item(
-            value=value,
-            start_mark=node.start_mark,
-            end_mark=node.end_mark
-        )
+        return self._make_item(value, node)
 
-    def _get_descriptor(self, key_node):
+    def _get_descriptor(self, key_node, produced):
         key = self._key_producer.produce(key_node).value
         if key not in self._producer_descriptors:
             raise DataError.from_node(
-                'Item "{}" not expected'.format(key), key_node
+                'Item "{}" not expected'.format(key), key_node, self
             )
 
         descriptor = self._producer_descriptors[key]
-        if descriptor.produced:
+        if key in produced:
             raise DataError.from_node(
-                'Item "{}" used again'.format(key), key_node
+                'Item "{}" used again'.format(key), key_node, self
             )
 
         return descriptor
 
-    def _validate_required_produced(self, node):
+    def _validate_required_produced(self, node, produced):
         non_produced = next(
             (x for x in self._producer_descriptors.values()
-             if x.required and not x.produced),
+             if x.required and x.key not in produced),
             None
         )
         if non_produced:
             raise DataError.from_node(
                 'Required item "{0}" not specified'.format(non_produced.key),
-                node
+                node, self
             )
 
-    def _clear_produced_flag(self):
-        for descriptor in self._producer_descriptors.values():
-            descriptor.produced = False
-
 
 class StopProducer(NamedTupleProducer):
-    def __init__(self):
+    def __init__(self, region=None):
+        latitude_bounds = longitude_bounds = ()
+        if region is not None:
+            latitude_bounds = (region.min_latitude, region.max_latitude)
+            longitude_bounds = (region.min_longitude, region.max_longitude)
+
         super().__init__(
             tuple_class=Stop,
             required_attr_producers=dict(
@@ -342,10 +1798,12 @@ class StopProducer(NamedTupleProducer):
                     StringValueExtractor(), NonEmptyStringValidator()
                 ),
                 latitude=ScalarProducer(
-                    FloatValueExtractor(), LatitudeFloatRangeValidator()
+                    FloatValueExtractor(),
+                    LatitudeFloatRangeValidator(*latitude_bounds)
                 ),
                 longitude=ScalarProducer(
-                    FloatValueExtractor(), LongitudeFloatRangeValidator()
+                    FloatValueExtractor(),
+                    LongitudeFloatRangeValidator(*longitude_bounds)
                 )
             ),
             optional_attr_producers=dict(
@@ -373,15 +1831,29 @@ class RouteStopProducer(NamedTupleProducer):
         )
 
 
-class RouteTripProducer(NamedTupleProducer):
+class TripTimeProducer(ScalarProducer):
+    """Produce trip time `Item`s with `TripFlags` of their comments"""
+
     def __init__(self):
-        time_list_producer = ListProducer(
-            ScalarProducer(
-                StringValueExtractor(),
-                NonEmptyStringValidator(), StringTimeShiftValidator()
-            )
+        super().__init__(
+            StringValueExtractor(),
+            NonEmptyStringValidator(), StringTimeShiftValidator()
         )
 
+    def produce(self, node):
+        item = super().produce(node)
+
+        comment = getattr(node, 'comment', None)
+        if comment:
+            item = item._replace(flags=TripComment.parse(comment))
+
+        return item
+
+
+class RouteTripProducer(NamedTupleProducer):
+    def __init__(self):
+        time_list_producer = ListProducer(TripTimeProducer())
+
         super().__init__(
             tuple_class=RouteTrip,
             optional_attr_producers=dict(
@@ -414,10 +1886,12 @@ class RouteProducer(NamedTupleProducer):
 
 
 class StopsProducer(NamedTupleProducer):
-    def __init__(self):
+    def __init__(self, region=None):
         super().__init__(
             tuple_class=Stops,
-            required_attr_producers=dict(stops=ListProducer(StopProducer()))
+            required_attr_producers=dict(
+                stops=ListProducer(StopProducer(region))
+            )
         )
 
 
@@ -429,24 +1903,100 @@ class RoutesProducer(NamedTupleProducer):
         )
 
 
+class RegionProducer(NamedTupleProducer):
+    def __init__(self):
+        super().__init__(
+            tuple_class=Region,
+            required_attr_producers=dict(
+                key=ScalarProducer(
+                    StringValueExtractor(),
+                    NonEmptyStringValidator(),
+                    StringKeyValidator()
+                ),
+                name=ScalarProducer(
+                    StringValueExtractor(), NonEmptyStringValidator()
+                ),
+                min_latitude=ScalarProducer(
+                    FloatValueExtractor(), FloatRangeValidator(-90, 90)
+                ),
+                max_latitude=ScalarProducer(
+                    FloatValueExtractor(), FloatRangeValidator(-90, 90)
+                ),
+                min_longitude=ScalarProducer(
+                    FloatValueExtractor(), FloatRangeValidator(-180, 180)
+                ),
+                max_longitude=ScalarProducer(
+                    FloatValueExtractor(), FloatRangeValidator(-180, 180)
+                )
+            ),
+            validators=[RegionBoundsValidator()]
+        )
+
+
+class RegionsProducer(NamedTupleProducer):
+    def __init__(self):
+        super().__init__(
+            tuple_class=Regions,
+            required_attr_producers=dict(
+                regions=ListProducer(
+                    RegionProducer(), RegionKeyUniquenessValidator()
+                )
+            )
+        )
+
+
+class Producers:
+    """Producer graphs built once per process and shared by all reads"""
+
+    # region -> stops producer checking its bounds
+    _stops = {}
+    _routes = None
+
+    @classmethod
+    def stops(cls, region=None):
+        if region not in cls._stops:
+            cls._stops[region] = StopsProducer(region)
+        return cls._stops[region]
+
+    @classmethod
+    def routes(cls):
+        if cls._routes is None:
+            cls._routes = RoutesProducer()
+        return cls._routes
+
+
 class ValidationError(Exception):
+    # name of the producer or validator class finding the error
+    rule_id = None
+
     def _print_mark(self, mark):
         return 'line {}, column {}'.format(mark.line + 1, mark.column + 1)
 
+    def diagnostics(self):
+        """Return machine-readable `Diagnostic`s describing the error"""
+        return [Diagnostic.make(self, str(self))]
+
 
 class DataError(ValidationError):
-    def __init__(self, message, start_mark, end_mark):
+    def __init__(self, message, start_mark, end_mark, rule_id=None):
+        super().__init__(message, start_mark, end_mark, rule_id)
         self.message = message
         self.start_mark = start_mark
         self.end_mark = end_mark
+        self.rule_id = rule_id
 
     @classmethod
-    def from_node(cls, message, node):
-        return DataError(message, node.start_mark, node.end_mark)
+    def from_node(cls, message, node, source=None):
+        return DataError(
+            message, Mark.from_yaml(node.start_mark),
+            Mark.from_yaml(node.end_mark), _get_rule_id(source)
+        )
 
     @classmethod
-    def from_item(cls, message, item):
-        return DataError(message, item.start_mark, item.end_mark)
+    def from_item(cls, message, item, source=None):
+        return DataError(
+            message, item.start_mark, item.end_mark, _get_rule_id(source)
+        )
 
     def __str__(self):
         return '{}.\nFile: {}.\nStart: {}; end: {}.'.format(
@@ -456,9 +2006,15 @@ class DataError(ValidationError):
             self._print_mark(self.end_mark)
         )
 
+    def diagnostics(self):
+        return [
+            Diagnostic.make(self, self.message, self.start_mark, self.end_mark)
+        ]
+
 
 class KeySecondUsageError(ValidationError):
     def __init__(self, key, item, first_use_item):
+        super().__init__(key, item, first_use_item)
         self.key = key
         self.item = item
         self.first_use_item = first_use_item
@@ -479,23 +2035,83 @@ class KeySecondUsageError(ValidationError):
             self._print_mark(item.end_mark)
         )
 
+    def diagnostics(self):
+        return [
+            Diagnostic.make(
+                self, 'Key "{}" used second time'.format(self.key),
+                self.item.start_mark, self.item.end_mark,
+                related=[Diagnostic.make_location(
+                    self.first_use_item.start_mark,
+                    self.first_use_item.end_mark
+                )]
+            )
+        ]
+
 
-class YamlFormatError(ValidationError):
+class GitError(ValidationError):
     def __init__(self, message):
+        super().__init__(message)
+        self._message = message
+
+    def __str__(self):
+        return 'Git error:\n{}'.format(self._message)
+
+
+class YamlFormatError(ValidationError):
+    def __init__(self, message, mark=None):
+        super().__init__(message, mark)
         self._message = message
+        self._mark = mark
 
     def __str__(self):
         return 'YAML parsing error:\n{}'.format(self._message)
 
+    def diagnostics(self):
+        return [Diagnostic.make(self, str(self), self._mark, self._mark)]
+
 
 class NoContentDirError(ValidationError):
     def __init__(self, directory):
+        super().__init__(directory)
         self._directory = directory
 
     def __str__(self):
         return 'Required directory {} does not exist.'.format(self._directory)
 
 
+class ContentArchiveError(ValidationError):
+    def __init__(self, path, error):
+        super().__init__(path, error)
+        self._path = path
+        self._error = error
+
+    def __str__(self):
+        return 'Content archive {} is not readable: {}.'.format(
+            self._path, self._error
+        )
+
+
+class NoRegionError(ValidationError):
+    def __init__(self, key, known_keys):
+        super().__init__(key, known_keys)
+        self.key = key
+        self.known_keys = known_keys
+
+    def __str__(self):
+        if not self.known_keys:
+            return 'Region "{}" requested, but content is not sharded by ' \
+                   'region.'.format(self.key)
+
+        if self.key is None:
+            message = 'Region expected for content sharded by region.'
+        else:
+            message = 'Region "{}" not found.'.format(self.key)
+
+        return '{}\nKnown regions: {}.'.format(
+            message, ', '.join(self.known_keys)
+        )
+
+
 class EmptyContentError(ValidationError):
     @classmethod
     def no_routes_error(cls):
@@ -513,6 +2129,231 @@ class EmptyContentError(ValidationError):
         return self.message
 
 
+class Diagnostic(namedtuple(
+        'Diagnostic', 'rule_id, message, location, related')):
+    """Machine-readable description of a `ValidationError`, `location` and
+    `related` locations are `DiagnosticLocation`s with one-based lines and
+    columns, `location` is `None` for errors not bound to a file
+    """
+
+    @classmethod
+    def make(cls, error, message, start_mark=None, end_mark=None,
+             related=None):
+        return cls(
+            rule_id=error.rule_id or type(error).__name__,
+            message=message,
+            location=(
+                cls.make_location(start_mark, end_mark)
+                if start_mark is not None else None
+            ),
+            related=related or []
+        )
+
+    @classmethod
+    def make_location(cls, start_mark, end_mark):
+        return DiagnosticLocation(
+            file=start_mark.name,
+            start_line=start_mark.line + 1,
+            start_column=start_mark.column + 1,
+            end_line=end_mark.line + 1,
+            end_column=end_mark.column + 1
+        )
+
+
+class StatsFormatter(metaclass=abc.ABCMeta):
+    # format name -> formatter class name
+    FORMATTERS = dict(
+        text='TextStatsFormatter',
+        json='JsonStatsFormatter'
+    )
+
+    @classmethod
+    def create(cls, name):
+        return globals()[cls.FORMATTERS[name]]()
+
+    @abc.abstractmethod
+    def format(self, stats):
+        """Format `ContentStats`"""
+        pass
+
+
+class TextStatsFormatter(StatsFormatter):
+    def format(self, stats):
+        distribution = stats.trips_per_route
+        lines = [
+            'Stops: {}'.format(stats.stops),
+            'Routes: {}'.format(stats.routes),
+            'Directions: {}'.format(stats.directions),
+            'Route stops: {}'.format(stats.route_stops),
+            'Trip times: {}'.format(', '.join(
+                '{} {}'.format(x, y) for x, y in stats.trip_times.items()
+            )),
+            'Largest files:'
+        ]
+        lines += [
+            '  {}: {} stops, {} directions, {} route stops, {} trip '
+            'times'.format(*x)
+            for x in stats.largest_files
+        ]
+        lines.append('Most referenced stops:')
+        lines += [
+            '  {}: {} routes'.format(*x) for x in stats.most_referenced_stops
+        ]
+        lines.append(
+            'Trips per route: min {}, median {}, p90 {}, max {}, mean '
+            '{:.1f}'.format(*distribution[:5])
+        )
+        lines += [
+            '  {}: {}'.format(self._format_bucket(low, high), count)
+            for low, high, count in distribution.buckets
+        ]
+
+        return '\n'.join(lines)
+
+    def _format_bucket(self, low, high):
+        if high is None:
+            return '{}+'.format(low)
+        if high == low:
+            return str(low)
+        return '{}-{}'.format(low, high)
+
+
+class JsonStatsFormatter(StatsFormatter):
+    def format(self, stats):
+        import json
+
+        return json.dumps(dict(
+            stats._asdict(),
+            largest_files=[x._asdict() for x in stats.largest_files],
+            most_referenced_stops=[
+                x._asdict() for x in stats.most_referenced_stops
+            ],
+            trips_per_route=dict(
+                stats.trips_per_route._asdict(),
+                buckets=[
+                    dict(lowest=x, highest=y, routes=z)
+                    for x, y, z in stats.trips_per_route.buckets
+                ]
+            )
+        ), ensure_ascii=False, indent=2)
+
+
+class DiagnosticsFormatter(metaclass=abc.ABCMeta):
+    # format name -> formatter class name
+    FORMATTERS = dict(
+        json='JsonDiagnosticsFormatter',
+        sarif='SarifDiagnosticsFormatter'
+    )
+
+    @classmethod
+    def create(cls, name):
+        return globals()[cls.FORMATTERS[name]]()
+
+    @abc.abstractmethod
+    def format(self, report):
+        """Format errors and timings of `ContentReadReport`"""
+        pass
+
+    def _diagnostics(self, report):
+        return [y for x in report.errors for y in x.diagnostics()]
+
+    def _timings(self, report):
+        return [dict(file=x.file, seconds=x.seconds) for x in report.timings]
+
+    def _dump(self, data):
+        import json
+
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+class JsonDiagnosticsFormatter(DiagnosticsFormatter):
+    def format(self, report):
+        return self._dump(dict(
+            valid=not report.errors,
+            diagnostics=[
+                dict(
+                    rule_id=x.rule_id,
+                    message=x.message,
+                    location=self._format_location(x.location),
+                    related=[self._format_location(y) for y in x.related]
+                )
+                for x in self._diagnostics(report)
+            ],
+            timings=self._timings(report)
+        ))
+
+    def _format_location(self, location):
+        return location._asdict() if location is not None else None
+
+
+class SarifDiagnosticsFormatter(DiagnosticsFormatter):
+    VERSION = '2.1.0'
+    SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+    TOOL_NAME = 'bus-time-content-validator'
+
+    def format(self, report):
+        diagnostics = self._diagnostics(report)
+        rule_ids = list(dict.fromkeys(x.rule_id for x in diagnostics))
+
+        return self._dump({
+            '$schema': self.SCHEMA,
+            'version': self.VERSION,
+            'runs': [dict(
+                tool=dict(driver=dict(
+                    name=self.TOOL_NAME,
+                    rules=[dict(id=x) for x in rule_ids]
+                )),
+                results=[
+                    self._format_result(x, rule_ids.index(x.rule_id))
+                    for x in diagnostics
+                ],
+                properties=dict(fileTimings=self._timings(report))
+            )]
+        })
+
+    def _format_result(self, diagnostic, rule_index):
+        result = dict(
+            ruleId=diagnostic.rule_id,
+            ruleIndex=rule_index,
+            level='error',
+            message=dict(text=diagnostic.message)
+        )
+
+        if diagnostic.location is not None:
+            result['locations'] = [self._format_location(diagnostic.location)]
+        if diagnostic.related:
+            result['relatedLocations'] = [
+                self._format_location(x) for x in diagnostic.related
+            ]
+
+        return result
+
+    def _format_location(self, location):
+        uri = location.file
+        if os.path.isabs(uri):
+            import pathlib
+
+            uri = pathlib.Path(uri).as_uri()
+
+        return dict(physicalLocation=dict(
+            artifactLocation=dict(uri=uri),
+            region=dict(
+                startLine=location.start_line,
+                startColumn=location.start_column,
+                endLine=location.end_line,
+                endColumn=location.end_column
+            )
+        ))
+
+
+def _get_rule_id(source):
+    if source is None:
+        return None
+    if not isinstance(source, type):
+        source = type(source)
+    return source.__name__
+
+
 class ValueValidator(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def validate(self, value, node):
@@ -527,7 +2368,7 @@ class NonEmptyStringValidator(ValueValidator):
     def validate(self, value, node):
         if not value:
             raise DataError.from_node(
-                'Non empty value required', node
+                'Non empty value required', node, self
             )
 
 
@@ -543,7 +2384,7 @@ class StringKeyValidator(ValueValidator):
         if invalid_char:
             raise DataError.from_node(
                 'Invalid character "{}" in "{}"'.format(invalid_char, value),
-                node
+                node, self
             )
 
 
@@ -564,7 +2405,7 @@ class StringTimeShiftValidator(ValueValidator):
 
     def _raise(self, value, node):
         raise DataError.from_node(
-            '"{}" is not a valid time'.format(node.value), node
+            '"{}" is not a valid time'.format(node.value), node, self
         )
 
     def _to_positive_int(self, string_value, value, node):
@@ -579,6 +2420,102 @@ class StringTimeShiftValidator(ValueValidator):
         return int_value
 
 
+class TimeShift:
+    MINUTES_PER_HOUR = 60
+
+    @classmethod
+    def to_minutes(cls, value):
+        """Convert valid `hh:mm` string to the number of minutes"""
+        return int(value[0:2]) * cls.MINUTES_PER_HOUR + int(value[3:5])
+
+    @classmethod
+    def from_minutes(cls, minutes):
+        return '{:02d}:{:02d}'.format(*divmod(minutes, cls.MINUTES_PER_HOUR))
+
+
+class DayKind:
+    """Kinds of days passengers travel on, each served by trips of some
+    `RouteTrip` day types; everyday trips run on every kind
+    """
+
+    # day kind -> `RouteTrip` day types of trips running on it
+    DAY_TYPES = dict(
+        workdays=('workdays', 'everyday'),
+        weekend=('weekend', 'everyday')
+    )
+
+    @classmethod
+    def day_type_indexes(cls, day_kind):
+        """`RouteTrip` field indexes of trips running on `day_kind`"""
+        return [RouteTrip._fields.index(x) for x in cls.DAY_TYPES[day_kind]]
+
+
+class Geo:
+    EARTH_RADIUS = 6371008.8  # meters, mean
+    WALKING_SPEED = 75  # meters per minute
+
+    @classmethod
+    def distance(cls, latitude1, longitude1, latitude2, longitude2):
+        """Great-circle distance between two points in meters"""
+        latitude1, longitude1, latitude2, longitude2 = map(
+            math.radians, (latitude1, longitude1, latitude2, longitude2)
+        )
+        a = math.sin((latitude2 - latitude1) / 2) ** 2 + \
+            math.cos(latitude1) * math.cos(latitude2) * \
+            math.sin((longitude2 - longitude1) / 2) ** 2
+        return 2 * cls.EARTH_RADIUS * math.asin(math.sqrt(a))
+
+    @classmethod
+    def distances(cls, latitudes, longitudes):
+        """Great-circle distances in meters between consecutive points;
+        every step is mapped over all points at once
+        """
+        latitudes = list(map(math.radians, latitudes))
+        longitudes = list(map(math.radians, longitudes))
+        cosines = list(map(math.cos, latitudes))
+
+        squares = itertools.repeat(2)
+        latitude_terms = map(pow, map(math.sin, map(
+            (0.5).__mul__, map(operator.sub, latitudes[1:], latitudes)
+        )), squares)
+        longitude_terms = map(pow, map(math.sin, map(
+            (0.5).__mul__, map(operator.sub, longitudes[1:], longitudes)
+        )), squares)
+        a = map(operator.add, latitude_terms, map(
+            operator.mul, map(operator.mul, cosines, cosines[1:]),
+            longitude_terms
+        ))
+        return array.array('d', map(
+            (2 * cls.EARTH_RADIUS).__mul__, map(math.asin, map(math.sqrt, a))
+        ))
+
+    @classmethod
+    def speed(cls, meters, minutes):
+        """Speed in km/h"""
+        return meters / minutes * 60 / 1000
+
+    @classmethod
+    def segment_speeds(cls, distances, minutes):
+        """Speeds in km/h over segments of `distances` meters between
+        points passed at `minutes`; minutes are whole, so a segment takes a
+        minute at least
+        """
+        return array.array('d', map(
+            cls.speed, distances,
+            (max(y - x, 1) for x, y in zip(minutes, minutes[1:]))
+        ))
+
+    @classmethod
+    def walking_minutes(cls, meters):
+        """Whole minutes, at least one, to walk `meters`"""
+        return max(1, math.ceil(meters / cls.WALKING_SPEED))
+
+    @classmethod
+    def latitude_degrees(cls, meters):
+        """Latitude difference of points `meters` apart on a meridian"""
+        return math.degrees(meters / cls.EARTH_RADIUS)
+
+
 class FloatRangeValidator(ValueValidator):
     def __init__(self, from_inclusive, to_inclusive):
         self._to_inclusive = to_inclusive
@@ -590,26 +2527,54 @@ class FloatRangeValidator(ValueValidator):
                 'Value expected to be in {}..{} interval'.format(
                     self._from_inclusive, self._to_inclusive
                 ),
-                node
+                node, self
             )
 
 
 class LatitudeFloatRangeValidator(FloatRangeValidator):
-    # Novopolotsk and Polotsk neighbourhood
+    # Novopolotsk and Polotsk neighbourhood, for content not sharded by
+    # region
     FROM = 55.4
     TO = 55.6
 
-    def __init__(self):
-        super().__init__(self.FROM, self.TO)
+    def __init__(self, from_inclusive=FROM, to_inclusive=TO):
+        super().__init__(from_inclusive, to_inclusive)
 
 
 class LongitudeFloatRangeValidator(FloatRangeValidator):
-    # Novopolotsk and Polotsk neighbourhood
+    # Novopolotsk and Polotsk neighbourhood, for content not sharded by
+    # region
     FROM = 28.4
     TO = 28.9
 
-    def __init__(self):
-        super().__init__(self.FROM, self.TO)
+    def __init__(self, from_inclusive=FROM, to_inclusive=TO):
+        super().__init__(from_inclusive, to_inclusive)
+
+
+class RegionBoundsValidator(ValueValidator):
+    def validate(self, value, node):
+        for name in ('latitude', 'longitude'):
+            min_item = getattr(value, 'min_' + name)
+            if min_item.value > getattr(value, 'max_' + name).value:
+                raise DataError.from_item(
+                    'Minimum {0} expected to be not greater than maximum '
+                    '{0}'.format(name),
+                    min_item, self
+                )
+
+
+class RegionKeyUniquenessValidator(ValueValidator):
+    def validate(self, value, node):
+        keys = set()
+        for key_item in (x.value.key for x in value):
+            if key_item.value in keys:
+                raise DataError.from_item(
+                    'Region key "{}" used more than once'.format(
+                        key_item.value
+                    ),
+                    key_item, self
+                )
+            keys.add(key_item.value)
 
 
 class RouteTripValidator(ValueValidator):
@@ -627,7 +2592,7 @@ class RouteTripValidator(ValueValidator):
         raise DataError.from_node(
             'Either one of workdays or weekend, or only everyday '
             'trips expected',
-            node
+            node, self
         )
 
 
@@ -646,7 +2611,8 @@ class FloatValueExtractor(ScalarValueExtractor):
             return float(node.value)
         except ValueError:
             raise DataError.from_node(
-                '"{}" is not a valid float number'.format(node.value), node
+                '"{}" is not a valid float number'.format(node.value),
+                node, self
             )
 
 
@@ -663,17 +2629,138 @@ class BoolValueExtractor(ScalarValueExtractor):
             return False
         else:
             raise DataError.from_node(
-                '"{}" is not a valid boolean value'.format(node.value), node
+                '"{}" is not a valid boolean value'.format(node.value),
+                node, self
             )
 
 
+class TripComment:
+    """Parse trip time comments, e.g. `в гараж` or `ч/з КПД, Полимир`"""
+
+    TO_DEPOT = 'в гараж'
+    ONLY_FRIDAYS = 'по пятницам'
+    EXCEPT_FRIDAYS = 'кроме пятницы'
+    VIA_PREFIXES = ('через ', 'ч/з ')
+
+    @classmethod
+    def parse(cls, text):
+        """Return `TripFlags` of comment `text`; `fridays` is `True` for
+        trips on Fridays only, `False` for trips except Fridays, `via` lists
+        the stops a trip detours through, `note` is the whole comment
+        """
+        lower = text.lower()
+
+        fridays = None
+        if cls.ONLY_FRIDAYS in lower:
+            fridays = True
+        elif cls.EXCEPT_FRIDAYS in lower:
+            fridays = False
+
+        via = next(
+            (text[len(x):].strip() for x in cls.VIA_PREFIXES
+             if lower.startswith(x)),
+            None
+        )
+
+        return TripFlags(
+            to_depot=cls.TO_DEPOT in lower,
+            fridays=fridays,
+            via=via,
+            note=text
+        )
+
+
+class _CommentScanner:
+    """YAML loader mixin keeping comments the scanner skips anyway,
+    one per line, keyed by zero-based line number
+    """
+
+    LINE_ENDS = '\0\r\n\x85\u2028\u2029'
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.comments = {}
+
+    def scan_to_next_token(self):
+        # same as `yaml.scanner.Scanner.scan_to_next_token`, but comments
+        # are kept instead of skipped
+        if self.index == 0 and self.peek() == '\uFEFF':
+            self.forward()
+
+        while True:
+            while self.peek() == ' ':
+                self.forward()
+            if self.peek() == '#':
+                self._scan_comment()
+            if not self.scan_line_break():
+                return
+            if not self.flow_level:
+                self.allow_simple_key = True
+
+    def _scan_comment(self):
+        line = self.line
+        length = 1
+        while self.peek(length) not in self.LINE_ENDS:
+            length += 1
+
+        self.comments[line] = self.prefix(length)[1:].strip()
+        self.forward(length)
+
+
 class Yaml:
+    _loader_class = None
+
     @classmethod
     def create_root_node(cls, stream):
+        """Compose the document of `stream`; scalar nodes followed by a
+        comment on their last line get it as `comment` attribute
+        """
+        loader = cls._get_loader_class()(stream)
         try:
-            return yaml.compose(stream)
+            root = loader.get_single_node()
         except yaml.YAMLError as e:
-            raise YamlFormatError(str(e))
+            mark = getattr(e, 'problem_mark', None)
+            raise YamlFormatError(
+                str(e), Mark.from_yaml(mark) if mark is not None else None
+            )
+        finally:
+            loader.dispose()
+
+        if loader.comments and root is not None:
+            cls._attach_comments(root, loader.comments)
+
+        return root
+
+    @classmethod
+    def _get_loader_class(cls):
+        # built on first use, so that importing this module does not
+        # import yaml
+        if cls._loader_class is None:
+            cls._loader_class = type(
+                'Loader', (_CommentScanner, yaml.SafeLoader), {}
+            )
+        return cls._loader_class
+
+    @classmethod
+    def _attach_comments(cls, root, comments):
+        nodes = [root]
+        visited = set()
+
+        while nodes:
+            node = nodes.pop()
+            # aliases may make a node its own descendant
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+
+            if node.id == 'scalar':
+                comment = comments.get(node.end_mark.line)
+                if comment is not None:
+                    node.comment = comment
+            elif node.id == 'sequence':
+                nodes += node.value
+            else:
+                nodes += (x for pair in node.value for x in pair)
 
 
 if __name__ == '__main__':
@@ -1,5 +1,10 @@
 # coding: utf-8
 
+import io
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from validator import *
@@ -13,6 +18,30 @@ class StringYamlNodeSource(YamlNodeSource):
         return (Yaml.create_root_node(x) for x in self._documents)
 
 
+# stops at one place for tests of queries over routes
+STOPS = '''
+stops:
+  - key: key1
+    name: name1
+    latitude: 55.5
+    longitude: 28.6
+  - key: key2
+    name: name2
+    latitude: 55.5
+    longitude: 28.6
+  - key: key3
+    name: name3
+    latitude: 55.5
+    longitude: 28.6
+'''
+
+
+def make_content(routes, stops=STOPS):
+    return Content(
+        StringYamlNodeSource([stops]), StringYamlNodeSource([routes])
+    )
+
+
 class TestNonEmptyContentValidator:
     def test_no_stops_fails(self):
         routes = [
@@ -191,6 +220,596 @@ class TestStopKeyUniquenessValidator():
         assert 'used second time' in str(ex_info)
 
 
+class TestRouteSpeedValidator:
+    # stops about 11 km apart
+    STOPS = [
+        '''
+        stops:
+          - key: key1
+            name: name1
+            latitude: 55.5
+            longitude: 28.6
+          - key: key2
+            name: name2
+            latitude: 55.6
+            longitude: 28.6
+        '''
+    ]
+    ROUTES = '''
+        routes:
+          - number: 1
+            description: description1
+            stops:
+              - key: key1
+                shift: 00:00
+              - key: key2
+                shift: {}
+              - key: key3
+                shift: 00:30
+            trips:
+              everyday:
+                - 05:59
+    '''
+
+    def validate(self, shift):
+        content = Content(
+            StringYamlNodeSource(self.STOPS),
+            StringYamlNodeSource([self.ROUTES.format(shift)])
+        )
+
+        RouteSpeedValidator().validate(content)
+
+    def test_valid_succeeds(self):
+        # undeclared stops are left to `StopKeyReferentialIntegrityValidator`
+        self.validate('00:15')
+
+    def test_too_fast_fails(self):
+        with pytest.raises(DataError) as ex_info:
+            self.validate('00:05')
+
+        assert str(ex_info.value).startswith(
+            'Implausible speed of 133 km/h from stop "key1" to stop "key2", '
+            'at most 90 km/h expected.\nFile: <unicode string>.\n'
+            'Start: line 8, column 22;'
+        )
+
+
+class TestValidatorScheduler:
+    STOPS = [
+        '''
+        stops:
+          - key: key1
+            name: name1
+            latitude: 55.542185
+            longitude: 28.666802
+          - key: key1
+            name: name2
+            latitude: 55.5418
+            longitude: 28.666802
+        '''
+    ]
+    ROUTES = [
+        '''
+        routes:
+          - number: 1
+            description: description1
+            stops:
+              - key: key2
+                shift: 00:00
+            trips:
+              everyday:
+                - 05:59
+        '''
+    ]
+
+    def test_errors_in_validator_order(self):
+        errors = self._run(None)
+
+        assert [type(x) for x in errors] == [
+            KeySecondUsageError, DataError
+        ]
+
+    def _run(self, executor):
+        content = Content(
+            StringYamlNodeSource(self.STOPS), StringYamlNodeSource(self.ROUTES)
+        )
+
+        return ValidatorScheduler(
+            [
+                NonEmptyContentValidator(),
+                StopKeyUniquenessValidator(),
+                StopKeyReferentialIntegrityValidator()
+            ],
+            executor
+        ).run(content)
+
+    def test_pooled_same_as_sequential(self):
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            errors = self._run(executor)
+
+        assert [str(x) for x in errors] == [str(x) for x in self._run(None)]
+
+
+class TestStreamingValidator:
+    STOPS = TestValidatorScheduler.STOPS
+    ROUTES = TestValidatorScheduler.ROUTES
+
+    def _validate(self, stops, routes, report=None):
+        return StreamingValidator(
+            StringYamlNodeSource(stops), StringYamlNodeSource(routes), report
+        ).validate()
+
+    def test_valid_index_same_as_content(self):
+        stops = TestRouteSpeedValidator.STOPS
+        routes = [TestRouteSpeedValidator.ROUTES.format('00:15').replace(
+            'key3', 'key1'
+        )]
+
+        index = self._validate(stops, routes)
+
+        content_index = StopKeyIndex.from_content(Content(
+            StringYamlNodeSource(stops), StringYamlNodeSource(routes)
+        ))
+        assert index.declared == content_index.declared
+        assert index.references == content_index.references
+
+    def test_first_error_same_as_content(self):
+        with pytest.raises(KeySecondUsageError) as ex_info:
+            self._validate(self.STOPS, self.ROUTES)
+
+        assert ex_info.value.rule_id == 'StopKeyUniquenessValidator'
+
+    def test_errors_in_validator_order(self):
+        report = ContentReadReport()
+
+        assert self._validate(self.STOPS, self.ROUTES, report) is None
+        assert [str(x) for x in report.errors] == [
+            str(x) for x in TestValidatorScheduler()._run(None)
+        ]
+        assert len(report.timings) == 2
+
+    def test_speed_error(self):
+        with pytest.raises(DataError) as ex_info:
+            self._validate(
+                TestRouteSpeedValidator.STOPS,
+                [TestRouteSpeedValidator.ROUTES.format('00:05').replace(
+                    'key3', 'key1'
+                )]
+            )
+
+        assert str(ex_info.value).startswith('Implausible speed of 133 km/h')
+
+    def test_no_routes_fails(self):
+        with pytest.raises(EmptyContentError) as ex_info:
+            self._validate(self.STOPS, [])
+
+        assert str(ex_info.value) == 'No routes found.'
+
+
+class TestContentIndex:
+    STOPS = [
+        '''
+        stops:
+          - key: key1
+            name: name1
+            latitude: 55.542185
+            longitude: 28.666802
+          - key: key2
+            name: name1
+            latitude: 55.5418
+            longitude: 28.666802
+        '''
+    ]
+    ROUTES = [
+        '''
+        routes:
+          - number: 1
+            description: description1
+            stops:
+              - key: key1
+                shift: 00:00
+              - key: key2
+                shift: 00:02
+              - key: key1
+                shift: 00:04
+            trips:
+              workdays:
+                - 05:59
+                - 06:10
+          - number: 1
+            description: description2
+            stops:
+              - key: key2
+                shift: 00:00
+            trips:
+              everyday:
+                - 07:00
+        '''
+    ]
+
+    def test_lookups(self):
+        index = self._make_content().index
+
+        assert list(index.stops_by_key) == ['key1', 'key2']
+        assert [len(x) for x in index.stops_by_name.values()] == [2]
+        assert [len(x) for x in index.routes_by_number.values()] == [2]
+        assert [len(x) for x in index.routes_by_stop_key.values()] == [1, 2]
+        assert not index.duplicate_stop_keys
+
+    def _make_content(self):
+        return Content(
+            StringYamlNodeSource(self.STOPS), StringYamlNodeSource(self.ROUTES)
+        )
+
+    def test_route_trip_minutes(self):
+        minutes = self._make_content().index.route_trip_minutes
+
+        assert list(minutes[0].workdays) == [359, 370]
+        assert minutes[0].everyday is None
+        assert list(minutes[1].everyday) == [420]
+
+    def test_route_stop_shifts(self):
+        shifts = self._make_content().index.route_stop_shifts
+
+        assert [list(x) for x in shifts] == [[0, 2, 4], [0]]
+
+    def test_route_distances(self):
+        index = self._make_content().index
+        distance = Geo.distance(55.542185, 28.666802, 55.5418, 28.666802)
+
+        assert [list(x) for x in index.route_segment_distances] == [
+            [pytest.approx(distance)] * 2, []
+        ]
+        assert [list(x) for x in index.route_stop_distances] == [
+            [0, pytest.approx(distance), pytest.approx(2 * distance)], [0]
+        ]
+        assert [list(x) for x in index.route_segment_speeds] == [
+            [pytest.approx(distance / 2 * 60 / 1000)] * 2, []
+        ]
+
+    def test_built_once(self):
+        content = self._make_content()
+
+        assert content.index is content.index
+        assert content.index.stops_by_key is content.index.stops_by_key
+
+
+class TestContentStatistics:
+    def _compute(self):
+        return ContentStatistics(
+            TestContentIndex()._make_content(), top=1
+        ).compute()
+
+    def test_compute(self):
+        stats = self._compute()
+
+        assert stats[:5] == (
+            2, 1, 2, 4, dict(workdays=2, weekend=0, everyday=1)
+        )
+        # string documents share a name
+        assert stats.largest_files == [
+            FileStats('<unicode string>', 2, 2, 4, 3)
+        ]
+        assert stats.most_referenced_stops == [StopReferences('key1', 1)]
+        assert stats.trips_per_route == Distribution(
+            3, 3, 3, 3, 3.0,
+            [(0, 0, 0), (1, 9, 1), (10, 24, 0), (25, 49, 0), (50, 99, 0),
+             (100, 199, 0), (200, None, 0)]
+        )
+
+    def test_routes_are_distinct_numbers(self):
+        stats = ContentStatistics(Content(
+            StringYamlNodeSource([]),
+            StringYamlNodeSource(TestRouteCatalogue.ROUTES)
+        )).compute()
+
+        assert (stats.routes, stats.directions) == (2, 4)
+        assert stats.most_referenced_stops[:2] == [
+            StopReferences('key1', 2), StopReferences('key2', 2)
+        ]
+        assert stats.trips_per_route[:5] == (1, 1, 3, 3, 2.0)
+
+    def test_text_format(self):
+        text = StatsFormatter.create('text').format(self._compute())
+
+        assert text.splitlines()[4:8] == [
+            'Trip times: workdays 2, weekend 0, everyday 1',
+            'Largest files:',
+            '  <unicode string>: 2 stops, 2 directions, 4 route stops, 3 '
+            'trip times',
+            'Most referenced stops:'
+        ]
+        assert text.splitlines()[-8:-5] == [
+            'Trips per route: min 3, median 3, p90 3, max 3, mean 3.0',
+            '  0: 0',
+            '  1-9: 1'
+        ]
+
+    def test_json_format(self):
+        import json
+
+        data = json.loads(
+            StatsFormatter.create('json').format(self._compute())
+        )
+
+        assert data['largest_files'][0]['directions'] == 2
+        assert data['most_referenced_stops'] == [dict(key='key1', routes=1)]
+        assert data['trips_per_route']['buckets'][-1] == dict(
+            lowest=200, highest=None, routes=0
+        )
+
+
+class TestRouteCatalogue:
+    ROUTES = [
+        '''
+        routes:
+          - number: 10а
+            description: description1
+            stops:
+              - key: key1
+                shift: 00:00
+              - key: key2
+                shift: 00:02
+            trips:
+              everyday:
+                - 05:59
+          - number: 2
+            description: description2
+            stops:
+              - key: key2
+                shift: 00:00
+              - key: key1
+                shift: 00:02
+            trips:
+              everyday:
+                - 05:59
+          - number: 2
+            description: description3
+            stops:
+              - key: key1
+                shift: 00:00
+            trips:
+              everyday:
+                - 05:59
+          - number: 2
+            description: description4
+            stops:
+              - key: key3
+                shift: 00:00
+              - key: key1
+                shift: 00:02
+            trips:
+              everyday:
+                - 05:59
+        '''
+    ]
+
+    def test_numbers_sorted_naturally(self):
+        assert self._make_catalogue().numbers == ['2', '10а']
+
+    def _make_catalogue(self):
+        return Content(
+            StringYamlNodeSource([]), StringYamlNodeSource(self.ROUTES)
+        ).index.route_catalogue
+
+    def test_directions(self):
+        catalogue = self._make_catalogue()
+
+        directions = catalogue.directions('2')
+        assert [x.id for x in directions] == ['2:key1', '2:key1#1', '2:key1#2']
+        assert [x.index for x in directions] == [0, 1, 2]
+        assert directions[1].route.value.description.value == 'description3'
+        assert catalogue.directions('3') == []
+
+    def test_direction_ids_stable_when_other_direction_added(self):
+        routes = self.ROUTES[0].replace(
+            '''
+          - number: 2
+            description: description3''',
+            '''
+          - number: 2
+            description: description5
+            stops:
+              - key: key3
+                shift: 00:00
+            trips:
+              everyday:
+                - 05:59
+          - number: 2
+            description: description3''', 1
+        )
+
+        directions = Content(
+            StringYamlNodeSource([]), StringYamlNodeSource([routes])
+        ).index.route_catalogue.directions('2')
+
+        assert [x.id for x in directions] == [
+            '2:key1', '2:key3', '2:key1#1', '2:key1#2'
+        ]
+
+    def test_lookups(self):
+        catalogue = self._make_catalogue()
+
+        assert catalogue.direction('10а:key2').number == '10а'
+        assert catalogue.direction('10а:key1') is None
+        assert catalogue.find('2', 'key1').index == 0
+        assert catalogue.find('2', 'key2') is None
+
+
+class TestStationIndex:
+    # stops of one name about 40 m apart and one 1.1 km away
+    STOPS = [
+        '''
+        stops:
+          - key: koptevo-to-borovuha
+            name: Коптево
+            latitude: 55.542185
+            longitude: 28.666802
+          - key: koptevo-from-borovuha
+            name: Коптево
+            latitude: 55.5418
+            longitude: 28.666802
+          - key: gorodok
+            name: Городок
+            latitude: 55.5418
+            longitude: 28.666802
+          - key: koptevo-final
+            name: Коптево
+            latitude: 55.5518
+            longitude: 28.666802
+        '''
+    ]
+
+    def _make_stations(self):
+        return Content(
+            StringYamlNodeSource(self.STOPS), StringYamlNodeSource([])
+        ).index.stations
+
+    def test_stations(self):
+        stations = self._make_stations()
+
+        assert [(x.key, x.name, list(x.stops)) for x in stations.stations] == [
+            ('koptevo', 'Коптево', [0, 1]),
+            ('gorodok', 'Городок', [2]),
+            ('koptevo-final', 'Коптево', [3])
+        ]
+        assert list(stations.stop_stations) == [0, 0, 1, 2]
+
+    def test_lookups(self):
+        stations = self._make_stations()
+
+        assert stations.station('koptevo').stops[1] == 1
+        assert stations.station('koptevo-to-borovuha') is None
+        assert stations.station_of('koptevo-from-borovuha').key == 'koptevo'
+        assert stations.station_of('key') is None
+
+    def test_transfer_minutes(self):
+        stations = self._make_stations()
+        station = stations.station('koptevo')
+
+        assert stations.transfer_minutes(station, 0, 0) == 0
+        assert stations.transfer_minutes(station, 0, 1) == 1
+        assert stations.transfer_minutes(station, 1, 0) == 1
+
+
+class TestGeo:
+    def test_distance(self):
+        # a minute of latitude is about a nautical mile
+        assert Geo.distance(55.5, 28.6, 55.5 + 1 / 60, 28.6) == \
+            pytest.approx(1853, abs=1)
+        assert Geo.distance(55.5, 28.6, 55.5, 28.6) == 0
+
+    def test_walking_minutes(self):
+        assert Geo.walking_minutes(0) == 1
+        assert Geo.walking_minutes(75) == 1
+        assert Geo.walking_minutes(76) == 2
+
+
+class TestDiagnostics:
+    STOPS = [
+        '''
+        stops:
+          - key: key1
+            name: name1
+            latitude: 55.542185
+            longitude: 28.666802
+        ''',
+        '''
+        stops:
+          - key: key2
+            name: name2
+            latitude: 1.0
+            longitude: 28.666802
+        ''',
+        '''
+        stops:
+          - key: key3
+            name: name3
+            latitude: 55.5418
+            longitude: 28.666802
+        '''
+    ]
+
+    def test_report_collects_every_document_error(self):
+        report = ContentReadReport()
+
+        content = Content(
+            StringYamlNodeSource(self.STOPS + [']']),
+            StringYamlNodeSource([]),
+            report
+        )
+
+        assert [x.value.key.value for x in content.stops] == ['key1', 'key3']
+        assert [type(x) for x in report.errors] == [
+            DataError, YamlFormatError
+        ]
+        assert len(report.timings) == 4
+
+    def test_data_error_diagnostic(self):
+        report = ContentReadReport()
+        Content(StringYamlNodeSource(self.STOPS), StringYamlNodeSource([]),
+                report)
+
+        diagnostic, = report.errors[0].diagnostics()
+
+        assert diagnostic.rule_id == 'LatitudeFloatRangeValidator'
+        assert diagnostic.message == \
+            'Value expected to be in 55.4..55.6 interval'
+        assert diagnostic.location == DiagnosticLocation(
+            '<unicode string>', 5, 23, 5, 26
+        )
+
+    def test_validator_rule_id(self):
+        content = Content(
+            StringYamlNodeSource([self.STOPS[0], self.STOPS[0]]),
+            StringYamlNodeSource([])
+        )
+
+        error, = ValidatorScheduler([StopKeyUniquenessValidator()]) \
+            .run(content)
+        diagnostic, = error.diagnostics()
+
+        assert diagnostic.rule_id == 'StopKeyUniquenessValidator'
+        assert diagnostic.location.start_line == 3
+        assert len(diagnostic.related) == 1
+
+    def test_sarif_format(self):
+        import json
+
+        report = ContentReadReport()
+        Content(StringYamlNodeSource(self.STOPS), StringYamlNodeSource([]),
+                report)
+
+        sarif = json.loads(SarifDiagnosticsFormatter().format(report))
+
+        run, = sarif['runs']
+        assert run['tool']['driver']['rules'] == [
+            {'id': 'LatitudeFloatRangeValidator'}
+        ]
+        result, = run['results']
+        assert result['ruleIndex'] == 0
+        assert result['locations'][0]['physicalLocation']['region'] == {
+            'startLine': 5, 'startColumn': 23, 'endLine': 5, 'endColumn': 26
+        }
+        assert len(run['properties']['fileTimings']) == 3
+
+    def test_json_format(self):
+        import json
+
+        report = ContentReadReport()
+        report.errors.append(EmptyContentError.no_stops_error())
+
+        output = json.loads(JsonDiagnosticsFormatter().format(report))
+
+        assert output['valid'] is False
+        assert output['diagnostics'] == [{
+            'rule_id': 'EmptyContentError',
+            'message': 'No stops found.',
+            'location': None,
+            'related': []
+        }]
+
+
 class TestContent:
     def test_stops_from_multiple_sources(self):
         stops = [
@@ -277,6 +896,330 @@ class TestContent:
             assert isinstance(route.value, Route)
 
 
+class TestContentArchive:
+    FILES = {
+        'release/content/stops/b.yaml': '''
+            stops:
+              - key: key2
+                name: name2
+                latitude: 55.5418
+                longitude: 28.666802
+        ''',
+        'release/content/stops/a.yaml': '''
+            stops:
+              - key: key1
+                name: name1
+                latitude: 55.542185
+                longitude: 28.666802
+        ''',
+        'release/content/stops/readme.txt': 'not content',
+        'release/content/routes/1.yaml': '''
+            routes:
+              - number: 1
+                description: description1
+                stops:
+                  - key: key1
+                    shift: 00:00
+                trips:
+                  everyday:
+                    - 05:59
+        ''',
+        # deeper than content, e.g. a test fixture
+        'release/content/tests/stops/c.yaml': 'stops: []'
+    }
+
+    def test_read(self):
+        archive = SnapshotContentArchive(self.FILES)
+
+        assert [x for x, _ in archive.read('stops')] == [
+            'snapshot/release/content/stops/a.yaml',
+            'snapshot/release/content/stops/b.yaml'
+        ]
+        assert archive.read('regions') == []
+
+    def test_content(self):
+        self._assert_content(SnapshotContentArchive(self.FILES))
+
+    def _assert_content(self, archive, executor=None):
+        content = Content(
+            archive.stop_source(executor), archive.route_source(executor)
+        )
+
+        assert [x.value.key.value for x in content.stops] == ['key1', 'key2']
+        assert [x.value.number.value for x in content.routes] == ['1']
+        assert content.stops[0].start_mark.name == \
+            '{}/release/content/stops/a.yaml'.format(archive.name)
+
+    def test_parallel_content(self):
+        with ThreadPoolExecutor() as executor:
+            self._assert_content(SnapshotContentArchive(self.FILES), executor)
+
+    def test_tar_content(self, tmpdir):
+        path = str(tmpdir.join('content.tar.gz'))
+        with tarfile.open(path, 'w:gz') as archive:
+            for name, text in self.FILES.items():
+                data = text.encode('utf8')
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+
+        assert ContentArchive.is_archive(path)
+        self._assert_content(ContentArchive.open(path))
+
+    def test_zip_content(self, tmpdir):
+        path = str(tmpdir.join('content.zip'))
+        with zipfile.ZipFile(path, 'w') as archive:
+            for name, text in self.FILES.items():
+                archive.writestr(name, text)
+
+        assert ContentArchive.is_archive(path)
+        self._assert_content(ContentArchive.open(path))
+
+    def test_errors_of_members(self):
+        files = dict(self.FILES)
+        files['release/content/stops/b.yaml'] = 'stops: ['
+
+        documents = list(
+            SnapshotContentArchive(files).stop_source().enumerate_with_errors()
+        )
+
+        assert documents[0].id == 'mapping'
+        assert isinstance(documents[1], YamlFormatError)
+
+    def test_broken_archive_fails(self, tmpdir):
+        path = tmpdir.join('content.zip')
+        path.write('not an archive')
+
+        with pytest.raises(ContentArchiveError) as ex_info:
+            ContentArchive.open(str(path)).read('stops')
+
+        assert str(ex_info.value) == \
+            'Content archive {} is not readable: File is not a zip ' \
+            'file.'.format(path)
+
+
+class TestRegionManifest:
+    REGIONS = '''
+        regions:
+          - key: polotsk
+            name: Полоцк и Новополоцк
+            min_latitude: 55.4
+            max_latitude: 55.6
+            min_longitude: 28.4
+            max_longitude: 28.9
+          - key: vitebsk
+            name: Витебск
+            min_latitude: 55.1
+            max_latitude: 55.3
+            min_longitude: 30.0
+            max_longitude: 30.4
+    '''
+
+    def test_load(self, tmpdir):
+        tmpdir.join(RegionManifest.FILE_NAME).write(self.REGIONS)
+
+        regions = RegionManifest.load(str(tmpdir))
+
+        assert regions == [
+            Region('polotsk', 'Полоцк и Новополоцк', 55.4, 55.6, 28.4, 28.9),
+            Region('vitebsk', 'Витебск', 55.1, 55.3, 30.0, 30.4)
+        ]
+
+    def test_no_manifest_loads_none(self, tmpdir):
+        assert RegionManifest.load(str(tmpdir)) is None
+
+    def test_duplicate_key_fails(self, tmpdir):
+        tmpdir.join(RegionManifest.FILE_NAME).write(
+            self.REGIONS.replace('vitebsk', 'polotsk')
+        )
+
+        with pytest.raises(DataError) as ex_info:
+            RegionManifest.load(str(tmpdir))
+
+        assert 'Region key "polotsk" used more than once' in \
+            str(ex_info.value)
+
+    def test_inverted_bounds_fail(self, tmpdir):
+        tmpdir.join(RegionManifest.FILE_NAME).write(
+            self.REGIONS.replace('max_longitude: 30.4', 'max_longitude: 29.9')
+        )
+
+        with pytest.raises(DataError) as ex_info:
+            RegionManifest.load(str(tmpdir))
+
+        assert 'Minimum longitude expected to be not greater than maximum ' \
+            'longitude' in str(ex_info.value)
+
+    def test_find_unknown_region_fails(self):
+        regions = [Region('polotsk', 'Полоцк', 55.4, 55.6, 28.4, 28.9)]
+
+        with pytest.raises(NoRegionError) as ex_info:
+            RegionManifest.find(regions, 'minsk')
+
+        assert 'Region "minsk" not found' in str(ex_info.value)
+        assert 'Known regions: polotsk' in str(ex_info.value)
+
+    def test_region_bounds_checked_on_stops(self):
+        region = Region('vitebsk', 'Витебск', 55.1, 55.3, 30.0, 30.4)
+        stops = '''
+            stops:
+              - key: key1
+                name: name1
+                latitude: 55.19
+                longitude: 30.2
+        '''
+
+        content = Content(
+            StringYamlNodeSource([stops]), StringYamlNodeSource([]),
+            region=region
+        )
+        assert len(content.stops) == 1
+
+        with pytest.raises(DataError) as ex_info:
+            Content(StringYamlNodeSource([stops]), StringYamlNodeSource([]))
+
+        assert 'Value expected to be in 55.4..55.6 interval' in \
+            str(ex_info.value)
+
+    def test_errors_survive_pickling(self):
+        import pickle
+
+        errors = [
+            DataError('message', Mark('file', 1, 2), Mark('file', 3, 4)),
+            KeySecondUsageError(
+                'key',
+                Item('key', Mark('file', 1, 2), Mark('file', 1, 5)),
+                Item('key', Mark('file0', 1, 2), Mark('file0', 1, 5))
+            ),
+            YamlFormatError('message', Mark('file', 1, 2)),
+            NoRegionError('minsk', ['polotsk']),
+            EmptyContentError.no_stops_error()
+        ]
+        errors[0].rule_id = 'Rule'
+
+        for error in errors:
+            loaded = pickle.loads(pickle.dumps(error))
+            assert type(loaded) is type(error)
+            assert str(loaded) == str(error)
+            assert loaded.diagnostics() == error.diagnostics()
+
+
+class TestIncrementalValidator:
+    STOPS = \
+        '''
+        stops:
+          - key: key1
+            name: name1
+            latitude: 55.542185
+            longitude: 28.666802
+          - key: key2
+            name: name2
+            latitude: 55.5418
+            longitude: 28.666802
+        '''
+    ROUTES = \
+        '''
+        routes:
+          - number: 1
+            description: description1
+            stops:
+              - key: key1
+                shift: 00:00
+            trips:
+              everyday:
+                - 05:59
+        '''
+
+    def test_index_round_trip(self, tmpdir):
+        index = self._make_index(tmpdir)
+        index_file = str(tmpdir.join('index.json'))
+
+        index.save(index_file, str(tmpdir))
+        loaded = StopKeyIndex.load(index_file, str(tmpdir))
+
+        assert loaded.declared.keys() == index.declared.keys()
+        assert loaded.references.keys() == index.references.keys()
+        assert loaded.declared['key2'].start_mark == Mark(
+            str(tmpdir.join('stops', 'stops.yaml')), 6, 17
+        )
+
+    def _make_index(self, tmpdir):
+        tmpdir.join('stops', 'stops.yaml').write(self.STOPS, ensure=True)
+        tmpdir.join('routes', 'routes.yaml').write(self.ROUTES, ensure=True)
+
+        return StopKeyIndex.from_content(Content(
+            StopFileSystemNodeSource(str(tmpdir)),
+            RouteFileSystemNodeSource(str(tmpdir))
+        ))
+
+    def test_changed_stops_succeeds(self, tmpdir):
+        self._validate(tmpdir, [
+            (self._stops_path(tmpdir), self.STOPS.replace('key2', 'key3'))
+        ])
+
+    def _validate(self, tmpdir, documents):
+        return IncrementalValidator(
+            str(tmpdir), self._make_index(tmpdir)
+        ).validate(documents)
+
+    def _stops_path(self, tmpdir):
+        return str(tmpdir.join('stops', 'stops.yaml'))
+
+    def test_key_used_in_other_file_fails(self, tmpdir):
+        path = str(tmpdir.join('stops', 'new.yaml'))
+
+        with pytest.raises(KeySecondUsageError) as ex_info:
+            self._validate(
+                tmpdir, [(path, self.STOPS.replace('key1', 'key3'))]
+            )
+        assert ex_info.value.key == 'key2'
+        assert ex_info.value.item.start_mark.name == path
+        assert ex_info.value.first_use_item.start_mark.name == \
+            self._stops_path(tmpdir)
+
+    def test_undeclared_key_in_changed_route_fails(self, tmpdir):
+        path = str(tmpdir.join('routes', 'new.yaml'))
+
+        with pytest.raises(DataError) as ex_info:
+            self._validate(
+                tmpdir, [(path, self.ROUTES.replace('key1', 'key3'))]
+            )
+        assert 'Undeclared stop key "key3"' in str(ex_info.value)
+
+    def test_index_updated_with_changed_files(self, tmpdir):
+        stops_path = str(tmpdir.join('stops', 'new.yaml'))
+        routes_path = str(tmpdir.join('routes', 'new.yaml'))
+        index_file = str(tmpdir.join('index.json'))
+
+        self._validate(tmpdir, [(stops_path, self.STOPS.replace(
+            'key1', 'key3').replace('key2', 'key4'))]
+        ).save(index_file, str(tmpdir))
+        index = IncrementalValidator(
+            str(tmpdir), StopKeyIndex.load(index_file, str(tmpdir))
+        ).validate([(routes_path, self.ROUTES.replace('key1', 'key3'))])
+
+        assert index.declared['key3'].start_mark.name == stops_path
+        assert index.references.keys() == {
+            str(tmpdir.join('routes', 'routes.yaml')), routes_path
+        }
+        assert index.references[routes_path].keys() == {'key3'}
+
+    def test_index_drops_removed_files(self, tmpdir):
+        path = str(tmpdir.join('routes', 'routes.yaml'))
+
+        index = self._validate(tmpdir, [(path, None)])
+
+        assert index.references == {}
+        assert index.declared.keys() == {'key1', 'key2'}
+
+    def test_removed_referenced_key_fails(self, tmpdir):
+        with pytest.raises(DataError) as ex_info:
+            self._validate(tmpdir, [(self._stops_path(tmpdir), None)])
+        assert 'Undeclared stop key "key1"' in str(ex_info.value)
+        assert ex_info.value.start_mark.name == \
+            str(tmpdir.join('routes', 'routes.yaml'))
+
+
 class TestRouteProducer:
     def test(self):
         yaml_doc = \
@@ -348,6 +1291,42 @@ class TestRouteTripProducer:
         assert isinstance(route_trip.weekend.value, list)
         assert len(route_trip.weekend.value) == 1
 
+    def test_comments_flag_times(self):
+        yaml_doc = \
+            '''
+            workdays:
+            - 06:00 # АВТ
+            - 06:10
+            # - 06:20 # в гараж
+            - 17:16 #в гараж
+            weekend:
+            - 06:25  # ч/з КПД, Полимир
+            '''
+
+        route_trip = RouteTripProducer().produce(
+            Yaml.create_root_node(yaml_doc)
+        ).value
+
+        assert [x.flags for x in route_trip.workdays.value] == [
+            TripFlags(False, None, None, 'АВТ'),
+            None,
+            TripFlags(True, None, None, 'в гараж')
+        ]
+        assert route_trip.weekend.value[0].flags == TripFlags(
+            False, None, 'КПД, Полимир', 'ч/з КПД, Полимир'
+        )
+
+
+class TestTripComment:
+    def test_fridays(self):
+        assert TripComment.parse('по пятницам').fridays is True
+        assert TripComment.parse('кроме пятницы').fridays is False
+        assert TripComment.parse('НПЗ').fridays is None
+
+    def test_via(self):
+        assert TripComment.parse('через Аэродром').via == 'Аэродром'
+        assert TripComment.parse('Полимир').via is None
+
 
 class TestStopTupleProducer:
     def test(self):
@@ -430,6 +1409,25 @@ class TestNamedTupleProducer:
         assert 'Required item' in str(ex_info)
         assert 'not specified' in str(ex_info)
 
+    def test_reuse_after_failure_succeeds(self):
+        producer = self._make_model_producer()
+        invalid_doc = \
+            '''
+            text_item: this is some text
+            float_item: not a number
+            '''
+        valid_doc = \
+            '''
+            text_item: this is some text
+            float_item: 123
+            '''
+
+        with pytest.raises(DataError):
+            producer.produce(Yaml.create_root_node(invalid_doc))
+        item = producer.produce(Yaml.create_root_node(valid_doc))
+
+        assert item.value.float_item.value == 123
+
     def test_no_map_fails(self):
         yaml_doc = \
             '''
@@ -577,6 +1575,17 @@ class TestTimeShiftValidator:
         self._assert_not_valid_time_error(ex_info)
 
 
+class TestTimeShift:
+    def test_to_minutes(self):
+        assert TimeShift.to_minutes('00:00') == 0
+        assert TimeShift.to_minutes('07:20') == 440
+        assert TimeShift.to_minutes('25:01') == 1501
+
+    def test_from_minutes(self):
+        assert TimeShift.from_minutes(440) == '07:20'
+        assert TimeShift.from_minutes(1501) == '25:01'
+
+
 class BaseTestValueExtractor(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def _get_extractor(self):
@@ -650,6 +1659,32 @@ class TestBoolValueExtractor(BaseTestValueExtractor):
         self._assert_not_valid_bool_error(ex_info)
 
 
+class TestLazyModule:
+    def test_attribute_access_imports_module(self):
+        module = LazyModule('json')
+
+        assert module.dumps([1]) == '[1]'
+        assert 'dumps' in vars(module)
+
+    def test_producers_built_once(self):
+        assert Producers.stops() is Producers.stops()
+        assert Producers.routes() is Producers.routes()
+
+
+class TestYaml:
+    def test_comment_attached_to_scalar_on_its_line(self):
+        root = Yaml.create_root_node('key: value # comment\nother: value\n')
+
+        (_, value), (_, other_value) = root.value
+        assert value.comment == 'comment'
+        assert not hasattr(other_value, 'comment')
+
+    def test_comments_with_recursive_alias(self):
+        root = Yaml.create_root_node('&a [*a] # comment\n')
+
+        assert root.value[0] is root
+
+
 class TestPyyamlInterface:
     def test_scalar_node(self):
         yaml_doc = 'test'